@@ -16,8 +16,8 @@ from urllib.parse import urlparse
 import traceback
 import re
 import time
+import queue
 import threading
-from threading import Lock
 from pathlib import Path
 import psycopg2
 from datetime import datetime, timedelta
@@ -42,20 +42,31 @@ logger = logging.getLogger(__name__)
 logger.info("=== API Server logging initialized ===")
 NUM_WORKER_THREADS = int(os.environ.get('NUM_WORKER_THREADS', '5'))
 worker_threads = []
+# Prefetch stage: QUEUE_PREFETCH_WORKERS threads claim pending requests and fetch
+# their clip details and frames while the workers run detection, holding at most
+# QUEUE_PREFETCH_DEPTH prefetched requests. Keep the depth small: a claimed request
+# waiting here counts towards the stuck-request timeout. 0 disables the stage and
+# each worker claims and downloads for itself.
+QUEUE_PREFETCH_DEPTH = int(os.environ.get('QUEUE_PREFETCH_DEPTH', '2'))
+QUEUE_PREFETCH_WORKERS = int(os.environ.get('QUEUE_PREFETCH_WORKERS', '2'))
+prefetched_requests = None  # queue.Queue of claimed requests, with their prefetched frames
+prefetch_slots = None  # BoundedSemaphore(QUEUE_PREFETCH_DEPTH) bounding prefetched_requests
 
 
 # Import the hero detection and hero data modules
 try:
-    from dota_hero_detection import process_clip_url, process_stream_username, load_heroes_data
+    from dota_hero_detection import process_clip_url, process_stream_username, load_heroes_data, load_in_game_templates, prefetch_clip_frames
     from dota_heroes import get_hero_data
     from clip_utils import get_clip_details
+    import http_client
     from src.postgresql_client import db_client
 except ImportError as e:
     # Try with relative import for different directory structures
     try:
-        from .dota_hero_detection import process_clip_url, process_stream_username, load_heroes_data
+        from .dota_hero_detection import process_clip_url, process_stream_username, load_heroes_data, load_in_game_templates, prefetch_clip_frames
         from .dota_heroes import get_hero_data
         from .clip_utils import get_clip_details
+        from . import http_client
         from src.postgresql_client import db_client
     except ImportError as rel_e:
         logger.error(f"Error: Could not import required modules. First error: {e}, Second error: {rel_e}")
@@ -116,8 +127,6 @@ def parse_bool_param(value, default=False):
 
     return default
 
-# Global lock for queue processing
-queue_lock = Lock()
 # Flag to indicate if worker thread is running
 worker_running = False
 # Flag to track if app is initialized
@@ -149,6 +158,10 @@ def initialize_app():
             return False
         logger.info(f"Successfully loaded templates for {len(heroes_data)} heroes")
 
+        # Preload in-game templates too, so the first in-game clip doesn't pay for them
+        in_game_templates = load_in_game_templates()
+        logger.info(f"Preloaded {len(in_game_templates)} in-game hero templates")
+
         # Step 2: Run database migrations
         try:
             logger.info("Running database migrations...")
@@ -192,7 +205,7 @@ def initialize_app():
 
 def start_worker_thread():
     """Start multiple worker threads to process queued requests if not already running."""
-    global worker_running, worker_threads
+    global worker_running, worker_threads, prefetched_requests, prefetch_slots
 
     # Don't start worker thread if running locally
     if os.environ.get('RUN_LOCALLY') == 'true':
@@ -214,6 +227,21 @@ def start_worker_thread():
             logger.info(f"Started queue worker thread {i+1}/{NUM_WORKER_THREADS}")
 
         logger.info(f"Started {NUM_WORKER_THREADS} queue worker threads")
+
+        if QUEUE_PREFETCH_DEPTH > 0 and QUEUE_PREFETCH_WORKERS > 0:
+            # Keep the buffer across restarts so requests already claimed into it still run
+            if prefetched_requests is None:
+                prefetched_requests = queue.Queue()
+                prefetch_slots = threading.BoundedSemaphore(QUEUE_PREFETCH_DEPTH)
+            for i in range(QUEUE_PREFETCH_WORKERS):
+                prefetch_thread = threading.Thread(
+                    target=process_prefetch_worker,
+                    daemon=True,
+                    name=f"Prefetcher-{i+1}"
+                )
+                prefetch_thread.start()
+                worker_threads.append(prefetch_thread)
+            logger.info(f"Started {QUEUE_PREFETCH_WORKERS} prefetch threads (depth {QUEUE_PREFETCH_DEPTH})")
     else:
         logger.debug("Worker threads are already running")
 
@@ -338,6 +366,108 @@ def start_temp_cleanup_sweeper():
     logger.info(f"Started temp file cleanup sweeper (every {TEMP_CLEANUP_INTERVAL_S}s, TTL {TEMP_FILE_TTL_S}s)")
 
 
+def _claim_next_request(thread_name):
+    """Take the next pending request off the queue and mark it processing, or return None."""
+    # One atomic claim (SKIP LOCKED): safe across threads and processes without a lock
+    request = db_client.claim_next_request()
+    if request:
+        logger.info(f"[{thread_name}] Picked up request {request['request_id']} from queue")
+    return request
+
+
+def _existing_match_result(request):
+    """
+    Return the clip ID of a stored result that already answers request's match.
+
+    A draft-only request reuses any draft for its match and a pre-game clip
+    reuses a completed match result; in-game clips always process (they add a
+    fresh, higher-confidence detection).
+
+    Args:
+        request: A claimed clip or clip_in_game queue row
+
+    Returns:
+        The existing result's clip ID, or None if the request has to be processed
+    """
+    match_id = request.get('match_id')
+    if not match_id or request.get('force', False):
+        return None
+    if request.get('only_draft'):
+        try:
+            draft_existing = db_client.get_latest_draft_for_match(match_id)
+            if draft_existing:
+                return draft_existing.get('clip_id') or 'unknown'
+        except Exception:
+            pass
+    elif request['request_type'] != 'clip_in_game':
+        match_status = db_client.check_for_match_processing(match_id)
+        if match_status and match_status.get('found') and match_status.get('status') == 'completed':
+            existing_clip_id = match_status.get('clip_id')
+            if db_client.get_clip_result(existing_clip_id):
+                return existing_clip_id
+    return None
+
+
+def _has_cached_clip_result(request):
+    """Whether process_clip_request will answer request from its cached clip result."""
+    if request.get('force', False) or not request.get('clip_id'):
+        return False
+    cached_result = db_client.get_clip_result(request['clip_id'])
+    return bool(cached_result) and (not request.get('only_draft') or bool(cached_result.get('is_draft')))
+
+
+def _prefetch_request(request, thread_name):
+    """Fetch a claimed request's clip details and frames; None for requests with nothing to prefetch."""
+    # Stream frames have to be captured live when the request runs
+    if request['request_type'] not in ('clip', 'clip_in_game'):
+        return None
+    # Requests answered from stored results never look at frames
+    if _existing_match_result(request) or _has_cached_clip_result(request):
+        logger.info(f"[{thread_name}] Request {request['request_id']} has a stored result, not prefetching")
+        return None
+    start_time = time.time()
+    # Draft-only and in-game detection only look at frame 0
+    sample = request['request_type'] == 'clip' and not request.get('only_draft')
+    prefetched = prefetch_clip_frames(request['clip_url'], sample=sample)
+    logger.info(f"[{thread_name}] Prefetched request {request['request_id']} in {time.time() - start_time:.2f}s")
+    return prefetched
+
+
+def process_prefetch_worker():
+    """Prefetch stage: claim pending requests and download their frames ahead of the workers."""
+    thread_name = threading.current_thread().name
+    logger.info(f"[{thread_name}] Prefetch thread started")
+
+    consecutive_empty_checks = 0
+
+    try:
+        while True:
+            # Only claim a request once there is room to buffer it
+            prefetch_slots.acquire()
+            request = _claim_next_request(thread_name)
+            if not request:
+                prefetch_slots.release()
+                consecutive_empty_checks += 1
+                # Wake on the next queue notification; poll anyway after 5s, 10s, 15s, ... max 60s
+                sleep_time = min(5 * consecutive_empty_checks, 60)
+                logger.debug(f"[{thread_name}] No pending requests, waiting up to {sleep_time}s for a new one")
+                db_client.wait_for_queue_activity(sleep_time)
+                continue
+
+            consecutive_empty_checks = 0
+            try:
+                request['prefetched'] = _prefetch_request(request, thread_name)
+            except Exception as e:
+                # The worker fetches whatever is missing itself
+                logger.error(f"[{thread_name}] Error prefetching request {request['request_id']}: {e}")
+            prefetched_requests.put(request)
+    except Exception as e:
+        logger.error(f"[{thread_name}] Prefetch thread error: {e}")
+        logger.error(traceback.format_exc())
+    finally:
+        logger.info(f"[{thread_name}] Prefetch thread stopped")
+
+
 def process_queue_worker():
     """Worker thread function to process queued requests."""
     global worker_running
@@ -351,27 +481,35 @@ def process_queue_worker():
         while True:
             request = None
 
-            # Acquire lock only to get next request
-            with queue_lock:
-                request = db_client.get_next_pending_request()
-
+            if prefetched_requests is not None:
+                # The prefetch stage claims requests and downloads their frames
+                try:
+                    request = prefetched_requests.get(timeout=5)
+                except queue.Empty:
+                    continue
+                prefetch_slots.release()
+                # Restart the stuck-request clock now that detection actually starts;
+                # a request reset while it waited in the buffer is dropped
+                if not db_client.refresh_processing_request(request['request_id']):
+                    logger.warning(f"[{thread_name}] Request {request['request_id']} is no longer processing, dropping it")
+                    continue
+            else:
+                request = _claim_next_request(thread_name)
                 if request:
-                    # Mark as processing immediately
-                    db_client.update_queue_status(request['request_id'], 'processing')
-                    logger.info(f"[{thread_name}] Picked up request {request['request_id']} from queue")
                     consecutive_empty_checks = 0
 
             # If no requests, use exponential backoff
             if not request:
                 consecutive_empty_checks += 1
-                # Exponential backoff: 5s, 10s, 15s, ... max 60s
+                # Wake on the next queue notification; poll anyway after 5s, 10s, 15s, ... max 60s
                 sleep_time = min(5 * consecutive_empty_checks, 60)
-                logger.debug(f"[{thread_name}] No pending requests, sleeping for {sleep_time}s")
-                time.sleep(sleep_time)
+                logger.debug(f"[{thread_name}] No pending requests, waiting up to {sleep_time}s for a new one")
+                db_client.wait_for_queue_activity(sleep_time)
                 continue
 
             # Process the request OUTSIDE the lock
             logger.info(f"[{thread_name}] Processing request {request['request_id']}")
+            prefetched = request.pop('prefetched', None)
             result = None
             error = None
             start_time = time.time()
@@ -380,30 +518,11 @@ def process_queue_worker():
                 # ... existing processing logic (lines 278-353) remains the same ...
                 if request['request_type'] in ('clip', 'clip_in_game'):
                     in_game = request['request_type'] == 'clip_in_game'
-                    match_id = request.get('match_id')
-                    only_draft = bool(request.get('only_draft'))
-                    if match_id and not request.get('force', False):
-                        if only_draft:
-                            try:
-                                draft_existing = db_client.get_latest_draft_for_match(match_id)
-                                if draft_existing:
-                                    existing_clip_id = draft_existing.get('clip_id') or 'unknown'
-                                    logger.info(f"[{thread_name}] Match ID {match_id} already has a draft result (clip {existing_clip_id})")
-                                    db_client.update_queue_status(request['request_id'], 'completed', result_id=existing_clip_id)
-                                    continue
-                            except Exception:
-                                pass
-                        elif not in_game:
-                            # In-game clips always process (they add a fresh, higher-confidence
-                            # detection); only pre-game gameplay clips skip on a completed match.
-                            match_status = db_client.check_for_match_processing(match_id)
-                            if match_status and match_status.get('found') and match_status.get('status') == 'completed':
-                                existing_clip_id = match_status.get('clip_id')
-                                logger.info(f"[{thread_name}] Match ID {match_id} already completed for clip {existing_clip_id}")
-                                existing_result = db_client.get_clip_result(existing_clip_id)
-                                if existing_result:
-                                    db_client.update_queue_status(request['request_id'], 'completed', result_id=existing_clip_id)
-                                    continue
+                    existing_clip_id = _existing_match_result(request)
+                    if existing_clip_id:
+                        logger.info(f"[{thread_name}] Match ID {request.get('match_id')} already has a result (clip {existing_clip_id})")
+                        db_client.update_queue_status(request['request_id'], 'completed', result_id=existing_clip_id)
+                        continue
 
                     logger.info(f"[{thread_name}] Processing clip request: {request['clip_url']}")
                     result = process_clip_request(
@@ -416,12 +535,13 @@ def process_queue_worker():
                         from_worker=True,
                         match_id=request.get('match_id'),
                         only_draft=bool(request.get('only_draft')),
-                        in_game=in_game
+                        in_game=in_game,
+                        prefetched=prefetched
                     )
 
                     if result and 'best_frame_info' in result and 'frame_path' in result['best_frame_info'] and request['clip_id']:
                         frame_path = result['best_frame_info']['frame_path']
-                        if Path(frame_path).exists():
+                        if frame_path and Path(frame_path).exists():
                             result['saved_image_path'] = f"__HOST_URL__/images/{request['clip_id']}.jpg"
 
                 elif request['request_type'] == 'stream':
@@ -437,7 +557,7 @@ def process_queue_worker():
 
                     if result and 'best_frame_info' in result and 'frame_path' in result['best_frame_info']:
                         frame_path = result['best_frame_info']['frame_path']
-                        if Path(frame_path).exists():
+                        if frame_path and Path(frame_path).exists():
                             result['saved_image_path'] = f"__HOST_URL__/images/stream_{request['stream_username']}.jpg"
                 else:
                     error = f"Unknown request type: {request['request_type']}"
@@ -450,65 +570,68 @@ def process_queue_worker():
             processing_time = time.time() - start_time
             logger.info(f"[{thread_name}] Request {request['request_id']} processed in {processing_time:.2f}s")
 
-            # Update status
-            with queue_lock:
-                if error:
-                    # Twitch's public GQL graph lags behind Helix by tens of seconds
-                    # after a fresh clip is created, so the worker can hit
-                    # "Clip not found or inaccessible" even though dota's Helix-side
-                    # readiness check passed. Likewise "Clip renditions not yet
-                    # available" means Helix reported the clip ready before
-                    # CloudFront had the files (all renditions 404). Treat both as
-                    # transient and re-queue
-                    # (with a delay so we don't burn the next attempt while GQL is
-                    # still cold) instead of permanently dropping the only clip
-                    # we'll get for this match phase.
-                    is_transient_clip_unavailable = (
-                        request['request_type'] in ('clip', 'clip_in_game')
-                        and (
-                            'Clip not found or inaccessible' in error
-                            or 'Clip renditions not yet available' in error
-                        )
+            # Record the outcome; each write is its own short transaction, no process-wide lock
+            if error:
+                # Twitch's public GQL graph lags behind Helix by tens of seconds
+                # after a fresh clip is created, so the worker can hit
+                # "Clip not found or inaccessible" even though dota's Helix-side
+                # readiness check passed. Likewise "Clip renditions not yet
+                # available" means Helix reported the clip ready before
+                # CloudFront had the files (all renditions 404). Treat both as
+                # transient and re-queue
+                # (with a delay so we don't burn the next attempt while GQL is
+                # still cold) instead of permanently dropping the only clip
+                # we'll get for this match phase.
+                is_transient_clip_unavailable = (
+                    request['request_type'] in ('clip', 'clip_in_game')
+                    and (
+                        'Clip not found or inaccessible' in error
+                        or 'Clip renditions not yet available' in error
+                    )
+                )
+                if is_transient_clip_unavailable and db_client.requeue_for_retry(
+                    request['request_id']
+                ):
+                    logger.warning(
+                        f"[{thread_name}] Re-queued request {request['request_id']} (transient): {error}"
                     )
-                    if is_transient_clip_unavailable and db_client.requeue_for_retry(
-                        request['request_id']
-                    ):
-                        logger.warning(
-                            f"[{thread_name}] Re-queued request {request['request_id']} (transient): {error}"
-                        )
-                    else:
-                        # transient = sweep may retry; permanent = decode/network
-                        # bug that retrying won't help.
-                        reason = 'transient' if is_transient_clip_unavailable else 'permanent'
-                        db_client.update_queue_status(request['request_id'], 'failed', failure_reason=reason)
-                        logger.error(f"[{thread_name}] Failed request {request['request_id']} ({reason}): {error}")
                 else:
-                    if isinstance(result, dict) and ('error' in result or not result.get('players', [])):
-                        # No-players or explicit error in payload — retrying the
-                        # same clip won't suddenly produce a roster.
-                        db_client.update_queue_status(request['request_id'], 'failed', failure_reason='permanent')
-                        logger.error(f"[{thread_name}] Failed request {request['request_id']}: {result.get('error', 'No heroes detected')}")
-                    else:
-                        if result and isinstance(result, dict):
-                            result['processing_time'] = f"{processing_time:.2f}s"
-
-                            if request['request_type'] in ('clip', 'clip_in_game') and request['clip_id']:
-                                if 'frame_image_url' in result:
-                                    del result['frame_image_url']
-
-                                db_client.save_clip_result(
-                                    request['clip_id'],
-                                    request['clip_url'],
-                                    result,
-                                    processing_time_seconds=processing_time,
-                                    match_id=request.get('match_id')
-                                )
-
-                        db_client.update_queue_status(request['request_id'], 'completed', result_id=request.get('clip_id'))
+                    # transient = sweep may retry; permanent = decode/network
+                    # bug that retrying won't help.
+                    reason = 'transient' if is_transient_clip_unavailable else 'permanent'
+                    db_client.update_queue_status(request['request_id'], 'failed', failure_reason=reason)
+                    logger.error(f"[{thread_name}] Failed request {request['request_id']} ({reason}): {error}")
+            else:
+                if isinstance(result, dict) and ('error' in result or not result.get('players', [])):
+                    # No-players or explicit error in payload — retrying the
+                    # same clip won't suddenly produce a roster.
+                    db_client.update_queue_status(request['request_id'], 'failed', failure_reason='permanent')
+                    logger.error(f"[{thread_name}] Failed request {request['request_id']}: {result.get('error', 'No heroes detected')}")
+                else:
+                    result_to_save = None
+                    if result and isinstance(result, dict):
+                        result['processing_time'] = f"{processing_time:.2f}s"
+
+                        if request['request_type'] in ('clip', 'clip_in_game') and request['clip_id']:
+                            if 'frame_image_url' in result:
+                                del result['frame_image_url']
+                            result_to_save = result
+
+                    # Result and completed status commit together
+                    if db_client.complete_request(
+                        request['request_id'],
+                        result_id=request.get('clip_id'),
+                        clip_url=request.get('clip_url'),
+                        result=result_to_save,
+                        processing_time_seconds=processing_time,
+                        match_id=request.get('match_id')
+                    ):
                         logger.info(f"[{thread_name}] Completed request {request['request_id']}")
+                    else:
+                        # Nothing was saved; leave it to the failed-clip sweep to retry
+                        db_client.update_queue_status(request['request_id'], 'failed', failure_reason='transient')
+                        logger.error(f"[{thread_name}] Could not record result for request {request['request_id']}, marked failed (transient)")
 
-            # Small sleep between requests
-            time.sleep(1.0)
 
     except Exception as e:
         logger.error(f"[{thread_name}] Queue worker thread error: {e}")
@@ -543,7 +666,7 @@ def health_twitch_gql():
     if not slug:
         return jsonify({'status': 'skipped', 'reason': 'no canary configured'}), 200
     try:
-        details = get_clip_details(f'https://clips.twitch.tv/{slug}', max_retries=2)
+        details = get_clip_details(f'https://clips.twitch.tv/{slug}', max_retries=2, use_cache=False)
         if not details.get('download_url'):
             return jsonify({'status': 'fail', 'reason': 'no download_url'}), 503
         return jsonify({
@@ -1040,7 +1163,7 @@ def _build_queue_response(request_id, queue_info, noun):
     return response
 
 
-def process_clip_request(clip_url, clip_id, debug=False, force=False, include_image=True, add_to_queue=True, from_worker=False, match_id=None, only_draft=False, in_game=False):
+def process_clip_request(clip_url, clip_id, debug=False, force=False, include_image=True, add_to_queue=True, from_worker=False, match_id=None, only_draft=False, in_game=False, prefetched=None):
     """
     Process a clip URL and return the result or add it to the queue.
 
@@ -1053,6 +1176,7 @@ def process_clip_request(clip_url, clip_id, debug=False, force=False, include_im
         add_to_queue: Add to queue instead of processing immediately
         from_worker: Whether this is being called from the worker thread
         match_id: The Dota 2 match ID (required)
+        prefetched: Clip details and frames already fetched by the prefetch stage
 
     Returns:
         The processing result or queue information
@@ -1173,7 +1297,8 @@ def process_clip_request(clip_url, clip_id, debug=False, force=False, include_im
         clip_url=clip_url,
         debug=debug,
         only_draft=only_draft,
-        in_game=in_game
+        in_game=in_game,
+        prefetched=prefetched
     )
 
     processing_time = time.time() - start_time
@@ -1186,12 +1311,13 @@ def process_clip_request(clip_url, clip_id, debug=False, force=False, include_im
         # Add frame image URL if requested and not from worker thread
         if include_image and not from_worker and 'best_frame_info' in result and 'frame_path' in result['best_frame_info']:
             frame_path = result['best_frame_info']['frame_path']
-            image_url, saved_image_path = get_image_url(frame_path, clip_id)
-            if image_url:
-                result['frame_image_url'] = image_url
-                result['saved_image_path'] = saved_image_path
-                # Store the actual frame path for potential future use
-                result['best_frame_path'] = str(frame_path)
+            if frame_path and Path(frame_path).exists():
+                image_url, saved_image_path = get_image_url(frame_path, clip_id)
+                if image_url:
+                    result['frame_image_url'] = image_url
+                    result['saved_image_path'] = saved_image_path
+                    # Store the actual frame path for potential future use
+                    result['best_frame_path'] = str(frame_path)
 
         # If this is a non-draft result and match_id is provided, try to align with draft
         if match_id and not result.get('is_draft'):
@@ -1232,11 +1358,10 @@ def process_clip_request(clip_url, clip_id, debug=False, force=False, include_im
             except Exception as e:
                 logger.warning(f"Draft alignment failed: {e}")
 
-        if clip_id:
-            # Skip saving frame_image_url when called from worker thread
+        # The queue worker saves the result together with the completed
+        # status (complete_request), so only direct calls cache it here
+        if clip_id and not from_worker:
             result_to_save = result.copy()
-            if from_worker and 'frame_image_url' in result_to_save:
-                del result_to_save['frame_image_url']
 
             # Cache the result
             success = db_client.save_clip_result(clip_id, clip_url, result_to_save, processing_time_seconds=processing_time, match_id=match_id)
@@ -1248,11 +1373,12 @@ def process_clip_request(clip_url, clip_id, debug=False, force=False, include_im
                 # Try to include the image even if we couldn't cache the result
                 if include_image and not from_worker and 'frame_image_url' not in result and 'best_frame_info' in result and 'frame_path' in result['best_frame_info']:
                     frame_path = result['best_frame_info']['frame_path']
-                    image_url, saved_image_path = get_image_url(frame_path, clip_id)
-                    if image_url:
-                        result['frame_image_url'] = image_url
-                        result['saved_image_path'] = saved_image_path
-                        result['best_frame_path'] = str(frame_path)
+                    if frame_path and Path(frame_path).exists():
+                        image_url, saved_image_path = get_image_url(frame_path, clip_id)
+                        if image_url:
+                            result['frame_image_url'] = image_url
+                            result['saved_image_path'] = saved_image_path
+                            result['best_frame_path'] = str(frame_path)
 
         return result
     else:
@@ -1314,12 +1440,13 @@ def process_stream_request(username, num_frames=3, debug=False, include_image=Tr
         # Add frame image URL if requested and not from worker thread
         if include_image and not from_worker and 'best_frame_info' in result and 'frame_path' in result['best_frame_info']:
             frame_path = result['best_frame_info']['frame_path']
-            image_url, saved_image_path = get_image_url(frame_path, f"stream_{username}")
-            if image_url:
-                result['frame_image_url'] = image_url
-                result['saved_image_path'] = saved_image_path
-                # Store the actual frame path for potential future use
-                result['best_frame_path'] = str(frame_path)
+            if frame_path and Path(frame_path).exists():
+                image_url, saved_image_path = get_image_url(frame_path, f"stream_{username}")
+                if image_url:
+                    result['frame_image_url'] = image_url
+                    result['saved_image_path'] = saved_image_path
+                    # Store the actual frame path for potential future use
+                    result['best_frame_path'] = str(frame_path)
 
         return result
     else:
@@ -1579,7 +1706,9 @@ def metrics():
         'memory_mb': process.memory_info().rss / 1024 / 1024,
         'num_threads': process.num_threads(),
         'worker_running': worker_running,
-        'app_initialized': app_initialized
+        'app_initialized': app_initialized,
+        'http': http_client.metrics(),
+        'db_pool': db_client.pool_stats(),
     })
 
 def reset_stuck_processing_requests(timeout_minutes=2):
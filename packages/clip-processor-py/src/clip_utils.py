@@ -1,6 +1,6 @@
+import copy
 import os
 import re
-import requests
 import tempfile
 from pathlib import Path
 from bs4 import BeautifulSoup
@@ -10,7 +10,15 @@ import json
 from urllib.parse import quote
 import cv2
 import numpy as np
+import struct
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import http_client
+except ImportError:
+    from . import http_client
 
 
 # Configure logging
@@ -23,6 +31,32 @@ logger = logging.getLogger(__name__)
 TEMP_DIR = Path("temp")
 TEMP_DIR.mkdir(exist_ok=True)
 
+# Byte-range keyframe fetching: the first request reads this much of the file,
+# which covers ftyp + a fast-start moov for typical clips.
+MP4_HEAD_FETCH_BYTES = int(os.environ.get("MP4_HEAD_FETCH_BYTES", str(256 * 1024)))
+CLIP_RANGE_TIMEOUT = float(os.environ.get("CLIP_RANGE_TIMEOUT", "10"))
+# Clip lookups are reused for up to CLIP_DETAILS_CACHE_TTL seconds (0 disables the
+# cache), and never within CLIP_TOKEN_EXPIRY_MARGIN seconds of the token expiring.
+CLIP_DETAILS_CACHE_TTL = float(os.environ.get("CLIP_DETAILS_CACHE_TTL", "600"))
+CLIP_TOKEN_EXPIRY_MARGIN = float(os.environ.get("CLIP_TOKEN_EXPIRY_MARGIN", "120"))
+# Most clip lookups kept at once; expired ones are pruned first, then the oldest.
+CLIP_DETAILS_CACHE_SIZE = int(os.environ.get("CLIP_DETAILS_CACHE_SIZE", "1024"))
+# Keyframe range requests in flight at once when sampling several timestamps.
+CLIP_SAMPLE_WORKERS = int(os.environ.get("CLIP_SAMPLE_WORKERS", "4"))
+
+# Rows of the 1920x1080 reference frame that the detectors read, for
+# extract_frames(roi_only=True): the top bar (colour bars, hero portraits, player
+# names, rank banners and clock, y < 131) and the draft card name band (y 480-515).
+# Bounds are multiples of 9 so they map to whole rows at 720p, 540p and 480p. These
+# are the defaults; detection_roi_rows() widens them to the configured name rows.
+DETECTION_ROI_ROWS = ((0, 162), (459, 540))
+# Rows kept around a configured name band, for OCR's own padding.
+DETECTION_ROI_MARGIN = 18
+# The single pass grabs forward through gaps up to this long and seeks past longer
+# ones: a seek decodes from the previous keyframe (~2s apart on Twitch), so grabbing
+# through a shorter gap is never more work.
+ROI_SEEK_GAP_SECONDS = float(os.environ.get("ROI_SEEK_GAP_SECONDS", "2"))
+
 
 def extract_clip_id(url):
     """Extract the clip ID from a Twitch clip URL."""
@@ -44,6 +78,15 @@ def _build_download_url(source_url, token):
     return f"{source_url}?token={quote(token['value'])}&sig={token['signature']}"
 
 
+def _token_expiry(token):
+    """Unix time the playback token (and so the signed download URL) expires, or None."""
+    try:
+        expires = json.loads(token["value"]).get("expires")
+        return float(expires) if expires else None
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
 def _resolve_available_download_url(qualities, token):
     """Pick a download URL whose rendition actually exists on the CDN.
 
@@ -81,7 +124,7 @@ def _resolve_available_download_url(qualities, token):
     }
     for download_url, quality in candidates:
         try:
-            response = requests.get(download_url, headers=headers, stream=True, timeout=10)
+            response = http_client.get(download_url, headers=headers, stream=True, timeout=10)
             response.close()
             if response.status_code == 404:
                 logger.warning(
@@ -92,7 +135,7 @@ def _resolve_available_download_url(qualities, token):
                 f"Resolved available download URL at quality {quality} (status {response.status_code})"
             )
             return download_url, quality
-        except requests.RequestException as e:
+        except http_client.RequestException as e:
             logger.warning(f"Probe failed for quality {quality}: {e}; trying next candidate")
 
     # Every candidate 404'd (or couldn't be probed) — the clip is almost
@@ -108,9 +151,101 @@ def _resolve_available_download_url(qualities, token):
     )
 
 
-def get_clip_details(url, max_retries=10, retry_delay=2, max_retry_delay=15):
+class _ClipLookup:
+    """One in-flight get_clip_details lookup that concurrent callers wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.details = None
+        self.error = None
+
+
+_clip_details_cache = {}  # slug -> (expires_at monotonic, details)
+_clip_lookups = {}  # slug -> _ClipLookup in flight
+_clip_details_lock = threading.Lock()
+
+
+def _clip_details_ttl(details):
+    """Seconds a lookup may be reused: CLIP_DETAILS_CACHE_TTL, cut short by token expiry."""
+    ttl = CLIP_DETAILS_CACHE_TTL
+    expires = details.get("token_expires")
+    if expires:
+        ttl = min(ttl, expires - time.time() - CLIP_TOKEN_EXPIRY_MARGIN)
+    return ttl
+
+
+def _store_clip_details(clip_id, expires_at, details):
+    """Cache a lookup, pruning expired entries and keeping at most CLIP_DETAILS_CACHE_SIZE (lock held)."""
+    now = time.monotonic()
+    for stale_id in [key for key, (entry_expires, _details) in _clip_details_cache.items() if entry_expires <= now]:
+        del _clip_details_cache[stale_id]
+    _clip_details_cache.pop(clip_id, None)
+    while _clip_details_cache and len(_clip_details_cache) >= max(1, CLIP_DETAILS_CACHE_SIZE):
+        del _clip_details_cache[next(iter(_clip_details_cache))]
+    _clip_details_cache[clip_id] = (expires_at, details)
+
+
+def _copy_clip_details(details, **overrides):
+    """A caller's own copy of cached details, so mutating its quality lists can't leak."""
+    return copy.deepcopy(dict(details, **overrides))
+
+
+def clear_clip_details_cache():
+    """Drop every cached clip lookup (in-flight lookups are unaffected)."""
+    with _clip_details_lock:
+        _clip_details_cache.clear()
+
+
+def get_clip_details(url, max_retries=10, retry_delay=2, max_retry_delay=15, use_cache=True):
     """Get clip details and download URL using Twitch's API.
 
+    Lookups are cached per clip slug until shortly before the playback token
+    expires (at most CLIP_DETAILS_CACHE_TTL seconds), and concurrent calls for
+    the same slug share one in-flight lookup: a draft and a strategy request for
+    one clip cost a single GQL round trip. Failures are never cached; callers
+    that joined a failed lookup get its exception. use_cache=False forces a
+    fresh lookup without joining or filling the cache.
+    """
+    if not use_cache or CLIP_DETAILS_CACHE_TTL <= 0:
+        return _fetch_clip_details(url, max_retries, retry_delay, max_retry_delay)
+
+    clip_id = extract_clip_id(url)
+    with _clip_details_lock:
+        cached = _clip_details_cache.get(clip_id)
+        if cached and cached[0] > time.monotonic():
+            logger.info(f"Using cached clip details for {clip_id}")
+            return _copy_clip_details(cached[1], url=url)
+        lookup = _clip_lookups.get(clip_id)
+        leader = lookup is None
+        if leader:
+            lookup = _clip_lookups[clip_id] = _ClipLookup()
+
+    if not leader:
+        logger.info(f"Waiting for in-flight clip details lookup for {clip_id}")
+        lookup.done.wait()
+        if lookup.error is not None:
+            raise lookup.error
+        return _copy_clip_details(lookup.details, url=url)
+
+    try:
+        lookup.details = _fetch_clip_details(url, max_retries, retry_delay, max_retry_delay)
+        ttl = _clip_details_ttl(lookup.details)
+        with _clip_details_lock:
+            if ttl > 0:
+                _store_clip_details(clip_id, time.monotonic() + ttl, lookup.details)
+        return _copy_clip_details(lookup.details)
+    except Exception as e:
+        lookup.error = e
+        raise
+    finally:
+        with _clip_details_lock:
+            _clip_lookups.pop(clip_id, None)
+        lookup.done.set()
+
+
+def _fetch_clip_details(url, max_retries=10, retry_delay=2, max_retry_delay=15):
+    """Look up clip details and download URL with Twitch's GQL API (uncached).
+
     Twitch's public GQL graph lags behind Helix by tens of seconds after a fresh
     clip is created — Helix reports the clip ready, but `VideoAccessToken_Clip`
     still returns `data.clip = null` for ~30s+. The earlier 5-attempt budget
@@ -157,7 +292,7 @@ def get_clip_details(url, max_retries=10, retry_delay=2, max_retry_delay=15):
             logger.info(
                 f"Sending GQL request for clip: {clip_id} (attempt {retry_count + 1}/{max_retries})"
             )
-            response = requests.post(
+            response = http_client.post(
                 "https://gql.twitch.tv/gql", headers=headers, json=gql_query
             )
             response.raise_for_status()
@@ -228,6 +363,7 @@ def get_clip_details(url, max_retries=10, retry_delay=2, max_retry_delay=15):
                 "qualities": clip_data["videoQualities"],
                 "selected_quality": selected_quality,  # Actual rendition downloaded
                 "available_qualities": available_qualities,  # All advertised qualities
+                "token_expires": _token_expiry(token),
             }
         except Exception as e:
             last_error = e
@@ -269,7 +405,7 @@ def download_clip(clip_details):
         logger.info(f"Downloading clip to {output_path}")
 
         # Stream download with progress bar
-        response = requests.get(clip_details["download_url"], stream=True)
+        response = http_client.get(clip_details["download_url"], stream=True)
         response.raise_for_status()
 
         total_size = int(response.headers.get("content-length", 0))
@@ -296,7 +432,13 @@ def download_clip(clip_details):
 
 
 def extract_frames(
-    video_path, clip_details=None, start_time=0, end_time=None, frame_interval=1
+    video_path,
+    clip_details=None,
+    start_time=0,
+    end_time=None,
+    frame_interval=1,
+    return_frames=False,
+    roi_only=False,
 ):
     """
     Extract frames from the video starting from the end and working backwards.
@@ -310,10 +452,16 @@ def extract_frames(
         start_time: Start time in seconds
         end_time: End time in seconds (if None, uses video duration)
         frame_interval: Interval between frames in seconds
+        return_frames: Return the decoded BGR frames instead of writing JPEGs.
+            Frames already on disk for this clip are still reused.
+        roi_only: Decode in one forward pass (grab every frame, retrieve only the
+            sampled ones) and keep only the detection regions (keep_detection_rois).
+            Implies return_frames; the frames are for detection, not for serving.
 
     Returns:
-        List of paths to extracted frames
+        List of paths to extracted frames, or of frames when return_frames is set
     """
+    return_frames = return_frames or roi_only
     try:
         # Create frames directory
         frames_dir = TEMP_DIR / "frames"
@@ -331,6 +479,9 @@ def extract_frames(
             logger.info(
                 f"Found {len(existing_frames)} existing frames for this clip, reusing them"
             )
+            if return_frames:
+                frames = [cv2.imread(str(frame), cv2.IMREAD_COLOR) for frame in existing_frames]
+                return [frame for frame in frames if frame is not None]
             return [str(frame) for frame in existing_frames]
 
         # Open the video file
@@ -382,6 +533,13 @@ def extract_frames(
         # Sort timestamps in ascending order for sequential reading
         timestamps.sort()
 
+        if roi_only:
+            seek_gap = int(fps * ROI_SEEK_GAP_SECONDS) if fps > 0 else 0
+            frames = _extract_roi_frames(cap, [int(t * fps) for t in timestamps], seek_gap)
+            cap.release()
+            logger.info(f"Extracted detection regions of {len(frames)} frames in one pass")
+            return frames
+
         # Extract frames
         frame_paths = []
         logger.info(f"Extracting {len(timestamps)} frames")
@@ -411,6 +569,11 @@ def extract_frames(
                         interpolation=cv2.INTER_LANCZOS4,
                     )
 
+                if return_frames:
+                    frame_paths.append(frame)
+                    progress_bar.update(1)
+                    continue
+
                 # Save the frame as an image with clip ID prefix
                 frame_path = frames_dir / f"{frame_prefix}{i:05d}.jpg"
                 cv2.imwrite(str(frame_path), frame)
@@ -444,7 +607,8 @@ def extract_frames(
 
         else:
             logger.info(
-                f"Successfully extracted {len(frame_paths)} frames to {frames_dir}"
+                f"Successfully extracted {len(frame_paths)} frames"
+                + ("" if return_frames else f" to {frames_dir}")
             )
 
         return frame_paths
@@ -453,286 +617,605 @@ def extract_frames(
         raise
 
 
-def download_single_frame(clip_details, timestamp=None):
+# --------------------------------------------------------------------------- #
+# Byte-range keyframe fetching
+#
+# Twitch clip renditions are plain MP4 files. The moov box carries the sample
+# tables (stts/stss/stsc/stsz/stco), so once it is fetched we know exactly which
+# bytes hold the keyframe nearest any timestamp. The keyframe is decoded on its
+# own by prefixing it with the track's decoder configuration (SPS/PPS for H.264)
+# as a raw elementary stream.
+# --------------------------------------------------------------------------- #
+def detection_roi_rows():
     """
-    Download and extract a single frame from a Twitch clip without downloading the entire clip.
-    Uses HTTP Range requests to efficiently fetch a small portion of the video.
+    Row bands of the 1080p canvas that keep_detection_rois keeps.
 
-    Args:
-        clip_details: Dictionary containing clip details from get_clip_details()
-        timestamp: Time in seconds to extract the frame from (default: first frame of the clip)
+    Starts from DETECTION_ROI_ROWS and widens it to cover the draft and top bar name
+    rows as currently configured (DRAFT_Y_*, TOPBAR_Y_*, TOPBAR_RANK_Y_*, scaled from
+    DRAFT_BASE_HEIGHT, read the same way dota_hero_detection reads them), so moving
+    those rows can't blank them in roi_only frames.
 
     Returns:
-        Path to the extracted frame image
+        list: sorted, non-overlapping (top, bottom) bands
     """
-    if not clip_details.get("download_url"):
-        raise ValueError("No download URL available")
-
-    clip_id = clip_details["id"]
-
-    # Create frames directory
-    frames_dir = TEMP_DIR / "frames"
-    frames_dir.mkdir(exist_ok=True)
-
-    # Define output path for the frame
-    frame_path = frames_dir / f"{clip_id}.jpg"
-
-    # Check if we already have this frame
-    if frame_path.exists():
-        logger.info(f"Frame already exists at {frame_path}, reusing it")
-        return str(frame_path)
-
-    # If timestamp not specified, use the first frame of the clip
-    if timestamp is None:
-        timestamp = 0  # Use the beginning of the clip
-        logger.info(f"No timestamp specified, using first frame: {timestamp}s")
+    scale = 1080 / float(os.environ.get("DRAFT_BASE_HEIGHT", 1080))
+    configured = [
+        (int(os.environ.get("DRAFT_Y_START", 480)), int(os.environ.get("DRAFT_Y_END", 515))),
+        (int(os.environ.get("TOPBAR_Y_START", 82)), int(os.environ.get("TOPBAR_Y_END", 108))),
+        (int(os.environ.get("TOPBAR_RANK_Y_START", 50)), int(os.environ.get("TOPBAR_RANK_Y_END", 72))),
+    ]
+    bands = list(DETECTION_ROI_ROWS)
+    for top, bottom in configured:
+        top = max(0, int(np.floor((top * scale - DETECTION_ROI_MARGIN) / 9)) * 9)
+        bottom = min(1080, int(np.ceil((bottom * scale + DETECTION_ROI_MARGIN) / 9)) * 9)
+        if top < bottom:
+            bands.append((top, bottom))
+    merged = []
+    for top, bottom in sorted(bands):
+        if merged and top <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], bottom))
+        else:
+            merged.append((top, bottom))
+    return merged
 
-    logger.info(f"Fetching single frame at timestamp {timestamp}s from clip {clip_id}")
 
-    temp_path = None
-    try:
-        # Create a temporary file for the video segment
-        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_file:
-            temp_path = temp_file.name
-
-        # More aggressive approach to minimize download size:
-        # 1. Download a small header portion (to get metadata)
-        # 2. Then download a small chunk around our target timestamp
-
-        # Step 1: Download just enough to get the MP4 header (typically within first 1MB)
-        header_size = 512 * 1024  # 512KB should be enough for most MP4 headers
-
-        # First, try to get just the MP4 header
-        headers = {
-            "Range": f"bytes=0-{header_size - 1}",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        }
-
-        logger.info(f"Downloading MP4 header (first {header_size} bytes)")
-        response = requests.get(
-            clip_details["download_url"], headers=headers, stream=True
-        )
+def keep_detection_rois(frame):
+    """
+    Keep only the regions of a frame the detectors read, on a 1920x1080 canvas.
 
-        # Check if we got a partial content response
-        if response.status_code != 206:
-            logger.warning(
-                f"Server doesn't support range requests (status: {response.status_code}). Falling back to alternative method."
-            )
-            # Fall back to downloading a larger chunk from the beginning
-            header_size = 5 * 1024 * 1024  # 5MB
-            headers = {
-                "Range": f"bytes=0-{header_size - 1}",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            }
-            response = requests.get(
-                clip_details["download_url"], headers=headers, stream=True
-            )
+    Each detection_roi_rows band is cropped from the source and, for non-1080p
+    sources, resized on its own, so the full-frame LANCZOS upscale is skipped. The
+    rest of the canvas is never written; np.zeros leaves those pages unallocated.
+    """
+    height, width = frame.shape[:2]
+    canvas = np.zeros((1080, 1920, 3), np.uint8)
+    for top, bottom in detection_roi_rows():
+        band = frame[top * height // 1080:bottom * height // 1080]
+        if (width, height) != (1920, 1080):
+            band = cv2.resize(band, (1920, bottom - top), interpolation=cv2.INTER_LANCZOS4)
+        canvas[top:bottom] = band
+    return canvas
 
-        # Write header portion to temp file
-        with open(temp_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
 
-        # Open the file to check if we have enough data to get video info
-        cap = cv2.VideoCapture(temp_path)
-        if not cap.isOpened():
-            logger.warning(
-                "Couldn't open video with header only, downloading more data"
-            )
-            cap.release()
+def _extract_roi_frames(cap, frame_indices, seek_gap=0):
+    """
+    Read the given frame indices in one forward pass, keeping detection regions.
 
-            # If we couldn't open with just the header, download a bit more
-            # Since we want the first frame, we'll download more from the beginning
-            download_size = 10 * 1024 * 1024  # 10MB from the beginning
+    Frames between targets are grabbed (decoded, but not converted or copied) and
+    only the requested ones are retrieved, so no frame is decoded twice. A gap
+    longer than seek_gap frames (0 = never) is skipped with a seek instead.
+    """
+    frames = []
+    position = 0
+    for target in sorted(set(frame_indices)):
+        if seek_gap and target - position > seek_gap:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            position = target
+        while position <= target:
+            if not cap.grab():
+                logger.warning(f"Video ended at frame {position}, before frame {target}")
+                return frames
+            position += 1
+        ret, frame = cap.retrieve()
+        if not ret:
+            logger.warning(f"Could not retrieve frame {target}")
+            continue
+        frames.append(keep_detection_rois(frame))
+    return frames
 
-            headers = {
-                "Range": f"bytes=0-{download_size - 1}",
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            }
 
-            logger.info(
-                f"Downloading larger portion of video from beginning: {download_size / (1024 * 1024):.1f}MB"
-            )
-            response = requests.get(
-                clip_details["download_url"], headers=headers, stream=True
-            )
+def _range_get(url, start, end):
+    """
+    Fetch bytes start..end (inclusive) of url; raises if ranges aren't honoured.
 
-            with open(temp_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+    A 206 only counts if its Content-Range starts at `start`, ends no later than
+    `end` (it stops short at the end of the file) and matches the body length, so a
+    proxy or CDN answering with some other range can't be mistaken for the bytes
+    asked for.
+    """
+    headers = {
+        "Range": f"bytes={start}-{end}",
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    }
+    response = http_client.get(url, headers=headers, timeout=CLIP_RANGE_TIMEOUT)
+    if response.status_code != 206:
+        raise ValueError(
+            f"Server doesn't support range requests (status: {response.status_code})"
+        )
+    content_range = response.headers.get("Content-Range") or ""
+    match = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+|\*)", content_range.strip())
+    if not match or int(match.group(1)) != start or int(match.group(2)) > end:
+        raise ValueError(f"Server answered bytes={start}-{end} with Content-Range {content_range!r}")
+    content = response.content
+    if len(content) != int(match.group(2)) - start + 1:
+        raise ValueError(f"Range body is {len(content)} bytes but Content-Range is {content_range!r}")
+    return content
+
+
+def _iter_boxes(data, start=0, end=None):
+    """Yield (type, payload_start, box_end) for the MP4 boxes in data[start:end]."""
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return
+        yield kind.decode("latin-1"), pos + header, pos + size
+        pos += size
+
+
+def _find_box(data, path, start=0, end=None):
+    """Return (payload_start, box_end) of the first box along a '/'-separated path."""
+    for i, name in enumerate(path.split("/")):
+        for kind, payload, box_end in _iter_boxes(data, start, end):
+            if kind == name:
+                start, end = payload, box_end
+                break
+        else:
+            return None
+    return start, end
+
+
+def _full_box_entries(data, box, fmt):
+    """Unpack the entry table of a full box (version/flags, entry count, entries)."""
+    start, _end = box
+    count = struct.unpack_from(">I", data, start + 4)[0]
+    return list(struct.iter_unpack(fmt, data[start + 8:start + 8 + count * struct.calcsize(fmt)]))
+
+
+def _read_descriptor(data, pos):
+    """Read an MPEG-4 descriptor header; returns (tag, payload_start, payload_end)."""
+    tag = data[pos]
+    pos += 1
+    length = 0
+    for _ in range(4):
+        byte = data[pos]
+        pos += 1
+        length = (length << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            break
+    return tag, pos, pos + length
+
+
+def _esds_decoder_config(data, start, end):
+    """DecoderSpecificInfo (VOS/VOL headers) from an esds box payload."""
+    tag, pos, es_end = _read_descriptor(data, start + 4)
+    if tag != 0x03:
+        return None
+    flags = data[pos + 2]
+    pos += 3
+    if flags & 0x80:
+        pos += 2
+    if flags & 0x40:
+        pos += 1 + data[pos]
+    if flags & 0x20:
+        pos += 2
+    while pos < es_end:
+        tag, payload, payload_end = _read_descriptor(data, pos)
+        if tag == 0x04:
+            pos = payload + 13
+            es_end = payload_end
+            continue
+        if tag == 0x05:
+            return bytes(data[payload:payload_end])
+        pos = payload_end
+    return None
+
+
+def _nal_parameter_sets(data, start, codec):
+    """(nal_length_size, [parameter set NAL units]) from an avcC or hvcC payload."""
+    nals = []
+    if codec == "h264":
+        length_size = (data[start + 4] & 0x03) + 1
+        pos = start + 5
+        for mask in (0x1F, 0xFF):  # SPS count, then PPS count
+            count = data[pos] & mask
+            pos += 1
+            for _ in range(count):
+                size = struct.unpack_from(">H", data, pos)[0]
+                nals.append(bytes(data[pos + 2:pos + 2 + size]))
+                pos += 2 + size
+    else:
+        length_size = (data[start + 21] & 0x03) + 1
+        arrays = data[start + 22]
+        pos = start + 23
+        for _ in range(arrays):
+            count = struct.unpack_from(">H", data, pos + 1)[0]
+            pos += 3
+            for _ in range(count):
+                size = struct.unpack_from(">H", data, pos)[0]
+                nals.append(bytes(data[pos + 2:pos + 2 + size]))
+                pos += 2 + size
+    return length_size, nals
+
+
+_ANNEX_B_START_CODE = b"\x00\x00\x00\x01"
+
+# Sample entry type -> (codec, decoder configuration box, elementary stream suffix)
+_SAMPLE_ENTRY_CODECS = {
+    "avc1": ("h264", "avcC", ".h264"),
+    "avc3": ("h264", "avcC", ".h264"),
+    "hvc1": ("hevc", "hvcC", ".hevc"),
+    "hev1": ("hevc", "hvcC", ".hevc"),
+    "mp4v": ("mpeg4", "esds", ".m4v"),
+}
+
+
+class Mp4VideoTrack:
+    """
+    Sample tables of an MP4's video track, enough to locate and decode keyframes.
 
-            # Try opening again
-            cap = cv2.VideoCapture(temp_path)
+    Built from the moov box alone (see read_mp4_video_track); sample offsets are
+    absolute file offsets, so each keyframe can be fetched with one range request.
+    """
 
-            if not cap.isOpened():
-                logger.warning(
-                    "Still couldn't open video, attempting one final approach"
-                )
-                cap.release()
+    def __init__(self, moov):
+        trak = None
+        for kind, payload, box_end in _iter_boxes(moov):
+            if kind != "trak":
+                continue
+            hdlr = _find_box(moov, "mdia/hdlr", payload, box_end)
+            if hdlr and moov[hdlr[0] + 8:hdlr[0] + 12] == b"vide":
+                trak = (payload, box_end)
+                break
+        if trak is None:
+            raise ValueError("MP4 has no video track")
+
+        mdhd = _find_box(moov, "mdia/mdhd", *trak)
+        stbl = _find_box(moov, "mdia/minf/stbl", *trak)
+        if mdhd is None or stbl is None:
+            raise ValueError("MP4 video track has no sample table")
+        version = moov[mdhd[0]]
+        self.timescale = struct.unpack_from(">I", moov, mdhd[0] + (20 if version == 1 else 12))[0]
+
+        def table(name):
+            box = _find_box(moov, name, *stbl)
+            if box is None:
+                raise ValueError(f"MP4 sample table is missing {name}")
+            return box
+
+        # Decode times: stts runs of (count, delta).
+        runs = _full_box_entries(moov, table("stts"), ">II")
+        deltas = np.repeat([d for _, d in runs], [c for c, _ in runs]).astype(np.int64)
+        self.sample_times = np.concatenate(([0], np.cumsum(deltas)[:-1])) if len(deltas) else deltas
+
+        # Sample sizes: one shared size, or a table.
+        stsz = table("stsz")
+        uniform, count = struct.unpack_from(">II", moov, stsz[0] + 4)
+        if uniform:
+            self.sample_sizes = [uniform] * count
+        else:
+            self.sample_sizes = list(struct.unpack_from(f">{count}I", moov, stsz[0] + 12))
+
+        # Absolute sample offsets: walk chunks (stco/co64) with stsc's samples-per-chunk.
+        chunk_box = _find_box(moov, "stco", *stbl)
+        chunk_offsets = (
+            [o for (o,) in _full_box_entries(moov, chunk_box, ">I")]
+            if chunk_box else
+            [o for (o,) in _full_box_entries(moov, table("co64"), ">Q")]
+        )
+        stsc = _full_box_entries(moov, table("stsc"), ">III")
+        self.sample_offsets = []
+        run = 0
+        for chunk_number, chunk_offset in enumerate(chunk_offsets, start=1):
+            while run + 1 < len(stsc) and stsc[run + 1][0] <= chunk_number:
+                run += 1
+            offset = chunk_offset
+            for _ in range(stsc[run][1]):
+                sample = len(self.sample_offsets)
+                if sample >= len(self.sample_sizes):
+                    break
+                self.sample_offsets.append(offset)
+                offset += self.sample_sizes[sample]
+
+        # Sync samples (1-based in stss); no stss means every sample is a keyframe.
+        stss = _find_box(moov, "stss", *stbl)
+        self.sync_samples = (
+            [s - 1 for (s,) in _full_box_entries(moov, stss, ">I")]
+            if stss else list(range(len(self.sample_offsets)))
+        )
+        if not self.sync_samples or not self.sample_offsets:
+            raise ValueError("MP4 video track has no keyframes")
+
+        # Decoder configuration from the first sample entry.
+        stsd = table("stsd")
+        entry = next(_iter_boxes(moov, stsd[0] + 8, stsd[1]), None)
+        if entry is None or entry[0] not in _SAMPLE_ENTRY_CODECS:
+            raise ValueError(f"Unsupported MP4 video codec: {entry[0] if entry else None}")
+        self.codec, config_name, self.suffix = _SAMPLE_ENTRY_CODECS[entry[0]]
+        config = _find_box(moov, config_name, entry[1] + 78, entry[2])
+        if config is None:
+            raise ValueError(f"MP4 sample entry {entry[0]} has no {config_name}")
+        if self.codec == "mpeg4":
+            self.nal_length_size = None
+            self.decoder_config = _esds_decoder_config(moov, *config) or b""
+        else:
+            self.nal_length_size, parameter_sets = _nal_parameter_sets(moov, config[0], self.codec)
+            self.decoder_config = b"".join(_ANNEX_B_START_CODE + nal for nal in parameter_sets)
+
+    @property
+    def duration(self):
+        """Track duration in seconds (decode time of the last sample)."""
+        return float(self.sample_times[-1]) / self.timescale if len(self.sample_times) else 0.0
+
+    def keyframe_near(self, timestamp):
+        """Index of the keyframe whose decode time is closest to timestamp (seconds)."""
+        target = timestamp * self.timescale
+        usable = [s for s in self.sync_samples if s < len(self.sample_offsets)]
+        return min(usable, key=lambda s: abs(float(self.sample_times[s]) - target))
+
+    def sample_range(self, sample):
+        """(offset, size) of a sample in the file."""
+        return self.sample_offsets[sample], self.sample_sizes[sample]
+
+    def sample_time(self, sample):
+        """Decode time of a sample in seconds."""
+        return float(self.sample_times[sample]) / self.timescale
+
+    def elementary_stream(self, sample_data):
+        """A standalone elementary stream that decodes to just this keyframe."""
+        if self.nal_length_size is None:
+            return self.decoder_config + sample_data
+        units = []
+        pos = 0
+        while pos + self.nal_length_size <= len(sample_data):
+            size = int.from_bytes(sample_data[pos:pos + self.nal_length_size], "big")
+            pos += self.nal_length_size
+            units.append(_ANNEX_B_START_CODE + sample_data[pos:pos + size])
+            pos += size
+        return self.decoder_config + b"".join(units)
+
+
+def read_mp4_video_track(url):
+    """
+    Locate and fetch the moov box of a remote MP4 with range requests.
 
-                # Last resort: try a direct seek approach
-                # This works for some streaming formats where the moov atom is at the end
-                # For first frame, we just need a larger chunk from the beginning
-                first_chunk_size = 20 * 1024 * 1024  # 20MB from the beginning
+    Walks the top-level box headers (ftyp, mdat, moov, ...) from the front of the
+    file, fetching only the first MP4_HEAD_FETCH_BYTES plus the moov box itself,
+    whether it sits before mdat (fast-start) or after it.
 
-                # Download first chunk
-                headers = {
-                    "Range": f"bytes=0-{first_chunk_size - 1}",
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-                }
+    Returns:
+        Mp4VideoTrack for the file's video track
+    """
+    head = _range_get(url, 0, MP4_HEAD_FETCH_BYTES - 1)
+    pos = 0
+    while True:
+        header = head[pos:pos + 16] if pos + 16 <= len(head) else _range_get(url, pos, pos + 15)
+        if len(header) < 8:
+            raise ValueError("Reached the end of the MP4 without finding moov")
+        size, kind = struct.unpack_from(">I4s", header)
+        if size == 1:
+            size = struct.unpack_from(">Q", header, 8)[0]
+        if size < 8:
+            raise ValueError(f"Unsupported MP4 box size {size} at offset {pos}")
+        if kind == b"moov":
+            header_size = 16 if struct.unpack_from(">I", header)[0] == 1 else 8
+            box = head[pos:pos + size] if pos + size <= len(head) else _range_get(url, pos, pos + size - 1)
+            return Mp4VideoTrack(memoryview(box)[header_size:].tobytes())
+        pos += size
+
+
+def _decode_elementary_stream(stream, suffix):
+    """Decode the first frame of a raw elementary stream; None if it won't decode."""
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(stream)
+        cap = cv2.VideoCapture(path)
+        try:
+            ok, frame = cap.read()
+        finally:
+            cap.release()
+        return frame if ok else None
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
 
-                logger.info(
-                    f"Trying larger chunk approach: 0-{first_chunk_size - 1} bytes"
-                )
-                response = requests.get(
-                    clip_details["download_url"], headers=headers, stream=True
-                )
 
-                with open(temp_path, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
+def fetch_keyframe(url, timestamp=0, track=None):
+    """
+    Fetch and decode the keyframe nearest timestamp from a remote MP4.
 
-                # Try opening again
-                cap = cv2.VideoCapture(temp_path)
+    Only the moov box (skipped when a track from read_mp4_video_track is passed)
+    and the keyframe's own bytes are downloaded.
 
-                if not cap.isOpened():
-                    # If all approaches fail, fall back to downloading the whole clip
-                    logger.warning(
-                        "All optimized download approaches failed. Falling back to downloading the entire clip."
-                    )
-                    full_download = True
-                else:
-                    full_download = False
-            else:
-                full_download = False
-        else:
-            # Check if we can actually read a frame with just the header
-            ret, _ = cap.read()
-            if not ret:
-                # If we can't read a frame, we need more data
-                logger.info(
-                    "Header downloaded but can't read frames yet, downloading more data from beginning"
-                )
-                cap.release()
+    Returns:
+        tuple: (frame, keyframe_time_seconds)
+    """
+    track = track or read_mp4_video_track(url)
+    sample = track.keyframe_near(timestamp)
+    return _fetch_keyframe_sample(url, track, sample), track.sample_time(sample)
 
-                # Since we want the first frame, download more from the beginning
-                download_size = 10 * 1024 * 1024  # 10MB
-                headers = {
-                    "Range": f"bytes=0-{download_size}",
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-                }
 
-                logger.info(
-                    f"Downloading {download_size / (1024 * 1024):.1f}MB from beginning"
-                )
-                response = requests.get(
-                    clip_details["download_url"], headers=headers, stream=True
-                )
+def _fetch_keyframe_sample(url, track, sample):
+    """Range-fetch one keyframe sample and decode it."""
+    offset, size = track.sample_range(sample)
+    data = _range_get(url, offset, offset + size - 1)
+    if len(data) != size:
+        raise ValueError(f"Short read for keyframe {sample}: {len(data)}/{size} bytes")
+    frame = _decode_elementary_stream(track.elementary_stream(data), track.suffix)
+    if frame is None:
+        raise ValueError(f"Could not decode keyframe {sample} ({track.codec})")
+    return frame
 
-                with open(temp_path, "wb") as f:  # Overwrite with a fresh download
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
 
-                cap = cv2.VideoCapture(temp_path)
-                full_download = not (cap.isOpened() and cap.read()[0])
-            else:
-                cap.release()  # Release and reopen after we know it works
-                cap = cv2.VideoCapture(temp_path)
-                full_download = False
+def iter_keyframes(url, timestamps, track=None, max_workers=None):
+    """
+    Fetch and decode the keyframes nearest several timestamps concurrently.
 
-        # If we need to download the full clip as a last resort
-        if full_download:
-            logger.warning(
-                "Optimized approaches failed. Downloading entire clip as last resort."
-            )
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
+    Timestamps that land on the same keyframe share one fetch. Frames are yielded
+    as their range requests complete, so a caller can start on the first while the
+    rest are still downloading; a keyframe that fails is logged and skipped. Closing
+    the generator early cancels the fetches that haven't started.
 
-            logger.info("Downloading the entire clip")
-            response = requests.get(
-                clip_details["download_url"], headers=headers, stream=True
-            )
-            response.raise_for_status()
+    Yields:
+        tuple: (keyframe_time_seconds, frame), in completion order
+    """
+    track = track or read_mp4_video_track(url)
+    samples = sorted({track.keyframe_near(t) for t in timestamps})
+    if not samples:
+        return
+    workers = min(len(samples), max_workers or CLIP_SAMPLE_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_fetch_keyframe_sample, url, track, s): s for s in samples}
+        try:
+            for future in as_completed(futures):
+                sample = futures[future]
+                try:
+                    frame = future.result()
+                except Exception as e:
+                    logger.warning(f"Skipping keyframe {sample}: {e}")
+                    continue
+                yield track.sample_time(sample), frame
+        finally:
+            # A caller that stops early (closing the generator) doesn't wait for
+            # fetches that haven't started.
+            for future in futures:
+                future.cancel()
 
-            with open(temp_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
 
-            cap = cv2.VideoCapture(temp_path)
-            if not cap.isOpened():
-                raise ValueError(
-                    f"Could not open video file even after downloading the entire clip: {temp_path}"
-                )
+def sample_clip_keyframes(clip_details, interval):
+    """
+    Keyframes spread across a clip, fetched with range requests instead of
+    downloading it.
 
-        # Get video properties
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        orig_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        orig_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        actual_duration = frame_count / fps if fps > 0 else 0
+    Timestamps run back from the end of the clip every `interval` seconds (the same
+    grid extract_frames uses); each is served by its nearest keyframe. Frames are
+    resized to 1080p like download_single_frame's.
 
-        logger.info(
-            f"Video properties: FPS={fps}, Frames={frame_count}, Duration={actual_duration:.2f}s, Resolution={orig_width}x{orig_height}"
+    Yields:
+        tuple: (keyframe_time_seconds, frame), in completion order
+    """
+    if not clip_details.get("download_url"):
+        raise ValueError("No download URL available")
+    url = clip_details["download_url"]
+    track = read_mp4_video_track(url)
+    duration = track.duration or clip_details.get("duration") or 0
+    timestamps = np.arange(duration, -1e-6, -interval)[::-1]
+    logger.info(f"Sampling {len(timestamps)} keyframes from clip {clip_details.get('id')}")
+    for keyframe_time, frame in iter_keyframes(url, timestamps, track=track):
+        yield keyframe_time, resize_to_1080p(frame)
+
+
+def resize_to_1080p(frame):
+    """Resize a frame to 1920x1080 (the geometry the detectors expect) if needed."""
+    target_width, target_height = 1920, 1080
+    if frame.shape[1] != target_width or frame.shape[0] != target_height:
+        frame = cv2.resize(
+            frame, (target_width, target_height), interpolation=cv2.INTER_LANCZOS4
         )
+    return frame
 
-        # For first frame, we'll use frame index 0
-        frame_idx = 0
-        logger.info(f"Seeking to first frame (frame {frame_idx})")
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-        ret, frame = cap.read()
 
+def _read_frame_from_clip(clip_details, timestamp):
+    """Fallback: download the whole clip (download_clip) and read the frame at timestamp."""
+    clip_path = download_clip(clip_details)
+    cap = cv2.VideoCapture(clip_path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file: {clip_path}")
+        if timestamp:
+            cap.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000)
+        ret, frame = cap.read()
         if not ret:
-            # If seeking to first frame fails, try getting a frame near the beginning
-            logger.warning(f"Could not read first frame, trying alternate frames")
-
             # Try a few different frames near the beginning
-            test_positions = [1, 5, 10, 30]
-            for pos in test_positions:
+            for pos in [1, 5, 10, 30]:
                 cap.set(cv2.CAP_PROP_POS_FRAMES, pos)
                 ret, frame = cap.read()
                 if ret:
                     logger.info(f"Successfully read frame at position {pos}")
                     break
+        if not ret:
+            raise ValueError("Could not read any frames from the video")
+        return frame
+    finally:
+        cap.release()
 
-            if not ret:
-                raise ValueError(f"Could not read any frames from the video")
 
-        # Resize frame to 1080p if needed
-        target_width, target_height = 1920, 1080
-        if orig_width != target_width or orig_height != target_height:
-            frame = cv2.resize(
-                frame, (target_width, target_height), interpolation=cv2.INTER_LANCZOS4
-            )
+def download_single_frame(clip_details, timestamp=None, return_frame=False):
+    """
+    Download and extract a single frame from a Twitch clip without downloading the entire clip.
+    Uses HTTP Range requests to fetch only the MP4's moov box and the keyframe nearest
+    the timestamp (fetch_keyframe), falling back to downloading the whole clip.
 
-        # Save the frame
-        cv2.imwrite(str(frame_path), frame)
+    Args:
+        clip_details: Dictionary containing clip details from get_clip_details()
+        timestamp: Time in seconds to extract the frame from (default: first frame of the clip);
+            the keyframe nearest it is used
+        return_frame: Return the decoded BGR frame instead of writing a JPEG. A frame
+            already on disk for this clip is still reused.
 
-        # Clean up
-        cap.release()
+    Returns:
+        Path to the extracted frame image, or the frame itself when return_frame is set
+    """
+    if not clip_details.get("download_url"):
+        raise ValueError("No download URL available")
+
+    clip_id = clip_details["id"]
+
+    # Create frames directory
+    frames_dir = TEMP_DIR / "frames"
+    frames_dir.mkdir(exist_ok=True)
+
+    # Define output path for the frame
+    frame_path = frames_dir / f"{clip_id}.jpg"
+
+    # Check if we already have this frame
+    if frame_path.exists():
+        logger.info(f"Frame already exists at {frame_path}, reusing it")
+        if return_frame:
+            frame = cv2.imread(str(frame_path), cv2.IMREAD_COLOR)
+            if frame is not None:
+                return frame
+            logger.warning(f"Could not decode existing frame {frame_path}, fetching it again")
+        else:
+            return str(frame_path)
+
+    # If timestamp not specified, use the first frame of the clip
+    if timestamp is None:
+        timestamp = 0  # Use the beginning of the clip
+        logger.info(f"No timestamp specified, using first frame: {timestamp}s")
+
+    logger.info(f"Fetching single frame at timestamp {timestamp}s from clip {clip_id}")
+
+    try:
         try:
-            os.unlink(temp_path)
+            frame, keyframe_time = fetch_keyframe(clip_details["download_url"], timestamp)
+            logger.info(f"Fetched keyframe at {keyframe_time:.2f}s with range requests")
         except Exception as e:
-            logger.warning(f"Failed to delete temporary file {temp_path}: {e}")
+            # Single fallback: no range support, an unexpected box layout or a codec
+            # we can't decode standalone. The whole clip is cached in TEMP_DIR, so
+            # later sampling/re-scan reuses this download.
+            logger.warning(f"Byte-range keyframe fetch failed ({e}), downloading the entire clip")
+            frame = _read_frame_from_clip(clip_details, timestamp)
+
+        # Resize frame to 1080p if needed
+        frame = resize_to_1080p(frame)
+
+        if return_frame:
+            logger.info(f"Successfully decoded frame of clip {clip_id}")
+            return frame
+
+        # Save the frame
+        cv2.imwrite(str(frame_path), frame)
 
         # Verify the frame was saved successfully
         if not frame_path.exists() or frame_path.stat().st_size == 0:
             raise ValueError(f"Failed to save frame to {frame_path}")
 
-        logger.info(f"Successfully extracted first frame to {frame_path}")
+        logger.info(f"Successfully extracted frame to {frame_path}")
         return str(frame_path)
 
     except Exception as e:
         logger.error(f"Error extracting single frame: {e}")
-        # Clean up temporary file if it exists
-        try:
-            if temp_path is not None and os.path.exists(temp_path):
-                os.unlink(temp_path)
-        except:
-            pass
         raise
@@ -32,11 +32,13 @@ Template Matching Optimizations:
 
 import math
 import os
+import hashlib
 import sys
 import json
 import logging
 import argparse
 from pathlib import Path
+from types import MappingProxyType
 import cv2
 import numpy as np
 from tqdm import tqdm
@@ -44,6 +46,8 @@ import requests
 import uuid
 import time
 import re
+import tempfile
+import threading
 from concurrent.futures import ThreadPoolExecutor
 import traceback
 
@@ -59,12 +63,12 @@ except ImportError:
 
 # Import our modules if available
 try:
-    from clip_utils import get_clip_details, download_clip, download_single_frame, extract_frames
+    from clip_utils import get_clip_details, download_clip, download_single_frame, extract_frames, sample_clip_keyframes
     from stream_utils import capture_multiple_frames
 except ImportError as e:
     # For standalone usage
     try:
-        from .clip_utils import get_clip_details, download_clip, download_single_frame, extract_frames
+        from .clip_utils import get_clip_details, download_clip, download_single_frame, extract_frames, sample_clip_keyframes
         from .stream_utils import capture_multiple_frames
     except ImportError as rel_e:
         print(f"Warning: clip_utils module not found, standalone mode only. Error: {e}, Relative import error: {rel_e}")
@@ -224,21 +228,59 @@ MIN_VALID_SLOTS = int(os.environ.get("MIN_VALID_SLOTS", 8))
 # The pick-screen fallback (colour gate failed, but the All Pick top bar is readable)
 # emits a names+ranks roster only when at least this many of the 10 slots resolve.
 MIN_PICK_SCREEN_SLOTS = int(os.environ.get("MIN_PICK_SCREEN_SLOTS", 8))
+# Roster fast path for repeated stream captures: a slot counts as unchanged while its
+# mean-subtracted thumbnail fingerprint keeps at least this cosine similarity with the
+# one stored alongside the stream's confirmed roster.
+ROSTER_FINGERPRINT_SIMILARITY = float(os.environ.get("ROSTER_FINGERPRINT_SIMILARITY", 0.9))
 # Number of extra frames to pull from a clip when re-scanning low-confidence slots.
 RESCAN_FRAME_COUNT = int(os.environ.get("RESCAN_FRAME_COUNT", 3))
 # Frames sampled across a clip before choosing which one to analyse. Clips are now 60s
 # (Twitch's max) while the roster panel is only up for ~30s, so reading frame 0 alone
 # makes the result depend on capture timing being right.
 SAMPLE_FRAME_COUNT = int(os.environ.get("SAMPLE_FRAME_COUNT", 8))
+# Cascade mode: when > 0, a cheap downsampled prefilter shortlists this many templates
+# per slot and only those get the full-resolution bordered match (0 matches the whole
+# bank). Check a value against real frames with --cascade-recall before enabling it.
+CASCADE_TOP_K = int(os.environ.get("CASCADE_TOP_K", 0))
+# Thumbnail size (width, height) the cascade prefilter compares at.
+CASCADE_COARSE_SIZE = (32, 18)
+# When > 0, both matchers first ask the descriptor index for this many candidate heroes
+# and only template-match their variants (0 considers every hero).
+DESCRIPTOR_CANDIDATE_HEROES = int(os.environ.get("DESCRIPTOR_CANDIDATE_HEROES", 0))
+# HSV histogram bins (hue, saturation, value) in the compact per-variant descriptor.
+DESCRIPTOR_HIST_BINS = [8, 4, 4]
+# Threads in the process-wide matching executor. Each slot of a frame is matched as its
+# own job on it, so a lone request uses every thread while this still caps concurrent
+# matching across all queue worker threads.
+MATCH_WORKERS = int(os.environ.get("MATCH_WORKERS", min(os.cpu_count() or 4, 4)))
+# Compact template storage: keep the preprocessed template banks as single grayscale
+# planes (picking stacks and in-game templates), roughly a third of the per-process
+# memory, at the cost of colour information. Compare accuracy on real frames with
+# --storage-benchmark before enabling it.
+COMPACT_TEMPLATES = os.environ.get("COMPACT_TEMPLATES", "").lower() in ("1", "true", "yes")
 
 # Mapping of known heroes
 HEROES_FILE = HEROES_DIR / "hero_data.json"
-# Cache file for precomputed templates
-TEMPLATES_CACHE_FILE = HEROES_DIR / "templates_cache.npz"
+# Cache file for precomputed templates: one contiguous array, memory-mapped read-only,
+# with a templates_cache.json manifest next to it
+TEMPLATES_CACHE_FILE = HEROES_DIR / "templates_cache.npy"
+# Bump when the cache layout changes so old caches are rebuilt rather than misread
+TEMPLATE_CACHE_FORMAT_VERSION = 4
+# Kinds of template sharing the cache: cropped picking-bar portraits and whole in-game
+# portraits, both stored unbordered at 128x72
+PICKING_TEMPLATE_KIND = "picking"
+IN_GAME_TEMPLATE_KIND = "in_game"
+# Threads that hash, decode and crop portraits when templates have to be (re)computed
+TEMPLATE_PRECOMPUTE_WORKERS = int(os.environ.get("TEMPLATE_PRECOMPUTE_WORKERS", os.cpu_count() or 4))
 
 # Global variable to store loaded heroes data for singleton pattern
 _LOADED_HEROES_DATA = None
 
+# Template preprocessing configs (apply_blur, border_size) baked into the template
+# bank at load time. process_media always enables both the blur and the 20px border.
+TEMPLATE_BANK_CONFIGS = ((True, 20),)
+_TEMPLATE_BANK = None
+
 def save_debug_image(image, name_prefix, additional_info=""):
     """Save an image for debugging purposes."""
     if os.environ.get("DEBUG_IMAGES", "").lower() in ("1", "true", "yes"):
@@ -265,38 +307,73 @@ def load_image(image_path):
     Load an image while handling any color profile issues.
 
     Args:
-        image_path: Path to the image file
+        image_path: Path to the image file, or an already decoded BGR frame, which
+            is used as-is so in-memory frames are never re-encoded
 
     Returns:
         The loaded image or None if loading failed
     """
     try:
-        # Read the image with IMREAD_IGNORE_ORIENTATION | IMREAD_COLOR
-        # This helps avoid issues with color profiles
-        image = cv2.imread(str(image_path), cv2.IMREAD_IGNORE_ORIENTATION | cv2.IMREAD_COLOR)
+        if isinstance(image_path, np.ndarray):
+            image = image_path
+        else:
+            # Read the image with IMREAD_IGNORE_ORIENTATION | IMREAD_COLOR
+            # This helps avoid issues with color profiles
+            image = cv2.imread(str(image_path), cv2.IMREAD_IGNORE_ORIENTATION | cv2.IMREAD_COLOR)
 
         if image is None:
-            logger.warning(f"Could not load image: {image_path}")
+            logger.warning(f"Could not load image: {_frame_label(image_path)}")
             return None
 
         # Apply color profile correction if enabled via environment variable
         if os.environ.get("COLOR_CORRECTION", "").lower() in ("1", "true", "yes"):
             # Convert to LAB color space and back to ensure consistent colors
             # This helps normalize images with different color profiles
-            logger.debug(f"Applying color profile correction to {image_path}")
+            logger.debug(f"Applying color profile correction to {_frame_label(image_path)}")
             lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
             image = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
 
         return image
     except Exception as e:
-        logger.error(f"Error loading image {image_path}: {e}")
+        logger.error(f"Error loading image {_frame_label(image_path)}: {e}")
+        return None
+
+
+def _frame_label(frame):
+    """Describe a frame path or in-memory frame for log messages."""
+    if isinstance(frame, np.ndarray):
+        return f"<in-memory frame {frame.shape[1]}x{frame.shape[0]}>"
+    return str(frame)
+
+
+def _frame_path_or_none(frame):
+    """The frame's path, or None for an in-memory frame (keeps results JSON-safe)."""
+    return None if isinstance(frame, np.ndarray) else frame
+
+
+def _save_frame(frame, name):
+    """Write an in-memory frame to TEMP_DIR/frames/<name>.jpg and return the path.
+
+    Only frames that are served from /images (or kept for debugging) need this; the
+    detection pipeline itself works on decoded frames. Paths are returned unchanged.
+    """
+    if not isinstance(frame, np.ndarray):
+        return frame
+    frames_dir = TEMP_DIR / "frames"
+    frames_dir.mkdir(exist_ok=True)
+    frame_path = frames_dir / f"{name}.jpg"
+    if not cv2.imwrite(str(frame_path), frame):
+        logger.error(f"Failed to save frame to {frame_path}")
         return None
+    return str(frame_path)
 
 def load_heroes_data():
     """
     Load hero data from heroes.json file and precompute templates.
 
-    Uses a singleton pattern to ensure data is only loaded once per process.
+    Templates come from the memory-mapped template cache; only variants whose source
+    image is new or changed are computed, in parallel, and the cache rewritten (see
+    _resolve_templates). Uses a singleton pattern to ensure data is only loaded once per process.
     """
     global _LOADED_HEROES_DATA
 
@@ -321,87 +398,29 @@ def load_heroes_data():
         with open(HEROES_FILE, 'r') as f:
             heroes_data = json.load(f)
 
-        templates_dict = {}
-        templates_changed = False
-
-        # Check if cache file exists
-        if TEMPLATES_CACHE_FILE.exists():
-            logger.info(f"Loading precomputed templates from cache: {TEMPLATES_CACHE_FILE}")
-            performance_timer.start('load_cached_templates')
-
-            # Load the cached templates
-            cached_data = np.load(str(TEMPLATES_CACHE_FILE), allow_pickle=True)
-            templates_dict = cached_data['templates'].item()
-
-            # Apply cached templates to hero data
-            templates_loaded = 0
-            for hero in heroes_data:
-                for variant in hero.get('variants', []):
-                    template_path = variant.get('image_path')
-                    cache_key = str(template_path)
+        roster_digest = _roster_digest(heroes_data)
 
-                    if cache_key in templates_dict:
-                        variant['cached_template'] = templates_dict[cache_key]
-                        templates_loaded += 1
-                    else:
-                        template_file = Path(template_path)
-                        if template_file.exists():
-                            template = load_image(template_file)
-                            if template is not None:
-                                template_cropped = crop_hero_portrait(template, debug=False)
-                                cached_template = cv2.resize(template_cropped, (128, 72))
-                                variant['cached_template'] = cached_template
-                                templates_dict[cache_key] = cached_template
-                                templates_loaded += 1
-                                templates_changed = True
-                            else:
-                                variant['cached_template'] = None
-                        else:
-                            variant['cached_template'] = None
-
-            logger.debug(f"Loaded {templates_loaded} cached templates from disk")
-            if templates_changed:
-                logger.info("Saving updated template cache with newly discovered hero templates")
-                np.savez(str(TEMPLATES_CACHE_FILE), templates=templates_dict)
-            performance_timer.stop('load_cached_templates')
-
-            # Store in the singleton
-            _LOADED_HEROES_DATA = heroes_data
-            return heroes_data
-
-        # If no cache exists, precompute and save to cache
-        logger.info(f"Precomputing templates for {len(heroes_data)} heroes...")
+        # Reuse every cached template whose source image is unchanged and compute the rest
+        image_paths = list(dict.fromkeys(
+            str(variant.get('image_path'))
+            for hero in heroes_data
+            for variant in hero.get('variants', [])
+            if variant.get('image_path')
+        ))
         performance_timer.start('load_heroes_data')
-        templates_loaded = 0
-        templates_dict = {}
+        templates_dict = _resolve_templates(image_paths, roster_digest, PICKING_TEMPLATE_KIND)
+        performance_timer.stop('load_heroes_data')
 
+        templates_loaded = 0
         for hero in heroes_data:
             for variant in hero.get('variants', []):
-                template_path = Path(variant.get('image_path'))
-                if template_path.exists():
-                    template = load_image(template_path)
-                    if template is not None:
-                        # Apply crop and resize once
-                        template_cropped = crop_hero_portrait(template, debug=False)
-                        cached_template = cv2.resize(template_cropped, (128, 72))
-                        variant['cached_template'] = cached_template
-
-                        # Save to templates dict for caching
-                        templates_dict[str(template_path)] = cached_template
-                        templates_loaded += 1
-                    else:
-                        variant['cached_template'] = None
-                else:
-                    variant['cached_template'] = None
-
-        # Save templates to cache file
-        logger.info(f"Saving {templates_loaded} precomputed templates to cache file")
-        np.savez(str(TEMPLATES_CACHE_FILE), templates=templates_dict)
-
-        logger.debug(f"Loaded and cached {templates_loaded} templates from {len(heroes_data)} heroes")
-        performance_timer.stop('load_heroes_data')
+                variant['cached_template'] = templates_dict.get(str(variant.get('image_path')))
+                if variant['cached_template'] is not None:
+                    templates_loaded += 1
+        logger.debug(f"Loaded {templates_loaded} templates for {len(heroes_data)} heroes")
 
         # Store in the singleton
+        _build_template_bank(heroes_data)
         _LOADED_HEROES_DATA = heroes_data
         return heroes_data
     except Exception as e:
@@ -409,6 +428,261 @@ def load_heroes_data():
         traceback.print_exc()
         return None
 
+
+def _roster_digest(heroes_data):
+    """Digest of dota_heroes.hero_roster_signature, used to version the template cache."""
+    try:
+        from dota_heroes import hero_roster_digest
+    except ImportError:
+        from .dota_heroes import hero_roster_digest
+    return hero_roster_digest(heroes_data)
+
+
+def _compute_cached_template(image_path):
+    """Load a portrait variant and crop/resize it to the 128x72 matching template, or None."""
+    if not image_path or not Path(image_path).exists():
+        return None
+    template = load_image(image_path)
+    if template is None:
+        return None
+    template_cropped = crop_hero_portrait(template, debug=False)
+    return cv2.resize(template_cropped, (128, 72))
+
+
+def _compute_in_game_template(image_path):
+    """Load a whole portrait variant resized to the 128x72 in-game template (unbordered), or None."""
+    if not image_path or not Path(image_path).exists():
+        return None
+    template = load_image(image_path)
+    if template is None:
+        return None
+    return cv2.resize(template, (128, 72))
+
+
+def _template_builder(kind):
+    """The function that computes one cached template of the given kind from its image."""
+    if kind == IN_GAME_TEMPLATE_KIND:
+        return _compute_in_game_template
+    return _compute_cached_template
+
+
+def _template_manifest_file():
+    """The manifest sits next to the template array (templates_cache.json)."""
+    return TEMPLATES_CACHE_FILE.with_suffix(".json")
+
+
+def _read_template_cache():
+    """
+    Memory-map the template cache read-only.
+
+    The cache is one contiguous uint8 (N, 72, 128, 3) array plus a JSON manifest with
+    one entry per row: the template kind, the image_path key, the sha1 of the source
+    PNG and its size and mtime, and the roster digest each kind was last built for. Mapping it (rather than unpickling a dict of arrays) lets every worker
+    process share one physical copy through the page cache. The manifest also records
+    the array file's size and the sha1 of its data, so an array and manifest written
+    by two different processes are never paired.
+
+    Returns:
+        tuple: (manifest, templates) or (None, None) if there is no usable cache
+    """
+    manifest_file = _template_manifest_file()
+    if not TEMPLATES_CACHE_FILE.exists() or not manifest_file.exists():
+        return None, None
+
+    try:
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+
+        if manifest.get('format_version') != TEMPLATE_CACHE_FORMAT_VERSION:
+            logger.info(f"Template cache format changed, rebuilding: {TEMPLATES_CACHE_FILE}")
+            return None, None
+
+        if os.stat(TEMPLATES_CACHE_FILE).st_size != manifest.get('array_bytes'):
+            logger.warning(f"Template cache does not match its manifest, rebuilding: {TEMPLATES_CACHE_FILE}")
+            return None, None
+
+        templates = np.load(str(TEMPLATES_CACHE_FILE), mmap_mode='r', allow_pickle=False)
+        entries = manifest.get('entries', [])
+        if (templates.dtype != np.uint8 or templates.shape != (len(entries), 72, 128, 3)
+                or hashlib.sha1(templates).hexdigest() != manifest.get('array_sha1')):
+            logger.warning(f"Template cache does not match its manifest, rebuilding: {TEMPLATES_CACHE_FILE}")
+            return None, None
+
+        return manifest, templates
+    except Exception as e:
+        logger.warning(f"Could not read template cache {TEMPLATES_CACHE_FILE}: {e}")
+        return None, None
+
+
+def _image_file_record(image_path):
+    """Cache manifest entry (key, sha1, size, mtime_ns) for a source image, or None if it is missing."""
+    try:
+        stat = os.stat(image_path)
+        with open(image_path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+    return {'key': image_path, 'sha1': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _resolve_templates(image_paths, roster_digest, kind=PICKING_TEMPLATE_KIND):
+    """
+    Serve each image_path's template of `kind` from the cache, recomputing only changed images.
+
+    When the manifest's digest for this kind matches the roster, an entry whose file size and mtime
+    are unchanged is trusted without reading the image. Everything else is re-hashed,
+    and any cached row with the same content hash is reused (a roster change or a
+    re-download of identical portraits costs a hash, not a decode). Only images with
+    new content are decoded and cropped, on TEMPLATE_PRECOMPUTE_WORKERS threads
+    (cv2 releases the GIL). Images that fail to decode are recorded in the manifest
+    too, so an unchanged broken image doesn't force a rewrite on every start. If
+    anything changed the cache is rewritten and remapped; rows of other kinds are
+    carried over untouched.
+
+    Returns:
+        dict: image_path -> template (read-only memmap views when the cache is usable)
+    """
+    manifest, cached = _read_template_cache()
+    entries = manifest.get('entries', []) if manifest else []
+    roster_digests = (manifest.get('roster_digests') or {}) if manifest else {}
+    own_rows = [i for i, entry in enumerate(entries) if entry.get('kind') == kind]
+    rows_by_key = {entries[i]['key']: i for i in own_rows}
+    rows_by_hash = {entries[i]['sha1']: i for i in own_rows}
+    all_failed = (manifest.get('failed_entries') or []) if manifest else []
+    failed_by_key = {entry['key']: entry for entry in all_failed if entry.get('kind') == kind}
+    failed_hashes = {entry['sha1'] for entry in failed_by_key.values()}
+    trust_stat = roster_digests.get(kind) == roster_digest
+
+    templates_dict = {}
+    records = {}
+    failed = {}
+    to_hash = []
+    for image_path in image_paths:
+        row = rows_by_key.get(image_path)
+        entry = entries[row] if row is not None else failed_by_key.get(image_path)
+        if trust_stat and entry is not None:
+            try:
+                stat = os.stat(image_path)
+            except OSError:
+                continue
+            if entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+                if row is not None:
+                    templates_dict[image_path] = cached[row]
+                    records[image_path] = entry
+                else:
+                    failed[image_path] = entry
+                continue
+        to_hash.append(image_path)
+
+    if (not to_hash and set(records) == set(rows_by_key)
+            and set(failed) == set(failed_by_key) and trust_stat):
+        logger.info(f"Mapped {len(records)} precomputed templates from cache: {TEMPLATES_CACHE_FILE}")
+        return templates_dict
+
+    with ThreadPoolExecutor(max_workers=max(1, TEMPLATE_PRECOMPUTE_WORKERS)) as pool:
+        to_compute = []
+        for image_path, record in zip(to_hash, pool.map(_image_file_record, to_hash)):
+            if record is None:
+                continue
+            row = rows_by_hash.get(record['sha1'])
+            if row is not None:
+                records[image_path] = record
+                templates_dict[image_path] = cached[row]
+            elif record['sha1'] in failed_hashes:
+                failed[image_path] = record  # same bytes that failed to decode before
+            else:
+                records[image_path] = record
+                to_compute.append(image_path)
+
+        if to_compute:
+            logger.info(f"Precomputing {len(to_compute)} {kind} templates "
+                        f"({len(records) - len(to_compute)} reused from cache)...")
+        builder = _template_builder(kind)
+        for image_path, template in zip(to_compute, pool.map(builder, to_compute)):
+            if template is None:
+                failed[image_path] = records.pop(image_path)
+            else:
+                templates_dict[image_path] = template
+
+    other_rows = [i for i, entry in enumerate(entries) if entry.get('kind') != kind]
+    templates = [templates_dict[key] for key in templates_dict] + [cached[i] for i in other_rows]
+    new_entries = [dict(records[key], kind=kind) for key in templates_dict] + [entries[i] for i in other_rows]
+    new_failed = ([dict(record, kind=kind) for record in failed.values()]
+                  + [entry for entry in all_failed if entry.get('kind') != kind])
+    logger.info(f"Saving {len(templates)} precomputed templates to cache file")
+    _save_template_cache(templates, new_entries, dict(roster_digests, **{kind: roster_digest}), new_failed)
+
+    # Serve this process from the shared mapping too, not its private copies
+    manifest, cached = _read_template_cache()
+    if manifest is None:
+        return templates_dict
+    return {entry['key']: cached[i] for i, entry in enumerate(manifest['entries']) if entry.get('kind') == kind}
+
+
+def _save_template_cache(templates, entries, roster_digests, failed_entries=()):
+    """
+    Write the template array and its manifest atomically.
+
+    entries holds the manifest record for each template row, in order,
+    roster_digests the roster each template kind was built for, and
+    failed_entries the records of images that could not be decoded. Each file is
+    written to its own uniquely named temp file and moved into place with
+    os.replace, so processes building the cache at the same time never write into
+    each other's files. The two replaces are not one atomic step: if writers
+    interleave, the manifest's array size and sha1 make readers reject the
+    mismatched pair and rebuild. Processes still mapping the old array keep their
+    (unlinked) copy.
+    """
+    if templates:
+        templates = np.ascontiguousarray(np.stack([np.asarray(t) for t in templates]), dtype=np.uint8)
+    else:
+        templates = np.zeros((0, 72, 128, 3), dtype=np.uint8)
+
+    manifest = {
+        'format_version': TEMPLATE_CACHE_FORMAT_VERSION,
+        'roster_digests': roster_digests,
+        'shape': list(templates.shape),
+        'dtype': str(templates.dtype),
+        'array_sha1': hashlib.sha1(templates).hexdigest(),
+        'entries': entries,
+        'failed_entries': list(failed_entries),
+    }
+
+    try:
+        manifest['array_bytes'] = _replace_file(
+            TEMPLATES_CACHE_FILE, lambda f: np.save(f, templates, allow_pickle=False))
+        _replace_file(_template_manifest_file(), lambda f: f.write(json.dumps(manifest).encode()))
+    except Exception as e:
+        logger.error(f"Error saving template cache {TEMPLATES_CACHE_FILE}: {e}")
+
+
+def _replace_file(path, write):
+    """
+    Write path through a private temp file in the same directory, then os.replace it.
+
+    Args:
+        path: Destination file
+        write: Called with the open binary temp file
+
+    Returns:
+        int: Size of the written file in bytes
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            size = f.tell()
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+        return size
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 def extract_hero_bar(frame, debug=False):
     """
     Extract the hero bar from the top of the screen.
@@ -889,7 +1163,489 @@ def crop_rank_banner(top_bar, center_x, team, position, debug=False):
         logger.error(f"Error cropping rank banner for {team} position {position+1}: {e}")
         return None
 
-def get_top_hero_matches(hero_icon, heroes_data, top_n=5, min_score=0.4, debug=False):
+def _coarse_descriptors(images, mean_subtract=False):
+    """
+    Unit-length thumbnail vectors (CASCADE_COARSE_SIZE) for the cascade prefilter.
+
+    A dot product between two descriptors approximates the full-resolution score at
+    zero offset: CCORR for the picking path, CCOEFF when `mean_subtract` is set.
+    """
+    if not images:
+        return np.zeros((0, CASCADE_COARSE_SIZE[0] * CASCADE_COARSE_SIZE[1] * 3), dtype=np.float32)
+
+    vectors = np.stack([
+        cv2.resize(image, CASCADE_COARSE_SIZE, interpolation=cv2.INTER_AREA) for image in images
+    ]).reshape(len(images), -1).astype(np.float32)
+    if mean_subtract:
+        vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def _coarse_shortlist(descriptors, icon, top_k, mean_subtract=False, indices=None):
+    """
+    Indices (in bank order) of the `top_k` descriptors closest to the icon's.
+
+    `indices` restricts the search to a subset of the bank (e.g. descriptor index
+    candidates); the returned indices still refer to the whole bank.
+    """
+    indices = np.arange(len(descriptors)) if indices is None else np.asarray(indices, dtype=int)
+    if top_k >= len(indices):
+        return indices
+    coarse_scores = descriptors[indices] @ _coarse_descriptors([icon], mean_subtract=mean_subtract)[0]
+    return np.sort(indices[np.argpartition(-coarse_scores, top_k - 1)[:top_k]])
+
+
+def _compact_descriptor(image):
+    """
+    Compact, unit-length colour + structure descriptor of a portrait or slot icon.
+
+    Half HSV colour histogram (square-rooted, so a dot product is the Bhattacharyya
+    coefficient) and half 8x8 average hash (as +/-1 bits, so a dot product is the
+    fraction of agreeing bits rescaled to [-1, 1]). Both tolerate the small shifts
+    and compression noise that throw off pixel-aligned matching. Grayscale (compact)
+    templates only fill the value bins.
+    """
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1, 2], None, DESCRIPTOR_HIST_BINS, [0, 180, 0, 256, 0, 256]).ravel()
+    total = hist.sum()
+    if total > 0:
+        hist = np.sqrt(hist / total)
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    thumb = cv2.resize(gray, (8, 8), interpolation=cv2.INTER_AREA).astype(np.float32)
+    bits = np.where(thumb > thumb.mean(), 1.0, -1.0).ravel() / 8.0
+
+    return (np.concatenate([hist, bits]) * math.sqrt(0.5)).astype(np.float32)
+
+
+class HeroDescriptorIndex:
+    """
+    Nearest-neighbour index over compact per-variant descriptors (_compact_descriptor).
+
+    Answers "which heroes could this icon be?" with a single matrix-vector product,
+    before any cv2.matchTemplate work. The cost per query grows with the descriptor
+    size rather than the template size, so it stays cheap as personas and arcanas
+    add variants.
+    """
+
+    def __init__(self, hero_ids, images):
+        self.hero_ids = tuple(hero_ids)
+        if images:
+            self._descriptors = np.stack([_compact_descriptor(image) for image in images])
+        else:
+            self._descriptors = np.zeros((0, int(np.prod(DESCRIPTOR_HIST_BINS)) + 64), dtype=np.float32)
+        self._descriptors.setflags(write=False)
+
+    @classmethod
+    def from_heroes_data(cls, heroes_data, apply_blur=False):
+        """
+        Index every variant's cached (cropped, 128x72) picking-path template.
+
+        With apply_blur the templates get the same blur _standardize_hero_icon gives
+        the icons the index is queried with, so histograms and hashes compare like
+        with like.
+        """
+        hero_ids, images = [], []
+        for hero in heroes_data or []:
+            for variant in hero.get('variants', []):
+                template = variant.get('cached_template')
+                if template is not None:
+                    if template.shape[:2] != (72, 128):
+                        template = cv2.resize(template, (128, 72))
+                    if apply_blur:
+                        template = cv2.GaussianBlur(template, (5, 5), 0)
+                    hero_ids.append(hero.get('id'))
+                    images.append(template)
+        return cls(hero_ids, images)
+
+    @classmethod
+    def from_in_game_templates(cls, templates):
+        """Index in-game templates ((id, name, localized_name, bordered) tuples)."""
+        bs = IN_GAME_BORDER_SIZE
+        return cls([t[0] for t in templates], [t[3][bs:-bs, bs:-bs] for t in templates])
+
+    def __len__(self):
+        return len(self.hero_ids)
+
+    def query(self, icon, top_heroes):
+        """
+        Return up to `top_heroes` candidate hero_ids, most similar first.
+
+        A hero ranks by its best-matching variant.
+        """
+        if not self.hero_ids:
+            return []
+        similarities = self._descriptors @ _compact_descriptor(icon)
+        candidates = []
+        for i in np.argsort(-similarities, kind='stable'):
+            hero_id = self.hero_ids[i]
+            if hero_id not in candidates:
+                candidates.append(hero_id)
+                if len(candidates) >= top_heroes:
+                    break
+        return candidates
+
+
+class TemplateStack:
+    """
+    Every hero variant template stacked into one contiguous array for batched matching.
+
+    Scoring a slot icon used to be one cv2.matchTemplate call per variant (several
+    hundred per slot), where per-call overhead dominated. The stack scores the icon
+    against the whole bank at once and reproduces TM_CCORR_NORMED exactly:
+
+    - Without a border the templates are the same size as the icon, so each score is
+      a single normalized dot product and the whole bank is one matrix-vector product.
+    - With a border the icon slides inside each bordered template. The numerator for
+      every offset of every template comes from one batched FFT cross-correlation
+      (template spectra are computed once here, channels are summed before the
+      inverse transform), and the per-offset template energy from integral images.
+
+    Each template also carries a coarse thumbnail descriptor, so cascade mode can
+    shortlist the bank cheaply (shortlist) and run the full match on that subset only.
+
+    A compact stack (COMPACT_TEMPLATES) matches single grayscale planes instead of BGR:
+    one-channel spectra, float32 window energies, and uint8 templates cast per call
+    rather than a float copy. The coarse descriptors stay in colour.
+
+    The template spectra are by far the largest array. With spectra_dir set (as the
+    template bank does) they are written there once, keyed by the stacked templates'
+    content hash, and memory-mapped read-only, so every worker process shares one
+    physical copy instead of holding its own.
+    """
+
+    def __init__(self, heroes_data, apply_blur=False, border_size=0, compact=None, spectra_dir=None):
+        self.apply_blur = apply_blur
+        self.border_size = border_size
+        self.compact = COMPACT_TEMPLATES if compact is None else bool(compact)
+        # (hero_id, hero_name, hero_localized_name, variant) per stacked template
+        self.entries = []
+        templates = []
+        cores = []
+
+        for hero in heroes_data or []:
+            for variant in hero.get('variants', []):
+                template = variant.get('cached_template')
+                if template is None:
+                    continue
+                if template.shape[:2] != (72, 128):
+                    template = cv2.resize(template, (128, 72))
+                if apply_blur:
+                    template = cv2.GaussianBlur(template, (5, 5), 0)
+                cores.append(template)
+                if self.compact:
+                    template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+                if border_size:
+                    template = cv2.copyMakeBorder(
+                        template,
+                        border_size, border_size, border_size, border_size,
+                        cv2.BORDER_CONSTANT,
+                        value=[0, 0, 0]  # Black border
+                    )
+                templates.append(template)
+                self.entries.append((
+                    hero.get('id'),
+                    hero.get('name'),
+                    hero.get('localized_name'),
+                    variant.get('variant'),
+                ))
+
+        plane_shape = (72 + 2 * border_size, 128 + 2 * border_size) + (() if self.compact else (3,))
+        if not templates:
+            self.templates = np.zeros((0,) + plane_shape, dtype=np.uint8)
+        else:
+            self.templates = np.ascontiguousarray(np.stack(templates))
+
+        # Channels-last float view; a compact stack is a single channel
+        stacked = self.templates.astype(np.float32).reshape((len(templates),) + plane_shape[:2] + (1 if self.compact else 3,))
+        if border_size:
+            height, width = plane_shape[:2]
+            # Template spectra for the batched cross-correlation
+            if spectra_dir is not None:
+                self._spectra = _shared_template_spectra(stacked, spectra_dir, self._spectra_prefix(), self.templates)
+            else:
+                self._spectra = np.fft.rfft2(stacked, axes=(1, 2))
+            # Energy of every 72x128 window, i.e. the per-offset template norm
+            energy = (stacked.astype(np.float64) ** 2).sum(axis=-1)
+            integral = np.zeros((len(templates), height + 1, width + 1))
+            integral[:, 1:, 1:] = energy.cumsum(axis=1).cumsum(axis=2)
+            self._window_energy = (integral[:, 72:, 128:] - integral[:, :-72, 128:]
+                                   - integral[:, 72:, :-128] + integral[:, :-72, :-128])
+            if self.compact:
+                self._window_energy = self._window_energy.astype(np.float32)
+        else:
+            # uint8 values are exact in float32, so a compact stack casts per call
+            self._flat = (self.templates if self.compact else stacked).reshape(len(templates), -1)
+            self._norms = np.sqrt((self._flat.astype(np.float64) ** 2).sum(axis=1))
+        self._coarse = _coarse_descriptors(cores)
+        self._hero_ids = np.array([entry[0] for entry in self.entries], dtype=object)
+
+        # Shared read-only across matcher threads once built
+        self.entries = tuple(self.entries)
+        for array in vars(self).values():
+            if isinstance(array, np.ndarray):
+                array.setflags(write=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _spectra_prefix(self):
+        """File name prefix of this stack's preprocessing config in the shared spectra directory."""
+        return (f"templates_spectra_{'blur' if self.apply_blur else 'raw'}_b{self.border_size}"
+                f"_{'gray' if self.compact else 'bgr'}_")
+
+    @property
+    def nbytes(self):
+        """Bytes held privately by the stack's arrays (memory-mapped spectra are shared, not counted)."""
+        return sum(array.nbytes for array in vars(self).values()
+                   if isinstance(array, np.ndarray) and not isinstance(array, np.memmap))
+
+    def indices_for_heroes(self, hero_ids):
+        """Indices (in bank order) of every variant template of the given heroes."""
+        return np.flatnonzero(np.isin(self._hero_ids, list(hero_ids)))
+
+    def shortlist(self, hero_icon, top_k, indices=None):
+        """
+        Indices of the `top_k` templates whose coarse thumbnails best match the icon.
+
+        Restricted to `indices` when given. Returned in bank order, ready to pass to score().
+        """
+        return _coarse_shortlist(self._coarse, hero_icon, top_k, indices=indices)
+
+    def score(self, hero_icon, indices=None):
+        """
+        Score a standardized (72x128, already blurred if enabled) icon against the templates.
+
+        Args:
+            hero_icon: The standardized icon
+            indices: Optional template indices (e.g. from shortlist) to restrict scoring to
+
+        Returns:
+            np.ndarray: One TM_CCORR_NORMED score per entry (or per index), in the same order
+        """
+        if not self.entries or (indices is not None and len(indices) == 0):
+            return np.zeros(0)
+
+        if self.compact:
+            hero_icon = cv2.cvtColor(hero_icon, cv2.COLOR_BGR2GRAY)
+        icon = hero_icon.astype(np.float32).reshape(72, 128, -1)
+        icon_energy = float((icon.astype(np.float64) ** 2).sum())
+
+        if self.border_size:
+            spectra = self._spectra if indices is None else self._spectra[indices]
+            window_energy = self._window_energy if indices is None else self._window_energy[indices]
+            height, width = self.templates.shape[1:3]
+            icon_spectrum = np.conj(np.fft.rfft2(icon, s=(height, width), axes=(0, 1)))
+            cross = (spectra * icon_spectrum[None]).sum(axis=-1)
+            numerator = np.fft.irfft2(cross, s=(height, width), axes=(1, 2))
+            numerator = numerator[:, :height - 72 + 1, :width - 128 + 1]
+            denominator = np.sqrt(window_energy * icon_energy)
+        else:
+            flat = self._flat if indices is None else self._flat[indices]
+            norms = self._norms if indices is None else self._norms[indices]
+            numerator = flat.astype(np.float32, copy=False) @ icon.reshape(-1)
+            denominator = norms * math.sqrt(icon_energy)
+
+        # OpenCV reports 0 where either side has no energy
+        scores = np.divide(numerator, denominator, out=np.zeros(numerator.shape), where=denominator > 0)
+        scores = np.clip(scores, -1.0, 1.0)
+        if self.border_size:
+            scores = scores.max(axis=(1, 2))
+        return scores
+
+
+def _shared_template_spectra(stacked, spectra_dir, prefix, templates):
+    """
+    Memory-map the FFT spectra of a template stack from spectra_dir, writing them first if needed.
+
+    The file is named by prefix plus the sha1 of the stacked uint8 templates, so a
+    file can only ever hold the spectra of exactly those templates; processes racing
+    to create it write identical bytes through private temp files. Older files with
+    the same prefix are removed once a new one is in place.
+
+    Args:
+        stacked: Float (N, H, W, C) templates to transform
+        spectra_dir: Directory shared by the worker processes
+        prefix: File name prefix for the stack's preprocessing config
+        templates: The uint8 template stack the spectra are computed from
+
+    Returns:
+        np.ndarray: Read-only spectra, memory-mapped unless they could not be written
+    """
+    spectra_file = Path(spectra_dir) / f"{prefix}{hashlib.sha1(templates).hexdigest()[:20]}.npy"
+    height, width = stacked.shape[1:3]
+    expected_shape = (stacked.shape[0], height, width // 2 + 1, stacked.shape[3])
+    expected_dtype = np.fft.rfft2(np.zeros((1, 1), stacked.dtype)).dtype
+    try:
+        spectra = np.load(str(spectra_file), mmap_mode='r', allow_pickle=False)
+        if spectra.shape == expected_shape and spectra.dtype == expected_dtype:
+            return spectra
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Could not read template spectra {spectra_file}, recomputing: {e}")
+
+    spectra = np.fft.rfft2(stacked, axes=(1, 2))
+    try:
+        _replace_file(spectra_file, lambda f: np.save(f, spectra, allow_pickle=False))
+        for stale_file in spectra_file.parent.glob(f"{prefix}*.npy"):
+            if stale_file != spectra_file:
+                stale_file.unlink(missing_ok=True)
+        return np.load(str(spectra_file), mmap_mode='r', allow_pickle=False)
+    except Exception as e:
+        logger.warning(f"Could not share template spectra through {spectra_file}, keeping a private copy: {e}")
+        return spectra
+
+
+class TemplateBank:
+    """
+    Frozen set of preprocessed TemplateStacks for the loaded heroes data, keyed by
+    (apply_blur, border_size).
+
+    Built once by load_heroes_data so the templates are blurred, bordered and stacked
+    before the first frame arrives; the matching hot path only looks stacks up. Their
+    FFT spectra are memory-mapped from files next to the template cache, shared by
+    every worker process. A descriptor index over the same variants is built alongside
+    for each blur setting in use.
+    """
+
+    def __init__(self, heroes_data, configs=None):
+        self.heroes_data = heroes_data
+        configs = TEMPLATE_BANK_CONFIGS if configs is None else configs
+        self._indexes = MappingProxyType({
+            bool(apply_blur): HeroDescriptorIndex.from_heroes_data(heroes_data, apply_blur=bool(apply_blur))
+            for apply_blur, _border_size in configs
+        })
+        self._stacks = MappingProxyType({
+            (bool(apply_blur), int(border_size)): TemplateStack(heroes_data, apply_blur=bool(apply_blur),
+                                                                border_size=int(border_size),
+                                                                spectra_dir=TEMPLATES_CACHE_FILE.parent)
+            for apply_blur, border_size in configs
+        })
+
+    @property
+    def configs(self):
+        return tuple(self._stacks)
+
+    def get(self, apply_blur, border_size):
+        """Return the stack preprocessed with this config, or None if it wasn't built."""
+        return self._stacks.get((bool(apply_blur), int(border_size)))
+
+    def index(self, apply_blur):
+        """Return the descriptor index built with this blur setting, or None if it wasn't built."""
+        return self._indexes.get(bool(apply_blur))
+
+
+def template_preprocessing_config():
+    """Return the (apply_blur, border_size) template config selected by APPLY_BLUR/ADD_BORDER."""
+    apply_blur = os.environ.get("APPLY_BLUR", "").lower() in ("1", "true", "yes")
+    add_border = os.environ.get("ADD_BORDER", "").lower() in ("1", "true", "yes")
+    return apply_blur, (20 if add_border else 0)  # border pixels on each side
+
+
+def _build_template_bank(heroes_data):
+    """Build the frozen template bank for freshly loaded heroes data."""
+    global _TEMPLATE_BANK
+
+    # Always include the config the current environment selects, alongside the
+    # process_media one, so standalone/CLI runs hit the bank too.
+    configs = list(TEMPLATE_BANK_CONFIGS)
+    if template_preprocessing_config() not in configs:
+        configs.append(template_preprocessing_config())
+
+    performance_timer.start('build_template_bank')
+    _TEMPLATE_BANK = TemplateBank(heroes_data, configs)
+    performance_timer.stop('build_template_bank')
+    logger.debug(f"Built template bank for configs {_TEMPLATE_BANK.configs}")
+    return _TEMPLATE_BANK
+
+
+_DESCRIPTOR_INDEX = None
+
+
+def get_hero_descriptor_index(heroes_data, apply_blur=False):
+    """
+    Return the picking-path descriptor index for `heroes_data` and the icon blur setting.
+
+    Comes from the template bank when heroes_data is the loaded singleton; any other
+    data gets an index built on first use and reused while the same object and blur
+    setting are passed.
+    """
+    global _DESCRIPTOR_INDEX
+
+    bank = _TEMPLATE_BANK
+    if bank is not None and bank.heroes_data is heroes_data:
+        index = bank.index(apply_blur)
+        if index is not None:
+            return index
+    cached = _DESCRIPTOR_INDEX
+    if cached is not None and cached[0] is heroes_data and cached[1] == bool(apply_blur):
+        return cached[2]
+    index = HeroDescriptorIndex.from_heroes_data(heroes_data, apply_blur=apply_blur)
+    _DESCRIPTOR_INDEX = (heroes_data, bool(apply_blur), index)
+    return index
+
+
+_TEMPLATE_STACK = None
+_TEMPLATE_STACK_LOCK = threading.Lock()
+
+
+def get_template_stack(heroes_data, apply_blur=False, border_size=0):
+    """
+    Return the TemplateStack for `heroes_data` and the given preprocessing config.
+
+    Reads from the frozen bank built by load_heroes_data. Data that didn't come from
+    load_heroes_data (or a config the bank doesn't carry) gets a stack built on
+    first use and reused for as long as callers pass the same object and config.
+    """
+    global _TEMPLATE_STACK
+
+    bank = _TEMPLATE_BANK
+    if bank is not None and bank.heroes_data is heroes_data:
+        stack = bank.get(apply_blur, border_size)
+        if stack is not None:
+            return stack
+
+    with _TEMPLATE_STACK_LOCK:
+        cached = _TEMPLATE_STACK
+        if cached is not None and cached[0] is heroes_data and cached[1] == (apply_blur, border_size):
+            return cached[2]
+
+        performance_timer.start('build_template_stack')
+        stack = TemplateStack(heroes_data, apply_blur=apply_blur, border_size=border_size)
+        performance_timer.stop('build_template_stack')
+        logger.debug(f"Stacked {len(stack)} hero templates (blur={apply_blur}, border={border_size})")
+
+        # Keep a reference to heroes_data so the identity check can't match a recycled id
+        _TEMPLATE_STACK = (heroes_data, (apply_blur, border_size), stack)
+        return stack
+
+
+def _standardize_hero_icon(hero_icon, apply_blur, debug=False):
+    """Crop a picking-path slot icon to its portrait, resize to 128x72 and blur if enabled."""
+    # Crop the hero portrait to focus on the more distinctive part
+    performance_timer.start('crop_hero_portrait')
+    cropped_hero = crop_hero_portrait(hero_icon, debug=debug)
+    performance_timer.stop('crop_hero_portrait')
+
+    # Resize to a standard size for comparison
+    performance_timer.start('resize_hero')
+    hero_icon_resized = cv2.resize(cropped_hero, (128, 72))
+    performance_timer.stop('resize_hero')
+
+    # Apply slight blur to reduce noise in the source image
+    if apply_blur:
+        hero_icon_resized = cv2.GaussianBlur(hero_icon_resized, (5, 5), 0)
+        if debug:
+            save_debug_image(hero_icon_resized, "hero_icon_blurred")
+
+    return hero_icon_resized
+
+
+def get_top_hero_matches(hero_icon, heroes_data, top_n=5, min_score=0.4, debug=False, hero_ids=None):
     """
     Get top N hero matches for a hero icon instead of just the best match.
 
@@ -899,6 +1655,8 @@ def get_top_hero_matches(hero_icon, heroes_data, top_n=5, min_score=0.4, debug=F
         top_n: Number of top matches to return
         min_score: Minimum match score threshold
         debug: Whether to save debug images
+        hero_ids: Optional candidate hero_ids to restrict matching to. Defaults to the
+            descriptor index's candidates when DESCRIPTOR_CANDIDATE_HEROES is set
 
     Returns:
         list: List of top N hero matches with scores above threshold
@@ -910,85 +1668,50 @@ def get_top_hero_matches(hero_icon, heroes_data, top_n=5, min_score=0.4, debug=F
             logger.error("No heroes data available")
             return []
 
-        # Crop the hero portrait to focus on the more distinctive part
-        performance_timer.start('crop_hero_portrait')
-        cropped_hero = crop_hero_portrait(hero_icon, debug=debug)
-        performance_timer.stop('crop_hero_portrait')
+        # Blur/border config for this call (controlled by environment variables)
+        apply_blur, border_size = template_preprocessing_config()
 
-        # No need to extract rank banner here - we'll do it separately
-
-        # Resize to a standard size for comparison
-        performance_timer.start('resize_hero')
-        hero_icon_resized = cv2.resize(cropped_hero, (128, 72))
-        performance_timer.stop('resize_hero')
-
-        # Apply slight blur to reduce noise in the source image
-        # This is controlled by an environment variable
-        if os.environ.get("APPLY_BLUR", "").lower() in ("1", "true", "yes"):
-            hero_icon_resized = cv2.GaussianBlur(hero_icon_resized, (5, 5), 0)
-            if debug:
-                save_debug_image(hero_icon_resized, "hero_icon_blurred")
+        # Crop, resize and (optionally) blur the icon the same way as the templates
+        hero_icon_resized = _standardize_hero_icon(hero_icon, apply_blur, debug=debug)
 
         # Save for debugging if needed
         if debug:
             save_debug_image(hero_icon_resized, "hero_icon_standardized")
 
-        # Setup for parallel processing
         performance_timer.start('template_matching_total')
 
-        # Check if we should add borders to templates
-        add_border = os.environ.get("ADD_BORDER", "").lower() in ("1", "true", "yes")
-        border_size = 20 if add_border else 0  # pixels on each side
-
-        # Prepare tasks for parallel execution
-        tasks = []
-        for hero in heroes_data:
-            hero_id = hero.get('id')
-            hero_name = hero.get('name')
-            hero_localized_name = hero.get('localized_name')
-
-            for variant in hero.get('variants', []):
-                variant_name = variant.get('variant')
-                template = variant.get('cached_template')
-
-                # Only add to task list if template exists
-                if template is not None:
-                    # Apply the same blur to the template if enabled
-                    if os.environ.get("APPLY_BLUR", "").lower() in ("1", "true", "yes"):
-                        template = cv2.GaussianBlur(template, (5, 5), 0)
-
-                    # Create a version of the template to use based on options
-                    template_to_use = template
-
-                    # Add a border around the template to allow for "sliding window" matching if enabled
-                    if add_border:
-                        template_to_use = cv2.copyMakeBorder(
-                            template,
-                            border_size, border_size, border_size, border_size,
-                            cv2.BORDER_CONSTANT,
-                            value=[0, 0, 0]  # Black border
-                        )
-
-                    tasks.append((
-                        hero_icon_resized,
-                        template_to_use,  # Use appropriate template (with or without border)
-                        hero,
-                        variant_name,
-                        hero_id,
-                        hero_name,
-                        hero_localized_name,
-                        border_size  # Pass border size for match_template function
-                    ))
-
-        # Use ThreadPoolExecutor to parallelize template matching
-        max_workers = min(os.cpu_count() or 4, 4)
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            matches = list(executor.map(match_template, tasks))
+        # Score the icon against the preprocessed variant templates in one batched pass.
+        # In cascade mode only the coarse prefilter's shortlist gets the full match.
+        stack = get_template_stack(heroes_data, apply_blur=apply_blur, border_size=border_size)
+        if hero_ids is None and DESCRIPTOR_CANDIDATE_HEROES > 0:
+            performance_timer.start('descriptor_index_query')
+            hero_ids = get_hero_descriptor_index(heroes_data, apply_blur).query(hero_icon_resized, DESCRIPTOR_CANDIDATE_HEROES)
+            performance_timer.stop('descriptor_index_query')
+
+        entries = stack.entries
+        indices = None if hero_ids is None else stack.indices_for_heroes(hero_ids)
+        if 0 < CASCADE_TOP_K < (len(stack) if indices is None else len(indices)):
+            performance_timer.start('cascade_prefilter')
+            indices = stack.shortlist(hero_icon_resized, CASCADE_TOP_K, indices)
+            performance_timer.stop('cascade_prefilter')
+        if indices is not None:
+            entries = [stack.entries[i] for i in indices]
+        scores = stack.score(hero_icon_resized, indices)
 
         performance_timer.stop('template_matching_total')
 
         # Filter out any zero scores and scores below threshold
-        valid_matches = [m for m in matches if m['match_score'] >= min_score]
+        valid_matches = [
+            {
+                'hero_id': hero_id,
+                'hero_name': hero_name,
+                'hero_localized_name': hero_localized_name,
+                'variant': variant_name,
+                'match_score': float(score)
+            }
+            for (hero_id, hero_name, hero_localized_name, variant_name), score in zip(entries, scores)
+            if score >= min_score
+        ]
 
         if not valid_matches:
             return []
@@ -1437,7 +2160,7 @@ def extract_team_captains_from_frame(frame_path, debug=False):
     try:
         frame = load_image(frame_path)
         if frame is None:
-            logger.warning(f"Could not load frame for captain extraction: {frame_path}")
+            logger.warning(f"Could not load frame for captain extraction: {_frame_label(frame_path)}")
             return {}
 
         success, top_bar, center_x = extract_hero_bar(frame, debug=debug)
@@ -1459,12 +2182,55 @@ def extract_team_captains_from_frame(frame_path, debug=False):
         logger.error(f"Error extracting team captains: {e}")
         return {}
 
+_MATCH_EXECUTOR = None
+_MATCH_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_match_executor():
+    """
+    Return the long-lived executor shared by all hero matching in this process.
+
+    Created on first use with MATCH_WORKERS threads. Replaces the per-call pools the
+    matchers used to spin up and tear down, which with several queue workers meant
+    constant thread churn and far more matcher threads than cores.
+    """
+    global _MATCH_EXECUTOR
+
+    with _MATCH_EXECUTOR_LOCK:
+        if _MATCH_EXECUTOR is None:
+            _MATCH_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, MATCH_WORKERS), thread_name_prefix="hero-match")
+            logger.debug(f"Started hero matching executor with {max(1, MATCH_WORKERS)} workers")
+        return _MATCH_EXECUTOR
+
+
+def match_hero_slots(hero_icons, match_slot):
+    """
+    Match a frame's slots as separate jobs on the shared matching executor.
+
+    Args:
+        hero_icons: (team, position, icon) tuples for the frame's slots
+        match_slot: Callable taking (team, position, icon) and returning that slot's matches
+
+    Returns:
+        list: match_slot's result per slot, in the same order as hero_icons
+
+    Called from a matching thread itself, the slots run inline instead, since
+    waiting on the pool from inside it could leave no thread to run them.
+    """
+    if threading.current_thread().name.startswith("hero-match"):
+        return [match_slot(team, position, icon) for team, position, icon in hero_icons]
+
+    executor = get_match_executor()
+    futures = [executor.submit(match_slot, team, position, icon) for team, position, icon in hero_icons]
+    return [future.result() for future in futures]
+
+
 def process_frame_for_heroes(frame_path, debug=False):
     """
     Process a single frame to identify heroes.
 
     Args:
-        frame_path: Path to the frame image
+        frame_path: Path to the frame image, or the decoded frame
         debug: Whether to save debug images
 
     Returns:
@@ -1478,7 +2244,7 @@ def process_frame_for_heroes(frame_path, debug=False):
         performance_timer.stop('load_frame')
 
         if frame is None:
-            logger.error(f"Could not load frame: {frame_path}")
+            logger.error(f"Could not load frame: {_frame_label(frame_path)}")
             return []
 
         # Load heroes data
@@ -1496,7 +2262,7 @@ def process_frame_for_heroes(frame_path, debug=False):
         performance_timer.stop('extract_hero_bar')
 
         if not success or top_bar is None:
-            logger.warning(f"Could not extract hero bar from frame: {frame_path}")
+            logger.warning(f"Could not extract hero bar from frame: {_frame_label(frame_path)}")
             return []
 
         # Create the annotated version with rank areas outlined
@@ -1518,7 +2284,7 @@ def process_frame_for_heroes(frame_path, debug=False):
         performance_timer.stop('extract_hero_icons')
 
         if not hero_icons:
-            logger.warning(f"No hero icons extracted from frame: {frame_path}")
+            logger.warning(f"No hero icons extracted from frame: {_frame_label(frame_path)}")
             return []
 
         # Identify each hero with top matches
@@ -1543,7 +2309,15 @@ def process_frame_for_heroes(frame_path, debug=False):
                 font_ranks[idx] = _read_rank_font_exact(frame, *box)
             performance_timer.stop('rank_font_exact')
 
-        for team, position, hero_icon in hero_icons:
+        # Get top matches for every hero position (not just the best match) as one job
+        performance_timer.start('get_top_hero_matches')
+        slot_matches = match_hero_slots(
+            hero_icons,
+            lambda team, position, hero_icon: get_top_hero_matches(hero_icon, heroes_data, debug=debug)
+        )
+        performance_timer.stop('get_top_hero_matches')
+
+        for (team, position, hero_icon), hero_matches in zip(hero_icons, slot_matches):
             # Only extract rank banner once during debugging, not twice
             if debug and os.environ.get("EXTRACT_RANK_BANNERS", "").lower() in ("1", "true", "yes"):
                 performance_timer.start('crop_rank_banner')
@@ -1576,11 +2350,6 @@ def process_frame_for_heroes(frame_path, debug=False):
                         rank_data[position_key]['rank_number'] = rank_number
                         rank_data[position_key]['rank_text'] = rank_text
 
-            # Get top matches for this hero position, not just the best match
-            performance_timer.start('get_top_hero_matches')
-            hero_matches = get_top_hero_matches(hero_icon, heroes_data, debug=debug)
-            performance_timer.stop('get_top_hero_matches')
-
             if hero_matches:
                 # Add team and position information to all candidates
                 for match in hero_matches:
@@ -1673,6 +2442,88 @@ def process_frame_for_heroes(frame_path, debug=False):
         duration = performance_timer.stop('process_frame')
         logger.info(f"Frame processing completed in {duration:.3f} seconds")
 
+def _picking_slot_icons(frame):
+    """The (team, position, icon) picking-bar slots of a frame (image or path), or None."""
+    if isinstance(frame, (str, Path)):
+        frame = load_image(frame)
+    if frame is None:
+        return None
+    success, top_bar, center_x = extract_hero_bar(frame)
+    if not success or top_bar is None:
+        return None
+    return extract_hero_icons(top_bar, center_x) or None
+
+
+def _slot_fingerprint(icon):
+    """Mean-subtracted thumbnail of the slot's matched portrait region (crop_hero_portrait)."""
+    return _coarse_descriptors([crop_hero_portrait(icon)], mean_subtract=True)[0]
+
+
+def hero_slot_fingerprints(frame):
+    """
+    Thumbnail fingerprints of the picking-bar slots, keyed by (team, position).
+
+    Cheap (one crop and a 32x18 resize per slot). StreamManager keeps them with a
+    stream's confirmed roster so verify_known_roster can tell whether the bar changed.
+
+    Args:
+        frame: The frame image, or the path to it
+
+    Returns:
+        dict: (team, position) -> fingerprint, or None if the hero bar could not be extracted
+    """
+    icons = _picking_slot_icons(frame)
+    if icons is None:
+        return None
+    return {(team, position): _slot_fingerprint(icon) for team, position, icon in icons}
+
+
+def verify_known_roster(frame, roster, fingerprints):
+    """
+    Re-check a frame against a roster already confirmed for the same stream.
+
+    A roster doesn't change during a match, so rather than matching every slot against
+    the whole bank and re-reading player names and ranks, each slot's fingerprint is
+    compared with the stored one (ROSTER_FINGERPRINT_SIMILARITY) and its icon scored
+    against the roster's heroes only. Every rostered slot must still resolve to its hero.
+
+    Args:
+        frame: The frame image, or the path to it
+        roster: Heroes from an earlier process_frame_for_heroes on this stream
+        fingerprints: hero_slot_fingerprints of the frame that roster came from
+
+    Returns:
+        list: The roster with refreshed match scores, or None if the frame no longer
+        shows this roster (run the full process_frame_for_heroes instead)
+    """
+    if not roster or not fingerprints:
+        return None
+    icons = _picking_slot_icons(frame)
+    heroes_data = load_heroes_data()
+    if icons is None or not heroes_data:
+        return None
+
+    rostered = {(hero['team'], hero['position']): hero for hero in roster}
+    hero_ids = sorted({hero['hero_id'] for hero in roster})
+    verified = []
+    for team, position, icon in icons:
+        stored = fingerprints.get((team, position))
+        if stored is None or float(np.dot(stored, _slot_fingerprint(icon))) < ROSTER_FINGERPRINT_SIMILARITY:
+            logger.debug(f"{team} slot {position + 1} changed since the roster was confirmed")
+            return None
+        hero = rostered.get((team, position))
+        if hero is None:
+            continue
+        matches = get_top_hero_matches(icon, heroes_data, top_n=1, hero_ids=hero_ids)
+        if not matches or matches[0]['hero_id'] != hero['hero_id']:
+            logger.debug(f"{team} slot {position + 1} no longer matches {hero.get('hero_localized_name')}")
+            return None
+        verified.append(dict(hero, match_score=matches[0]['match_score']))
+
+    verified.sort(key=lambda h: (h['team'] == 'Dire', h['position']))
+    return verified
+
+
 _IN_GAME_TEMPLATES = None
 
 
@@ -1684,45 +2535,137 @@ def load_in_game_templates():
     face, so it matches best against the *whole* portrait — these are the raw portrait
     variant files resized to 128x72 with a black border for slide matching. Including
     alt/persona variants is what lets arcana/persona icons (e.g. Terrorblade arcana)
-    match. Cached in memory after first load.
+    match. The resized portraits live in the on-disk template cache next to the
+    picking templates (only new or changed images are decoded); the result is cached
+    in memory after first load, and api_server preloads it at startup.
     """
     global _IN_GAME_TEMPLATES
     if _IN_GAME_TEMPLATES is not None:
         return _IN_GAME_TEMPLATES
-    heroes_data = load_heroes_data()
-    templates = []
-    bs = IN_GAME_BORDER_SIZE
-    for hero in (heroes_data or []):
-        hid = hero.get('id')
-        for path in sorted(HEROES_DIR.glob(f"{hid}_*.png")):
-            img = load_image(str(path))
-            if img is None:
-                continue
-            tpl = cv2.resize(img, (128, 72))
-            bordered = cv2.copyMakeBorder(tpl, bs, bs, bs, bs, cv2.BORDER_CONSTANT, value=[0, 0, 0])
-            templates.append((hid, hero.get('name'), hero.get('localized_name'), bordered))
+    templates = _build_in_game_templates(load_heroes_data())
     _IN_GAME_TEMPLATES = templates
+    # Build the descriptor index alongside so the first frame doesn't pay for it
+    get_in_game_descriptor_index(templates)
     logger.info(f"Loaded {len(templates)} in-game hero templates")
     return templates
 
 
-def match_in_game_icon(icon, templates, top_n=3):
+def _build_in_game_templates(heroes_data, compact=None):
+    """
+    Bordered in-game templates, as (id, name, localized_name, bordered) tuples.
+
+    Compact templates (COMPACT_TEMPLATES by default) are single grayscale planes;
+    match_in_game_icon converts icons to match.
+    """
+    compact = COMPACT_TEMPLATES if compact is None else compact
+    sources = [
+        (hero, str(path))
+        for hero in (heroes_data or [])
+        for path in sorted(HEROES_DIR.glob(f"{hero.get('id')}_*.png"))
+    ]
+    performance_timer.start('load_in_game_templates')
+    resized = _resolve_templates([path for _hero, path in sources], _roster_digest(heroes_data or []),
+                                 IN_GAME_TEMPLATE_KIND)
+    performance_timer.stop('load_in_game_templates')
+    templates = []
+    bs = IN_GAME_BORDER_SIZE
+    for hero, path in sources:
+        tpl = resized.get(path)
+        if tpl is None:
+            continue
+        tpl = np.asarray(tpl)
+        if compact:
+            tpl = cv2.cvtColor(tpl, cv2.COLOR_BGR2GRAY)
+        bordered = cv2.copyMakeBorder(tpl, bs, bs, bs, bs, cv2.BORDER_CONSTANT, value=[0, 0, 0])
+        templates.append((hero.get('id'), hero.get('name'), hero.get('localized_name'), bordered))
+    return templates
+
+
+def _in_game_icon_planes(resized, templates):
+    """Convert a resized in-game icon to grayscale when the templates are compact (single-plane)."""
+    if templates and templates[0][3].ndim == 2 and resized.ndim == 3:
+        return cv2.cvtColor(resized, cv2.COLOR_BGR2GRAY)
+    return resized
+
+
+_IN_GAME_COARSE = None
+
+
+def _in_game_coarse_descriptors(templates):
+    """Cascade prefilter descriptors for an in-game template list, memoized per list."""
+    global _IN_GAME_COARSE
+    cached = _IN_GAME_COARSE
+    if cached is not None and cached[0] is templates:
+        return cached[1]
+    bs = IN_GAME_BORDER_SIZE
+    descriptors = _coarse_descriptors([t[3][bs:-bs, bs:-bs] for t in templates], mean_subtract=True)
+    _IN_GAME_COARSE = (templates, descriptors)
+    return descriptors
+
+
+def _in_game_shortlist(resized, templates, top_k, indices=None):
+    """Indices of the `top_k` in-game templates (within `indices`) the coarse prefilter ranks highest."""
+    return _coarse_shortlist(_in_game_coarse_descriptors(templates), resized, top_k,
+                             mean_subtract=True, indices=indices)
+
+
+_IN_GAME_INDEX = None
+
+
+def get_in_game_descriptor_index(templates):
+    """Descriptor index over an in-game template list, memoized per list."""
+    global _IN_GAME_INDEX
+    cached = _IN_GAME_INDEX
+    if cached is not None and cached[0] is templates:
+        return cached[1]
+    index = HeroDescriptorIndex.from_in_game_templates(templates)
+    _IN_GAME_INDEX = (templates, index)
+    return index
+
+
+def _score_in_game_templates(resized, templates):
+    """Full-resolution TM_CCOEFF_NORMED slide score of a 128x72 icon against each template."""
+    scores = []
+    for _hid, _hname, _hloc, bordered in templates:
+        res = cv2.matchTemplate(bordered, resized, cv2.TM_CCOEFF_NORMED)
+        _, score, _, _ = cv2.minMaxLoc(res)
+        scores.append(float(score))
+    return scores
+
+
+def match_in_game_icon(icon, templates, top_n=3, top_k=None, hero_ids=None):
     """Top-N hero matches for a de-skewed in-game icon via TM_CCOEFF_NORMED slide.
 
     The icon (128x72) slides within each bordered template to tolerate small
     alignment error. CCOEFF (mean-subtracted) discriminates these small icons far
     better than the picking path's CCORR. variant is left blank so duplicate
     resolution keys on hero_id (one slot per hero regardless of which variant won).
+
+    In cascade mode (`top_k`, CASCADE_TOP_K by default) only the `top_k` templates
+    whose coarse thumbnails best match the icon get the full slide. `hero_ids`
+    restricts matching to those heroes' templates; it defaults to the descriptor
+    index's candidates when DESCRIPTOR_CANDIDATE_HEROES is set.
     """
-    resized = cv2.resize(icon, (128, 72))
-    results = []
-    for hid, hname, hloc, bordered in templates:
-        res = cv2.matchTemplate(bordered, resized, cv2.TM_CCOEFF_NORMED)
-        _, score, _, _ = cv2.minMaxLoc(res)
-        results.append({
+    resized = _in_game_icon_planes(cv2.resize(icon, (128, 72)), templates)
+    top_k = CASCADE_TOP_K if top_k is None else top_k
+    if hero_ids is None and DESCRIPTOR_CANDIDATE_HEROES > 0:
+        hero_ids = get_in_game_descriptor_index(templates).query(resized, DESCRIPTOR_CANDIDATE_HEROES)
+
+    indices = None
+    if hero_ids is not None:
+        wanted = set(hero_ids)
+        indices = np.array([i for i, t in enumerate(templates) if t[0] in wanted], dtype=int)
+    if 0 < top_k < (len(templates) if indices is None else len(indices)):
+        indices = _in_game_shortlist(resized, templates, top_k, indices)
+    if indices is not None:
+        templates = [templates[i] for i in indices]
+    results = [
+        {
             'hero_id': hid, 'hero_name': hname, 'hero_localized_name': hloc,
-            'variant': '', 'match_score': float(score),
-        })
+            'variant': '', 'match_score': score,
+        }
+        for (hid, hname, hloc, _bordered), score in zip(templates, _score_in_game_templates(resized, templates))
+    ]
     results.sort(key=lambda r: r['match_score'], reverse=True)
     return results[:top_n]
 
@@ -1744,7 +2687,7 @@ def process_frame_for_in_game_heroes(frame_path, debug=False, frame=None):
         if frame is None:
             frame = load_image(frame_path)
         if frame is None:
-            logger.error(f"Could not load frame: {frame_path}")
+            logger.error(f"Could not load frame: {_frame_label(frame_path)}")
             return []
 
         templates = load_in_game_templates()
@@ -1754,22 +2697,19 @@ def process_frame_for_in_game_heroes(frame_path, debug=False, frame=None):
 
         hero_icons = extract_in_game_hero_icons(frame, debug=debug)
         if not hero_icons:
-            logger.warning(f"No in-game hero icons extracted from frame: {frame_path}")
+            logger.warning(f"No in-game hero icons extracted from frame: {_frame_label(frame_path)}")
             return []
 
-        # Match the 10 slots concurrently; cv2.matchTemplate releases the GIL, so
-        # threads give a near-linear speedup (mirrors the picking path).
-        def _match_slot(slot):
-            team, position, hero_icon = slot
+        # Match the 10 slots as one job on the shared matching executor (mirrors the
+        # picking path).
+        def _match_slot(team, position, hero_icon):
             matches = match_in_game_icon(hero_icon, templates)
             for m in matches:
                 m['team'] = team
                 m['position'] = position
             return matches
 
-        max_workers = min(os.cpu_count() or 4, 4)
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            hero_candidates = list(executor.map(_match_slot, hero_icons))
+        hero_candidates = match_hero_slots(hero_icons, _match_slot)
 
         identified_heroes = resolve_hero_duplicates(hero_candidates, debug=debug)
         identified_heroes.sort(key=lambda h: (h['team'] == 'Dire', h['position']))
@@ -1782,19 +2722,244 @@ def process_frame_for_in_game_heroes(frame_path, debug=False, frame=None):
         logger.info(f"In-game frame processing completed in {duration:.3f} seconds")
 
 
-def _sample_clip_frames(clip_details, count=None):
-    """Extract frames spread across a clip, for picking the best one to analyse.
+def cascade_recall_report(frame_paths, k_values=(8, 16, 32, 64), in_game=False):
+    """
+    Measure how often the cascade shortlist contains the full-resolution top match.
 
-    Returns [] rather than raising when the clip can't be downloaded — the caller still
-    has frame 0 and should carry on.
+    Every hero slot of every frame is scored against the whole bank at full resolution
+    and the best template taken as ground truth. For each K the report counts how often
+    that template survives the coarse prefilter: recall of 1.0 means CASCADE_TOP_K=K
+    would have returned the same top hero on these frames. The picking path is measured
+    with the blur + border config process_media uses.
+
+    Args:
+        frame_paths: Frames to evaluate (pick-screen/top-bar frames, or in-game frames)
+        k_values: Shortlist sizes to evaluate
+        in_game: Evaluate the in-game path instead of the picking path
+
+    Returns:
+        dict: path, frames, slots, templates, and per-K recall/misses, or None if no
+        templates are available
+    """
+    k_values = sorted({int(k) for k in k_values if int(k) > 0})
+    hits = {k: 0 for k in k_values}
+    frames = slots = 0
+
+    if in_game:
+        templates = load_in_game_templates()
+        bank_size = len(templates or [])
+    else:
+        apply_blur, border_size = TEMPLATE_BANK_CONFIGS[0]
+        stack = get_template_stack(load_heroes_data(), apply_blur=apply_blur, border_size=border_size)
+        bank_size = len(stack)
+
+    if not bank_size:
+        logger.error("No hero templates available for the cascade recall report")
+        return None
+
+    for frame_path in frame_paths:
+        frame = load_image(frame_path)
+        if frame is None:
+            continue
+
+        if in_game:
+            icons = [_in_game_icon_planes(cv2.resize(icon, (128, 72)), templates)
+                     for _team, _pos, icon in extract_in_game_hero_icons(frame)]
+        else:
+            success, top_bar, center_x = extract_hero_bar(frame)
+            if not success or top_bar is None:
+                logger.warning(f"Could not extract hero bar from frame: {_frame_label(frame_path)}")
+                continue
+            icons = [_standardize_hero_icon(icon, apply_blur)
+                     for _team, _pos, icon in extract_hero_icons(top_bar, center_x)]
+        if not icons:
+            continue
+        frames += 1
+
+        for icon in icons:
+            slots += 1
+            if in_game:
+                truth = int(np.argmax(_score_in_game_templates(icon, templates)))
+            else:
+                truth = int(np.argmax(stack.score(icon)))
+            for k in k_values:
+                shortlist = _in_game_shortlist(icon, templates, k) if in_game else stack.shortlist(icon, k)
+                if truth in shortlist:
+                    hits[k] += 1
+
+    report = {
+        'path': 'in_game' if in_game else 'picking',
+        'frames': frames,
+        'slots': slots,
+        'templates': bank_size,
+        'recall': {k: (hits[k] / slots if slots else None) for k in k_values},
+        'misses': {k: slots - hits[k] for k in k_values},
+    }
+    for k in k_values:
+        if slots:
+            logger.info(f"Cascade K={k}: top match in shortlist for {hits[k]}/{slots} slots "
+                        f"({hits[k] / slots:.1%}), full match on {min(k, bank_size)}/{bank_size} templates")
+    return report
+
+
+def template_storage_report(frame_paths, in_game=False):
+    """
+    Compare compact (COMPACT_TEMPLATES) template storage against the full BGR layout.
+
+    Both layouts are built from the same cached templates and every hero slot of every
+    frame is matched against each. Accuracy is how often the compact layout's top hero
+    agrees with the full layout's, plus the mean absolute change in the top score;
+    memory is the bytes of preprocessed template arrays each worker process holds
+    (the shared memory-mapped cache is not counted). The picking path is measured
+    with the blur + border config process_media uses.
+
+    Args:
+        frame_paths: Frames to evaluate (pick-screen/top-bar frames, or in-game frames)
+        in_game: Evaluate the in-game path instead of the picking path
+
+    Returns:
+        dict: path, frames, slots, templates, bytes and seconds_per_slot per layout,
+        top1_agreement and mean_score_delta, or None if no templates are available
     """
+    layouts = ('full', 'compact')
+    if in_game:
+        heroes_data = load_heroes_data()
+        banks = {layout: _build_in_game_templates(heroes_data, compact=(layout == 'compact')) for layout in layouts}
+        nbytes = {layout: sum(t[3].nbytes for t in bank) for layout, bank in banks.items()}
+    else:
+        apply_blur, border_size = TEMPLATE_BANK_CONFIGS[0]
+        heroes_data = load_heroes_data()
+        banks = {
+            layout: TemplateStack(heroes_data, apply_blur=apply_blur, border_size=border_size,
+                                  compact=(layout == 'compact'))
+            for layout in layouts
+        }
+        nbytes = {layout: stack.nbytes for layout, stack in banks.items()}
+
+    bank_size = len(banks['full'])
+    if not bank_size:
+        logger.error("No hero templates available for the template storage report")
+        return None
+
+    frames = slots = agreements = 0
+    score_deltas = []
+    seconds = {layout: 0.0 for layout in layouts}
+    for frame_path in frame_paths:
+        frame = load_image(frame_path)
+        if frame is None:
+            continue
+
+        if in_game:
+            icons = [cv2.resize(icon, (128, 72)) for _team, _pos, icon in extract_in_game_hero_icons(frame)]
+        else:
+            success, top_bar, center_x = extract_hero_bar(frame)
+            if not success or top_bar is None:
+                logger.warning(f"Could not extract hero bar from frame: {_frame_label(frame_path)}")
+                continue
+            icons = [_standardize_hero_icon(icon, apply_blur)
+                     for _team, _pos, icon in extract_hero_icons(top_bar, center_x)]
+        if not icons:
+            continue
+        frames += 1
+
+        for icon in icons:
+            slots += 1
+            top = {}
+            for layout, bank in banks.items():
+                start = time.time()
+                if in_game:
+                    scores = _score_in_game_templates(_in_game_icon_planes(icon, bank), bank)
+                    hero_ids = [t[0] for t in bank]
+                else:
+                    scores = bank.score(icon)
+                    hero_ids = [entry[0] for entry in bank.entries]
+                seconds[layout] += time.time() - start
+                best = int(np.argmax(scores))
+                top[layout] = (hero_ids[best], float(scores[best]))
+            agreements += top['full'][0] == top['compact'][0]
+            score_deltas.append(abs(top['full'][1] - top['compact'][1]))
+
+    report = {
+        'path': 'in_game' if in_game else 'picking',
+        'frames': frames,
+        'slots': slots,
+        'templates': bank_size,
+        'bytes': nbytes,
+        'seconds_per_slot': {layout: (seconds[layout] / slots if slots else None) for layout in layouts},
+        'top1_agreement': agreements / slots if slots else None,
+        'mean_score_delta': float(np.mean(score_deltas)) if score_deltas else None,
+    }
+    logger.info(f"Compact templates: {nbytes['compact'] / 2**20:.1f} MiB vs {nbytes['full'] / 2**20:.1f} MiB "
+                f"per process for {bank_size} templates")
+    if slots:
+        logger.info(f"Compact top hero agreed with full storage on {agreements}/{slots} slots "
+                    f"({agreements / slots:.1%}), mean top-score change {report['mean_score_delta']:.4f}")
+    return report
+
+
+def _sample_interval(clip_details, count=None):
+    """Seconds between sampled frames so that about `count` of them span the clip."""
     count = count or SAMPLE_FRAME_COUNT
-    clip_path = download_clip(clip_details)
     duration = clip_details.get('duration') or 0
     # A 60s clip at count=8 lands ~7s apart, comfortably finer than the ~30s the
     # roster panel is on screen.
-    interval = max(1, int(duration / count)) if duration else 5
-    return extract_frames(clip_path, clip_details=clip_details, frame_interval=interval)
+    return max(1, int(duration / count)) if duration else 5
+
+
+def _iter_clip_frames(clip_details, count=None):
+    """Yield decoded frames spread across a clip as soon as each one is available.
+
+    The keyframes nearest each sample point are range-fetched concurrently
+    (sample_clip_keyframes) and yielded in completion order, so a caller can score
+    the first while the rest are still downloading. The whole clip is downloaded
+    only if no keyframe could be sampled.
+
+    Failures are logged and end the sampling early rather than raising — the caller
+    still has frame 0 and should carry on.
+    """
+    interval = _sample_interval(clip_details, count)
+    yielded = 0
+    try:
+        for _, frame in sample_clip_keyframes(clip_details, interval):
+            yielded += 1
+            yield frame
+        if yielded:
+            return
+        logger.warning("No keyframes could be sampled, downloading the entire clip")
+    except Exception as e:
+        if yielded:
+            logger.warning(f"Sparse keyframe sampling stopped after {yielded} frame(s): {e}")
+            return
+        logger.warning(f"Sparse keyframe sampling failed ({e}), downloading the entire clip")
+    try:
+        clip_path = download_clip(clip_details)
+        frames = extract_frames(clip_path, clip_details=clip_details, frame_interval=interval, return_frames=True)
+    except Exception as e:
+        logger.warning(f"Could not sample extra frames, using frame 0 only: {e}")
+        return
+    yield from frames
+
+
+def _sample_clip_frames(clip_details, count=None):
+    """Decode frames spread across a clip, for picking the best one to analyse.
+
+    Frames are returned in memory, in clip order; only the winner is ever written to
+    disk. Unlike _iter_clip_frames this waits for every fetch, which suits prefetching
+    ahead of the request; the whole clip is downloaded only if range sampling fails.
+
+    Returns [] rather than raising when the clip can't be downloaded — the caller still
+    has frame 0 and should carry on.
+    """
+    interval = _sample_interval(clip_details, count)
+    try:
+        keyframes = sorted(sample_clip_keyframes(clip_details, interval), key=lambda kf: kf[0])
+        if keyframes:
+            return [frame for _, frame in keyframes]
+        logger.warning("No keyframes could be sampled, downloading the entire clip")
+    except Exception as e:
+        logger.warning(f"Sparse keyframe sampling failed ({e}), downloading the entire clip")
+    clip_path = download_clip(clip_details)
+    return extract_frames(clip_path, clip_details=clip_details, frame_interval=interval, return_frames=True)
 
 
 def build_players_from_heroes(heroes):
@@ -1819,15 +2984,66 @@ def build_players_from_heroes(heroes):
         players.append(player)
     return players
 
+# Slot order of the colour-bar gate: Radiant 0-4, then Dire 0-4.
+_COLOR_BAR_SLOTS = [("Radiant", i) for i in range(5)] + [("Dire", i) for i in range(5)]
+# Width of the sample taken from the middle of each bar, away from its gradient edges.
+_COLOR_BAR_SAMPLE_WIDTH = 20
+
+
+def _color_bar_sample_columns(width):
+    """Column indices (10, _COLOR_BAR_SAMPLE_WIDTH) sampled from each slot's colour bar."""
+    center_x = width // 2
+    pitch = HERO_WIDTH + HERO_GAP
+    starts = [center_x - CLOCK_LEFT_EXTEND - (5 - i) * pitch for i in range(5)]
+    starts += [center_x + CLOCK_RIGHT_EXTEND + i * pitch for i in range(5)]
+    first = np.array(starts) + HERO_WIDTH // 2 - _COLOR_BAR_SAMPLE_WIDTH // 2
+    return first[:, None] + np.arange(_COLOR_BAR_SAMPLE_WIDTH)
+
+
+def color_bar_similarities(frame, colors=None):
+    """
+    Score the 10 hero colour bars of a frame in one vectorized pass.
+
+    Only the top HERO_TOP_PADDING rows are read, so frame may be a full decoded
+    frame, an ROI frame, or just its top rows (frame[:HERO_TOP_PADDING]).
+
+    Args:
+        frame: BGR image whose first rows are the top of a 1080p-wide frame
+        colors: Expected hex colours per team and position (default expected_colors)
+
+    Returns:
+        tuple: (similarities, mean_colors) for the slots in _COLOR_BAR_SLOTS order:
+            similarities is a float array of 1 - RGB distance / 442, and mean_colors
+            an int array of the bars' mean RGB colours. Both are None when the frame
+            is too small to hold the top bar.
+    """
+    colors = colors or expected_colors
+    height, width = frame.shape[:2]
+    if width < 10 * (HERO_WIDTH + HERO_GAP) + CLOCK_TOTAL_WIDTH or height < HERO_TOP_PADDING:
+        return None, None
+    strip = frame[:HERO_TOP_PADDING, _color_bar_sample_columns(width)]  # (rows, 10, cols, 3)
+    # Integer sums keep the truncated mean exact (the old per-slot cv2.mean + int()).
+    sums = strip.sum(axis=(0, 2), dtype=np.int64)
+    mean_colors = (sums // (strip.shape[0] * strip.shape[2]))[:, ::-1]  # BGR -> RGB
+    expected = np.array([
+        [int(colors[team][pos].lstrip('#')[j:j + 2], 16) for j in (0, 2, 4)]
+        for team, pos in _COLOR_BAR_SLOTS
+    ])
+    distances = np.sqrt(((mean_colors - expected) ** 2).sum(axis=1))
+    max_distance = 442  # Max possible distance in RGB space is sqrt(255^2 * 3)
+    return 1.0 - distances / max_distance, mean_colors
+
+
 def detect_hero_color_bars(frame_path, expected_colors, debug=False):
     """
     Detect hero color bars in the top padding section of hero portraits.
 
     This function checks if a frame contains the expected color bars for all heroes.
-    The color bars are located in the top 6px of each hero portrait.
+    The color bars are located in the top 6px of each hero portrait, and all 10 are
+    scored at once by color_bar_similarities; only those rows of the frame are read.
 
     Args:
-        frame_path: Path to the frame image
+        frame_path: Path to the frame image, or the decoded frame (its top rows suffice)
         expected_colors: Dictionary of expected colors for each team and position
         debug: Whether to save debug images
 
@@ -1841,159 +3057,51 @@ def detect_hero_color_bars(frame_path, expected_colors, debug=False):
         # Load the frame
         frame = load_image(frame_path)
         if frame is None:
-            logger.error(f"Could not load frame: {frame_path}")
+            logger.error(f"Could not load frame: {_frame_label(frame_path)}")
             return 0.0, {}
 
-        # Extract the hero bar
-        success, top_bar, center_x = extract_hero_bar(frame, debug=debug)
-        if not success or top_bar is None:
-            logger.warning(f"Could not extract hero bar from frame: {frame_path}")
+        similarities, mean_colors = color_bar_similarities(frame, expected_colors)
+        if similarities is None:
+            logger.warning(f"Could not extract hero bar from frame: {_frame_label(frame_path)}")
             return 0.0, {}
 
-        # Extract positions for hero color bars (similar to extract_hero_icons but we only need the top padding area)
-        height, width = top_bar.shape[:2]
-        detected_colors = {
-            "Radiant": {},
-            "Dire": {}
-        }
-
-        # Calculate skew offset based on height (we're only looking at the top so skew is minimal)
-        skew_offset = int(np.tan(np.radians(SKEW_ANGLE_DEGREES)) * HERO_TOP_PADDING)
-
-        # Create a visualization image if in debug mode
-        if debug:
-            visualization = top_bar.copy()
-            cv2.line(visualization, (center_x, 0), (center_x, height), (0, 255, 255), 2)
+        detected_colors = {"Radiant": {}, "Dire": {}}
+        for (team, pos), rgb in zip(_COLOR_BAR_SLOTS, mean_colors.tolist()):
+            detected_colors[team][pos] = tuple(rgb)
 
-        # Check Radiant heroes (left side, 5 heroes)
-        matches = 0
+        # Use a higher threshold for what counts as a match (0.8 instead of 0.7)
+        is_match = similarities > 0.8
+        matches = int(is_match.sum())
         total_positions = 10  # 5 Radiant + 5 Dire
-        color_similarities = []
-
-        for i in range(5):
-            # Calculate position based on center and hero width
-            x_start = center_x - CLOCK_LEFT_EXTEND - (5-i) * (HERO_WIDTH + HERO_GAP)
-
-            # Extract the color bar area (top padding only)
-            color_bar = top_bar[0:HERO_TOP_PADDING, x_start:x_start+HERO_WIDTH]
-
-            # Skip if empty
-            if color_bar.size == 0:
-                continue
 
-            # Find the dominant color in the center of the color bar
-            # We take a small region in the middle to avoid gradient edges
-            mid_width = HERO_WIDTH // 2
-            mid_section = color_bar[:, mid_width-10:mid_width+10]
-
-            # Get the average color in BGR format
-            avg_color = cv2.mean(mid_section)[:3]
-            # Convert BGR to RGB for comparison with expected colors
-            avg_color_rgb = (int(avg_color[2]), int(avg_color[1]), int(avg_color[0]))
-
-            # Store the detected color
-            detected_colors["Radiant"][i] = avg_color_rgb
-
-            # Check if this color is close to the expected color for this position
-            expected_color_hex = expected_colors["Radiant"][i]
-            # Convert hex to RGB
-            expected_color_rgb = tuple(int(expected_color_hex.lstrip('#')[j:j+2], 16) for j in (0, 2, 4))
-
-            # Calculate color similarity (Euclidean distance)
-            color_distance = sum((a - b) ** 2 for a, b in zip(avg_color_rgb, expected_color_rgb)) ** 0.5
-            max_distance = 442  # Max possible distance in RGB space is sqrt(255^2 * 3)
-            color_similarity = 1.0 - (color_distance / max_distance)
-            color_similarities.append(color_similarity)
-
-            # Use a higher threshold for what counts as a match (0.8 instead of 0.7)
-            if color_similarity > 0.8:
-                matches += 1
-
-            # Draw rectangle in debug mode
-            if debug:
-                # Draw rectangle for the color bar area
-                cv2.rectangle(visualization, (x_start, 0), (x_start+HERO_WIDTH, HERO_TOP_PADDING),
-                             (int(avg_color[0]), int(avg_color[1]), int(avg_color[2])), -1)
-                # Add color info text
-                cv2.putText(visualization, f"R{i+1}: {avg_color_rgb}", (x_start, HERO_TOP_PADDING+15),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
-                # Add similarity score
-                cv2.putText(visualization, f"{color_similarity:.2f}", (x_start, HERO_TOP_PADDING+30),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
-                # Indicate if it's a match or not
-                cv2.putText(visualization, "✓" if color_similarity > 0.8 else "✗",
-                          (x_start + HERO_WIDTH - 15, HERO_TOP_PADDING+30),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.4,
-                          (0, 255, 0) if color_similarity > 0.8 else (0, 0, 255), 1)
-
-        # Check Dire heroes (right side, 5 heroes)
-        for i in range(5):
-            # Calculate position based on center and hero width
-            x_start = center_x + CLOCK_RIGHT_EXTEND + i * (HERO_WIDTH + HERO_GAP)
-
-            # Extract the color bar area (top padding only)
-            color_bar = top_bar[0:HERO_TOP_PADDING, x_start:x_start+HERO_WIDTH]
-
-            # Skip if empty
-            if color_bar.size == 0:
-                continue
-
-            # Find the dominant color in the center of the color bar
-            # We take a small region in the middle to avoid gradient edges
-            mid_width = HERO_WIDTH // 2
-            mid_section = color_bar[:, mid_width-10:mid_width+10]
-
-            # Get the average color in BGR format
-            avg_color = cv2.mean(mid_section)[:3]
-            # Convert BGR to RGB for comparison with expected colors
-            avg_color_rgb = (int(avg_color[2]), int(avg_color[1]), int(avg_color[0]))
-
-            # Store the detected color
-            detected_colors["Dire"][i] = avg_color_rgb
-
-            # Check if this color is close to the expected color for this position
-            expected_color_hex = expected_colors["Dire"][i]
-            # Convert hex to RGB
-            expected_color_rgb = tuple(int(expected_color_hex.lstrip('#')[j:j+2], 16) for j in (0, 2, 4))
-
-            # Calculate color similarity (Euclidean distance)
-            color_distance = sum((a - b) ** 2 for a, b in zip(avg_color_rgb, expected_color_rgb)) ** 0.5
-            max_distance = 442  # Max possible distance in RGB space is sqrt(255^2 * 3)
-            color_similarity = 1.0 - (color_distance / max_distance)
-            color_similarities.append(color_similarity)
-
-            # Use a higher threshold for what counts as a match (0.8 instead of 0.7)
-            if color_similarity > 0.8:
-                matches += 1
-
-            # Draw rectangle in debug mode
-            if debug:
+        if debug:
+            top_bar = frame[:HERO_TOTAL_HEIGHT].copy()
+            center_x = frame.shape[1] // 2
+            cv2.line(top_bar, (center_x, 0), (center_x, top_bar.shape[0]), (0, 255, 255), 2)
+            columns = _color_bar_sample_columns(frame.shape[1])
+            for slot, (team, pos) in enumerate(_COLOR_BAR_SLOTS):
+                x_start = int(columns[slot, 0]) - (HERO_WIDTH - _COLOR_BAR_SAMPLE_WIDTH) // 2
+                r, g, b = detected_colors[team][pos]
+                ok = bool(is_match[slot])
                 # Draw rectangle for the color bar area
-                cv2.rectangle(visualization, (x_start, 0), (x_start+HERO_WIDTH, HERO_TOP_PADDING),
-                             (int(avg_color[0]), int(avg_color[1]), int(avg_color[2])), -1)
-                # Add color info text
-                cv2.putText(visualization, f"D{i+1}: {avg_color_rgb}", (x_start, HERO_TOP_PADDING+15),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
-                # Add similarity score
-                cv2.putText(visualization, f"{color_similarity:.2f}", (x_start, HERO_TOP_PADDING+30),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+                cv2.rectangle(top_bar, (x_start, 0), (x_start+HERO_WIDTH, HERO_TOP_PADDING), (b, g, r), -1)
+                # Add color info and similarity score
+                cv2.putText(top_bar, f"{team[0]}{pos+1}: {(r, g, b)}", (x_start, HERO_TOP_PADDING+15),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+                cv2.putText(top_bar, f"{similarities[slot]:.2f}", (x_start, HERO_TOP_PADDING+30),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
                 # Indicate if it's a match or not
-                cv2.putText(visualization, "✓" if color_similarity > 0.8 else "✗",
-                          (x_start + HERO_WIDTH - 15, HERO_TOP_PADDING+30),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.4,
-                          (0, 255, 0) if color_similarity > 0.8 else (0, 0, 255), 1)
-
-        # Save the visualization
-        if debug:
-            save_debug_image(visualization, "hero_color_bars", f"Match score: {matches}/{total_positions}")
+                cv2.putText(top_bar, "✓" if ok else "✗", (x_start + HERO_WIDTH - 15, HERO_TOP_PADDING+30),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 0) if ok else (0, 0, 255), 1)
+            save_debug_image(top_bar, "hero_color_bars", f"Match score: {matches}/{total_positions}")
 
         # Add color similarities to the detected colors output for debugging
-        detected_colors["color_similarities"] = {i: float(color_similarities[i]) for i in range(len(color_similarities))}
-        detected_colors["average_similarity"] = float(sum(color_similarities) / len(color_similarities)) if color_similarities else 0
+        detected_colors["color_similarities"] = {i: float(v) for i, v in enumerate(similarities)}
+        detected_colors["average_similarity"] = float(similarities.mean())
 
         # Calculate overall match score
         match_score = matches / total_positions
-        logger.debug(f"Frame {frame_path} color bar match score: {match_score:.2f} ({matches}/{total_positions} matches)")
+        logger.debug(f"Frame {_frame_label(frame_path)} color bar match score: {match_score:.2f} ({matches}/{total_positions} matches)")
 
         return match_score, detected_colors
     except Exception as e:
@@ -2002,7 +3110,7 @@ def detect_hero_color_bars(frame_path, expected_colors, debug=False):
     finally:
         performance_timer.stop('detect_hero_color_bars')
 
-def process_frames_for_heroes(frame_paths, debug=False):
+def process_frames_for_heroes(frame_paths, debug=False, arriving_frames=None):
     """
     Process multiple frames to identify heroes.
 
@@ -2010,16 +3118,23 @@ def process_frames_for_heroes(frame_paths, debug=False):
     a perfect match for hero color bars (10/10 matches), then processes
     only that frame for hero identification.
 
+    Frames still being fetched can be passed as arriving_frames: they are scored as
+    they arrive, before frame_paths, and appended to frame_paths so frame_index
+    still points into it. A perfect match among them stops the scan (and closes the
+    iterator, dropping fetches that haven't started) without waiting for the rest.
+
     Args:
-        frame_paths: List of paths to frame images
+        frame_paths: List of paths to frame images, or of decoded frames
         debug: Whether to save debug images
+        arriving_frames: Optional iterable of further frames, in arrival order
 
     Returns:
         tuple: (heroes, best_frame_info)
             - heroes: List of identified heroes from the best frame
             - best_frame_info: Dictionary containing the best frame details:
                 - frame_index: Index of the best frame in frame_paths
-                - frame_path: Path to the best frame
+                - frame_path: Path to the best frame (None for an in-memory frame;
+                  callers that serve it save frame_paths[frame_index])
                 - match_score: Color bar match score (0.0 to 1.0)
                 - detected_colors: Dictionary of detected colors for each team and position
     """
@@ -2038,8 +3153,26 @@ def process_frames_for_heroes(frame_paths, debug=False):
     reversed_frames = list(enumerate(frame_paths))
     reversed_frames.reverse()
 
-    for i, frame_path in tqdm(reversed_frames, desc="Finding frame with best color bars (last to first)"):
-        logger.debug(f"Analyzing color bars in frame {i+1}/{len(frame_paths)}: {frame_path}")
+    if arriving_frames is not None:
+        # Score fetched frames in completion order ahead of the ones already in hand,
+        # so detection doesn't wait for the slowest fetch unless it has to.
+        def scan_order():
+            arriving = iter(arriving_frames)
+            try:
+                for frame in arriving:
+                    frame_paths.append(frame)
+                    yield len(frame_paths) - 1, frame
+            finally:
+                close = getattr(arriving, 'close', None)
+                if close is not None:
+                    close()
+            yield from reversed_frames
+        frame_iter = scan_order()
+    else:
+        frame_iter = tqdm(reversed_frames, desc="Finding frame with best color bars (last to first)")
+
+    for i, frame_path in frame_iter:
+        logger.debug(f"Analyzing color bars in frame {i+1}/{len(frame_paths)}: {_frame_label(frame_path)}")
 
         # Check color bars in this frame
         performance_timer.start(f'color_bars_{i+1}')
@@ -2059,6 +3192,9 @@ def process_frames_for_heroes(frame_paths, debug=False):
                 logger.info(f"Found perfect color match (10/10) in frame {i+1}")
                 perfect_match_found = True
                 break
+    if arriving_frames is not None:
+        # Stops any sampling still in flight after an early perfect match.
+        frame_iter.close()
 
     # If we didn't find a perfect match, check if we have a reasonably good match
     if not perfect_match_found:
@@ -2069,10 +3205,10 @@ def process_frames_for_heroes(frame_paths, debug=False):
             # Stop timing for all frames
             total_duration = performance_timer.stop('process_all_frames')
             logger.info(f"Processing failed due to insufficient color match score (required >= 0.7)")
-            return [], {'frame_index': best_color_frame_index, 'frame_path': best_color_frame_path, 'match_score': best_color_match_score, 'detected_colors': best_detected_colors}
+            return [], {'frame_index': best_color_frame_index, 'frame_path': _frame_path_or_none(best_color_frame_path), 'match_score': best_color_match_score, 'detected_colors': best_detected_colors}
 
     # Process only the best frame for hero identification
-    logger.info(f"Processing frame #{best_color_frame_index+1}: {best_color_frame_path} with color match score {best_color_match_score:.2f}")
+    logger.info(f"Processing frame #{best_color_frame_index+1}: {_frame_label(best_color_frame_path)} with color match score {best_color_match_score:.2f}")
 
     # Process the selected frame
     performance_timer.start('process_best_frame')
@@ -2082,7 +3218,7 @@ def process_frames_for_heroes(frame_paths, debug=False):
     # Create a dictionary with information about the best frame
     best_frame_info = {
         'frame_index': best_color_frame_index,
-        'frame_path': best_color_frame_path,
+        'frame_path': _frame_path_or_none(best_color_frame_path),
         'match_score': best_color_match_score,
         'detected_colors': best_detected_colors
     }
@@ -2126,7 +3262,7 @@ def redetect_low_confidence_slots(heroes, extra_frame_paths, threshold=HERO_CONF
         try:
             candidates = process_frame_for_heroes(frame_path, debug=debug)
         except Exception as e:
-            logger.warning(f"Re-scan failed for frame {frame_path}: {e}")
+            logger.warning(f"Re-scan failed for frame {_frame_label(frame_path)}: {e}")
             continue
         for cand in candidates:
             slot = (cand.get('team'), cand.get('position'))
@@ -2786,7 +3922,7 @@ def _read_pick_screen_roster(frame_path, debug=False):
     scores lose to any real in-game read in _merge_hero_slots, while the name and rank
     persist — they're tracked per-slot independently of the identity winner.
     """
-    if not frame_path:
+    if frame_path is None:
         return None
     frame = load_image(frame_path)
     if frame is None:
@@ -3014,7 +4150,7 @@ def processDraft(frame, debug=False):
         logger.error(f"Error processing draft frame: {e}")
         return result
 
-def process_media(media_source, source_type="clip", debug=False, min_score=0.4, debug_templates=False, show_timings=False, num_frames=3, only_draft=False, in_game=False):
+def process_media(media_source, source_type="clip", debug=False, min_score=0.4, debug_templates=False, show_timings=False, num_frames=3, only_draft=False, in_game=False, prefetched=None):
     """Process a clip URL or stream username and return the hero detection results.
 
     Args:
@@ -3025,10 +4161,12 @@ def process_media(media_source, source_type="clip", debug=False, min_score=0.4,
         debug_templates (bool): Enable template debugging
         show_timings (bool): Show timing information
         num_frames (int): Number of frames to capture from the stream (only used for streams)
+        prefetched (dict): Network results from prefetch_clip_frames for this clip (clips only)
 
     Returns:
         dict: Detection results or None if processing failed
     """
+    prefetched = prefetched or {}
     # Start the overall timing
     performance_timer.start('total_execution')
 
@@ -3083,9 +4221,11 @@ def process_media(media_source, source_type="clip", debug=False, min_score=0.4,
                     print("Error: clip_utils module not available")
                 return None
 
-            # Get clip details
+            # Get clip details (the prefetch stage may already have looked them up)
+            if prefetched.get('error') is not None:
+                raise prefetched['error']
             performance_timer.start('get_clip_details')
-            clip_details = get_clip_details(clip_url)
+            clip_details = prefetched.get('clip_details') or get_clip_details(clip_url)
             performance_timer.stop('get_clip_details')
             logger.info("Clip details retrieved")
 
@@ -3093,13 +4233,16 @@ def process_media(media_source, source_type="clip", debug=False, min_score=0.4,
             frames_dir = TEMP_DIR / "frames"
             frames_dir.mkdir(exist_ok=True)
 
-            # Instead of downloading the entire clip and extracting frames
+            # Instead of downloading the entire clip and extracting frames. The frame
+            # stays decoded in memory; only the frame that wins is written to disk.
             performance_timer.start('download_clip')
-            frame_path = download_single_frame(clip_details)
-            frame_paths.append(frame_path)
+            frame = prefetched.get('frame')
+            if frame is None:
+                frame = download_single_frame(clip_details, return_frame=True)
+            frame_paths.append(frame)
             performance_timer.stop('download_clip')
-            # You can also specify a timestamp (in seconds)
-            # frame_path = download_single_frame(clip_details, timestamp=10)  # frame at 10 seconds
+            # Any timestamp is as cheap (moov + one keyframe of range requests), e.g.
+            # download_single_frame(clip_details, timestamp=10, return_frame=True)
 
             # Extract frames
             # Download the clip
@@ -3145,7 +4288,7 @@ def process_media(media_source, source_type="clip", debug=False, min_score=0.4,
 
             # Capture frames from the stream
             performance_timer.start('capture_frames')
-            frame_paths = capture_frames_func(username, num_frames=num_frames)
+            frame_paths = capture_frames_func(username, num_frames=num_frames, return_frames=True)
             performance_timer.stop('capture_frames')
 
             if not frame_paths:
@@ -3156,7 +4299,7 @@ def process_media(media_source, source_type="clip", debug=False, min_score=0.4,
 
         frame = load_image(frame_paths[0])
         if frame is None:
-            logger.error(f"Could not load frame: {frame_paths[0]}")
+            logger.error(f"Could not load frame: {_frame_label(frame_paths[0])}")
             return None
 
         # If explicitly handling draft-only endpoint, run draft detection here
@@ -3208,42 +4351,45 @@ def process_media(media_source, source_type="clip", debug=False, min_score=0.4,
         # Cheap by construction: sampling reuses the clip download the low-confidence
         # rescan below already performs, and colour-bar scoring is a fast template
         # compare — no OCR runs until a winning frame is chosen.
+        arriving_frames = None
         if source_type == "clip" and clip_details is not None and len(frame_paths) <= 1:
-            try:
-                performance_timer.start('sample_frames')
-                sampled = _sample_clip_frames(clip_details)
-                performance_timer.stop('sample_frames')
-                if sampled:
+            if 'sampled' in prefetched:
+                if prefetched['sampled']:
                     # Keep frame 0 first so an unchanged clip still scores identically.
-                    frame_paths = list(dict.fromkeys(frame_paths + sampled))
+                    frame_paths = frame_paths + prefetched['sampled']
                     logger.info(f"Sampled {len(frame_paths)} frames across the clip")
-            except Exception as e:
-                # Sampling is an optimisation; frame 0 alone still works.
-                logger.warning(f"Could not sample extra frames, using frame 0 only: {e}")
+            else:
+                # Scored as each keyframe arrives, so a perfect match doesn't wait for
+                # the slowest range fetch; sampling failures leave frame 0 alone.
+                frame_paths = list(frame_paths)
+                arriving_frames = _iter_clip_frames(clip_details)
 
         # Use all frames for color bar detection and hero identification
         logger.info(f"Analyzing all frames for hero color bars")
 
         # Process frames for heroes using our approach
         performance_timer.start('process_frames')
-        heroes, best_frame_info = process_frames_for_heroes(frame_paths, debug=debug)
+        heroes, best_frame_info = process_frames_for_heroes(frame_paths, debug=debug, arriving_frames=arriving_frames)
         processing_time = performance_timer.stop('process_frames')
+        best_index = best_frame_info.get('frame_index', -1)
+        best_frame = frame_paths[best_index] if 0 <= best_index < len(frame_paths) else None
 
         # Re-scan extra frames to recover low-confidence slots (e.g. a portrait occluded
         # by an overlay in the chosen frame but clear elsewhere) before flagging/gating.
         if heroes and any(is_low_confidence(h) for h in heroes):
-            extra_frames = []
-            if source_type == "clip" and clip_details is not None:
+            # Frames already decoded for sampling (or captured from the stream) are the
+            # re-scan candidates; a clip only goes back to the file when it has none.
+            extra_frames = [f for i, f in enumerate(frame_paths) if i != best_index]
+            if not extra_frames and source_type == "clip" and clip_details is not None:
                 try:
                     clip_path = download_clip(clip_details)
                     duration = clip_details.get('duration') or 0
                     interval = max(1, int(duration / (RESCAN_FRAME_COUNT + 1))) if duration else 5
-                    rescan_frames = extract_frames(clip_path, clip_details=clip_details, frame_interval=interval)
-                    extra_frames = [f for f in rescan_frames if f != best_frame_info.get('frame_path')]
+                    # Re-scan frames are only matched, never served, so decode just
+                    # the detection regions in a single pass.
+                    extra_frames = extract_frames(clip_path, clip_details=clip_details, frame_interval=interval, roi_only=True)
                 except Exception as e:
                     logger.warning(f"Could not gather re-scan frames for clip: {e}")
-            elif source_type == "stream":
-                extra_frames = [f for f in frame_paths if f != best_frame_info.get('frame_path')]
 
             if extra_frames:
                 logger.info(f"Re-scanning {len(extra_frames)} extra frame(s) for low-confidence slots")
@@ -3262,7 +4408,6 @@ def process_media(media_source, source_type="clip", debug=False, min_score=0.4,
         if heroes:
             # Get the best frame information from process_frames_for_heroes
             best_frame_index = best_frame_info['frame_index']
-            best_frame_path = best_frame_info['frame_path']
             best_match_score = best_frame_info['match_score']
             detected_colors = best_frame_info['detected_colors']
 
@@ -3305,7 +4450,16 @@ def process_media(media_source, source_type="clip", debug=False, min_score=0.4,
             players = build_players_from_heroes(heroes)
 
             # Extract team captains from the best frame
-            captains = extract_team_captains_from_frame(best_frame_path, debug=debug)
+            captains = extract_team_captains_from_frame(best_frame, debug=debug)
+
+            # The best frame is the one image the API may serve from /images, so it
+            # is the only one written to disk.
+            if best_frame_info.get('frame_path') is None and best_frame is not None:
+                if source_type == "clip" and clip_details is not None:
+                    frame_name = f"{clip_details['id']}_best"
+                else:
+                    frame_name = f"{media_source}_{int(time.time())}"
+                best_frame_info['frame_path'] = _save_frame(best_frame, frame_name)
 
             # Format the result as a dictionary
             result = {
@@ -3340,7 +4494,7 @@ def process_media(media_source, source_type="clip", debug=False, min_score=0.4,
             # player name and rank in the top bar — the richest roster view in the
             # pipeline. Recover it instead of discarding the clip. This third OCR band
             # only ever runs here, on the gate-failure path, never on the success path.
-            pick_heroes = _read_pick_screen_roster(best_frame_info.get('frame_path'), debug=debug)
+            pick_heroes = _read_pick_screen_roster(best_frame, debug=debug)
             if pick_heroes:
                 players = build_players_from_heroes(pick_heroes)
                 return {
@@ -3376,7 +4530,7 @@ def process_media(media_source, source_type="clip", debug=False, min_score=0.4,
         if 'total_execution' in performance_timer.timings and not performance_timer.timings['total_execution']['stopped']:
             performance_timer.stop('total_execution')
 
-def process_clip_url(clip_url, debug=False, min_score=0.4, debug_templates=False, show_timings=False, only_draft=False, in_game=False):
+def process_clip_url(clip_url, debug=False, min_score=0.4, debug_templates=False, show_timings=False, only_draft=False, in_game=False, prefetched=None):
     """Process a clip URL and return the hero detection results.
 
     Args:
@@ -3386,12 +4540,47 @@ def process_clip_url(clip_url, debug=False, min_score=0.4, debug_templates=False
         debug_templates (bool): Enable template debugging
         show_timings (bool): Show timing information
         in_game (bool): Detect from the live in-game top bar instead of the picking layout
+        prefetched (dict): Result of prefetch_clip_frames for this clip, if already fetched
 
     Returns:
         dict: Detection results or None if processing failed
     """
     return process_media(clip_url, source_type="clip", debug=debug, min_score=min_score,
-                        debug_templates=debug_templates, show_timings=show_timings, only_draft=only_draft, in_game=in_game)
+                        debug_templates=debug_templates, show_timings=show_timings, only_draft=only_draft, in_game=in_game,
+                        prefetched=prefetched)
+
+
+def prefetch_clip_frames(clip_url, sample=True):
+    """
+    Do the network half of process_clip_url ahead of detection.
+
+    Looks up the clip and decodes the frames process_media would fetch for it:
+    frame 0 and, when sample is set, the frames spread across the clip. Pass the
+    result back as process_clip_url(..., prefetched=...). A failed clip lookup is
+    kept under 'error' and re-raised there, so the request fails exactly as it
+    would have; any frame that couldn't be fetched is simply left out and
+    fetched again by process_media.
+
+    Args:
+        clip_url (str): URL of the Twitch clip
+        sample (bool): Also fetch the sampled frames (not used by draft-only or in-game detection)
+
+    Returns:
+        dict: Any of 'clip_details', 'frame', 'sampled' and 'error'
+    """
+    prefetched = {}
+    try:
+        prefetched['clip_details'] = get_clip_details(clip_url)
+    except Exception as e:
+        prefetched['error'] = e
+        return prefetched
+    try:
+        prefetched['frame'] = download_single_frame(prefetched['clip_details'], return_frame=True)
+        if sample:
+            prefetched['sampled'] = _sample_clip_frames(prefetched['clip_details'])
+    except Exception as e:
+        logger.warning(f"Could not prefetch frames for {clip_url}: {e}")
+    return prefetched
 
 def process_stream_username(username, debug=False, min_score=0.4, debug_templates=False, show_timings=False, num_frames=3, only_draft=False):
     """Process a Twitch stream by username and return the hero detection results.
@@ -3504,9 +4693,35 @@ def main():
                           help="Don't clear debug directory between runs")
         parser.add_argument("--json-only", action="store_true",
                           help="Only output JSON with no additional text (for API use)")
+        parser.add_argument("--cascade-recall", nargs="+", metavar="FRAME",
+                          help="Report how often the cascade shortlist keeps the true top match on these frames")
+        parser.add_argument("--cascade-k", default="8,16,32,64",
+                          help="Comma-separated shortlist sizes for --cascade-recall (default: 8,16,32,64)")
+        parser.add_argument("--storage-benchmark", nargs="+", metavar="FRAME",
+                          help="Compare compact (COMPACT_TEMPLATES) template storage with the full layout on these frames")
+        parser.add_argument("--in-game", action="store_true",
+                          help="Evaluate --cascade-recall/--storage-benchmark on the in-game top bar instead of the picking screen")
 
         args = parser.parse_args()
 
+        if args.cascade_recall:
+            report = cascade_recall_report(
+                args.cascade_recall,
+                k_values=[int(k) for k in args.cascade_k.split(",") if k.strip()],
+                in_game=args.in_game
+            )
+            if report is None:
+                return 1
+            print(json.dumps(report, indent=2))
+            return 0
+
+        if args.storage_benchmark:
+            report = template_storage_report(args.storage_benchmark, in_game=args.in_game)
+            if report is None:
+                return 1
+            print(json.dumps(report, indent=2))
+            return 0
+
         # Process a live stream if username is provided
         if args.stream:
             result = process_stream_username(
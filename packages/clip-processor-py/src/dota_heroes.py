@@ -1,11 +1,18 @@
 import os
 import json
+import hashlib
+import tempfile
 import requests
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from tqdm import tqdm
 
+try:
+    import http_client
+except ImportError:
+    from . import http_client
+
 # Configure logging
 logging.basicConfig(level=getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO), format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -102,6 +109,12 @@ def hero_roster_signature(hero_data):
     ]
 
 
+def hero_roster_digest(hero_data):
+    """Short, stable digest of hero_roster_signature for versioning on-disk caches."""
+    signature = json.dumps(hero_roster_signature(hero_data), separators=(",", ":"), default=str)
+    return hashlib.sha256(signature.encode("utf-8")).hexdigest()
+
+
 def all_variant_images_exist(hero_data):
     """Return whether all cached variant files exist on disk."""
     for hero in hero_data or []:
@@ -140,15 +153,57 @@ def get_missing_expected_variants(cached_hero_data, heroes):
     return missing_variants
 
 
+# Template cache files: the contiguous template array, its manifest, and the legacy
+# pickled dict cache that preceded them.
+TEMPLATE_CACHE_FILENAMES = ("templates_cache.npy", "templates_cache.json", "templates_cache.npz")
+
+
 def invalidate_template_cache():
-    """Remove the precomputed template cache after roster or image changes."""
-    cache_path = ASSETS_DIR / "templates_cache.npz"
-    if cache_path.exists():
+    """
+    Mark the precomputed template cache stale after roster or image changes.
+
+    The template array is kept: clearing the manifest's roster digests makes the
+    detector re-hash every portrait on its next load and recompute only templates
+    whose image content changed. The legacy pickled cache is removed outright.
+    """
+    array_path, manifest_path, legacy_path = (ASSETS_DIR / filename for filename in TEMPLATE_CACHE_FILENAMES)
+    if manifest_path.exists():
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            manifest["roster_digests"] = {}
+            # A private temp file, so concurrent writers never share one; if a detector
+            # rewrote the array meanwhile, the manifest's array sha1 no longer matches and
+            # the detector rebuilds
+            fd, tmp_path = tempfile.mkstemp(dir=str(manifest_path.parent), prefix=manifest_path.name + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(manifest, f)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, manifest_path)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+            logger.info(f"Marked template cache for revalidation: {manifest_path}")
+        except Exception as e:
+            logger.warning(f"Failed to mark template cache stale, removing it: {e}")
+            for cache_path in (array_path, manifest_path):
+                try:
+                    cache_path.unlink()
+                except FileNotFoundError:
+                    pass
+                except Exception as unlink_error:
+                    logger.warning(f"Failed to remove stale template cache {cache_path}: {unlink_error}")
+
+    if legacy_path.exists():
         try:
-            cache_path.unlink()
-            logger.info(f"Removed stale template cache: {cache_path}")
+            legacy_path.unlink()
+            logger.info(f"Removed stale template cache: {legacy_path}")
         except Exception as e:
-            logger.warning(f"Failed to remove stale template cache {cache_path}: {e}")
+            logger.warning(f"Failed to remove stale template cache {legacy_path}: {e}")
 
 
 def get_hero_list():
@@ -162,7 +217,7 @@ def get_hero_list():
     ):
         logger.info(f"Fetching hero list from {source_name}: {source_url}")
         try:
-            response = requests.get(source_url, timeout=REQUEST_TIMEOUT_SECONDS)
+            response = http_client.get(source_url, timeout=REQUEST_TIMEOUT_SECONDS)
             response.raise_for_status()
             heroes = parser(response.json())
 
@@ -333,7 +388,7 @@ def download_image(image_url, image_path, description):
 
     try:
         logger.debug(f"Downloading {description} from {image_url}")
-        response = requests.get(image_url, stream=True, timeout=REQUEST_TIMEOUT_SECONDS)
+        response = http_client.get(image_url, stream=True, timeout=REQUEST_TIMEOUT_SECONDS)
         response.raise_for_status()
 
         with open(image_path, 'wb') as f:
@@ -454,7 +509,7 @@ def download_hero_abilities():
     logger.info(f"Downloading hero abilities data from {HERO_ABILITIES_URL}")
 
     try:
-        response = requests.get(HERO_ABILITIES_URL, timeout=REQUEST_TIMEOUT_SECONDS)
+        response = http_client.get(HERO_ABILITIES_URL, timeout=REQUEST_TIMEOUT_SECONDS)
         response.raise_for_status()
 
         abilities_data = response.json()
@@ -0,0 +1,165 @@
+"""
+Shared HTTP client for Twitch, clip CDN and asset traffic.
+
+Requests go through one keep-alive ``requests.Session`` per host, so repeated
+calls to gql.twitch.tv or the clip CDN reuse pooled connections instead of
+paying a TCP + TLS handshake each time. Every request gets a default timeout,
+at most HTTP_MAX_CONCURRENT_PER_HOST requests run against one host at once, and
+per-host latency and byte counts are kept for the /metrics endpoint. Only the
+HTTP_MAX_HOSTS most recently used hosts keep a session: HLS edge and CDN host
+names rotate, so older ones are closed (and drop out of the metrics) rather
+than accumulating.
+
+``get``, ``post`` and ``request`` take the same arguments as their ``requests``
+counterparts and return ordinary ``requests.Response`` objects.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Re-exported so callers can catch transport errors without importing requests.
+RequestException = requests.RequestException
+
+# Default (connect, read) timeout in seconds for requests that don't pass one
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "20"))
+# Keep-alive connections kept open per host
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "16"))
+# Requests allowed in flight against one host; further callers wait for a slot
+HTTP_MAX_CONCURRENT_PER_HOST = int(os.environ.get("HTTP_MAX_CONCURRENT_PER_HOST", "16"))
+# Hosts that keep a pooled session; the least recently used one is closed beyond this
+HTTP_MAX_HOSTS = int(os.environ.get("HTTP_MAX_HOSTS", "32"))
+
+
+class _HostClient:
+    """Pooled session, concurrency limit and counters for one host."""
+
+    def __init__(self, host):
+        self.host = host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.slots = threading.BoundedSemaphore(HTTP_MAX_CONCURRENT_PER_HOST)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+
+    def record(self, latency, size=0, error=False):
+        with self.lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.bytes += size
+            self.latency_seconds += latency
+            self.max_latency_seconds = max(self.max_latency_seconds, latency)
+
+    def add_bytes(self, size):
+        with self.lock:
+            self.bytes += size
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "bytes": self.bytes,
+                "avg_latency_ms": round(1000 * self.latency_seconds / self.requests, 1) if self.requests else 0.0,
+                "max_latency_ms": round(1000 * self.max_latency_seconds, 1),
+            }
+
+
+_clients = OrderedDict()  # host -> _HostClient, least recently used first
+_clients_lock = threading.Lock()
+
+
+def _client_for(url):
+    host = urlsplit(url).netloc.lower()
+    evicted = []
+    with _clients_lock:
+        client = _clients.get(host)
+        if client is None:
+            client = _clients[host] = _HostClient(host)
+            while len(_clients) > max(1, HTTP_MAX_HOSTS):
+                evicted.append(_clients.popitem(last=False)[1])
+        else:
+            _clients.move_to_end(host)
+    for old in evicted:
+        # Requests still in flight on it finish; their connections are just not reused
+        old.session.close()
+    return client
+
+
+def _count_streamed_bytes(client, iter_content):
+    """Wrap a streamed response's iter_content so the bytes read are recorded."""
+    def counting_iter_content(*args, **kwargs):
+        for chunk in iter_content(*args, **kwargs):
+            if chunk:
+                client.add_bytes(len(chunk))
+            yield chunk
+    return counting_iter_content
+
+
+def request(method, url, **kwargs):
+    """
+    Send a request through the pooled session for url's host.
+
+    Takes the same arguments as ``requests.request``; ``timeout`` defaults to
+    HTTP_TIMEOUT. The per-host concurrency slot is held until the body has been
+    read, or until the headers arrive for ``stream=True`` requests, whose bytes
+    are counted as ``iter_content`` consumes them.
+
+    Returns:
+        requests.Response: The response (errors raise RequestException as usual)
+    """
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+    client = _client_for(url)
+    started = time.monotonic()
+    with client.slots:
+        try:
+            response = client.session.request(method, url, **kwargs)
+        except Exception:
+            client.record(time.monotonic() - started, error=True)
+            raise
+    latency = time.monotonic() - started
+    if kwargs.get("stream"):
+        client.record(latency, error=response.status_code >= 500)
+        response.iter_content = _count_streamed_bytes(client, response.iter_content)
+    else:
+        client.record(latency, len(response.content), error=response.status_code >= 500)
+    return response
+
+
+def get(url, **kwargs):
+    """GET url through the shared pool; see request()."""
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    """POST to url through the shared pool; see request()."""
+    return request("POST", url, **kwargs)
+
+
+def metrics():
+    """Return per-host request counts, error counts, bytes and latency."""
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {client.host: client.snapshot() for client in clients}
+
+
+def close():
+    """Close every pooled session; the next request opens fresh pools."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.session.close()
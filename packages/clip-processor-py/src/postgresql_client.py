@@ -9,11 +9,15 @@ to cache and retrieve clip processing results.
 import os
 import json
 import logging
+import select
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List, Tuple
 import traceback
 import psycopg2
-from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extensions import TRANSACTION_STATUS_INERROR, TRANSACTION_STATUS_UNKNOWN
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 from psycopg2.extras import RealDictCursor
 import uuid
 import statistics
@@ -33,6 +37,157 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Queue wake-ups: how often the LISTEN connection checks for notifications when
+# idle, and how long it waits before reconnecting after losing the connection.
+QUEUE_LISTEN_POLL_SECONDS = float(os.environ.get('QUEUE_LISTEN_POLL_SECONDS', '5'))
+QUEUE_LISTEN_RETRY_SECONDS = float(os.environ.get('QUEUE_LISTEN_RETRY_SECONDS', '10'))
+# How long add_to_queue reuses an average processing time before recomputing it
+AVERAGE_PROCESSING_TIME_TTL = float(os.environ.get('AVERAGE_PROCESSING_TIME_TTL', '300'))
+
+# Connection pool size: by default one connection per thread that can query at
+# once -- queue workers, prefetch threads, gunicorn request threads, and the
+# worker monitor and failed-clip sweeper.
+DB_POOL_MAX_CONNECTIONS = int(os.environ.get('DB_POOL_MAX_CONNECTIONS') or (
+    int(os.environ.get('NUM_WORKER_THREADS', '5'))
+    + int(os.environ.get('QUEUE_PREFETCH_WORKERS', '2'))
+    + int(os.environ.get('GUNICORN_THREADS', '4'))
+    + 2
+))
+# Connections idle longer than this are pinged before reuse; fresher ones aren't
+DB_POOL_IDLE_CHECK_SECONDS = float(os.environ.get('DB_POOL_IDLE_CHECK_SECONDS', '30'))
+# How long a checkout waits for a free connection when all are in use
+DB_POOL_CHECKOUT_TIMEOUT = float(os.environ.get('DB_POOL_CHECKOUT_TIMEOUT', '30'))
+
+
+class MonitoredConnectionPool:
+    """
+    Thread-safe connection pool that waits when exhausted and checks health lazily.
+
+    Wraps ThreadedConnectionPool, which raises as soon as every connection is in
+    use: checkouts here wait up to DB_POOL_CHECKOUT_TIMEOUT for one to come back.
+    A connection is only pinged (SELECT 1) before reuse when it sat idle longer
+    than DB_POOL_IDLE_CHECK_SECONDS or was returned broken or mid-error, so a busy
+    pool costs no extra round trips. Checkout wait time, in-use count and
+    failures are kept for stats().
+    """
+
+    def __init__(self, dsn, maxconn, idle_check_seconds=None, checkout_timeout=None):
+        self.maxconn = maxconn
+        self.idle_check_seconds = DB_POOL_IDLE_CHECK_SECONDS if idle_check_seconds is None else idle_check_seconds
+        self.checkout_timeout = DB_POOL_CHECKOUT_TIMEOUT if checkout_timeout is None else checkout_timeout
+        self._pool = ThreadedConnectionPool(1, maxconn, dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._returned_at = {}  # id(conn) -> monotonic time it was last returned
+        self._suspect = set()  # id(conn) returned in an error state
+        self._stats = {
+            "checkouts": 0,
+            "in_use": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "health_checks": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def _needs_check(self, conn) -> bool:
+        with self._lock:
+            if id(conn) in self._suspect:
+                return True
+            returned_at = self._returned_at.get(id(conn))
+        return returned_at is not None and time.monotonic() - returned_at > self.idle_check_seconds
+
+    def _forget(self, conn) -> None:
+        with self._lock:
+            self._returned_at.pop(id(conn), None)
+            self._suspect.discard(id(conn))
+
+    def _checkout_healthy(self):
+        """Take a connection from the pool, replacing any that fail their health check."""
+        for _attempt in range(self.maxconn + 1):
+            conn = self._pool.getconn()
+            if not self._needs_check(conn):
+                return conn
+            with self._lock:
+                self._stats["health_checks"] += 1
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+                conn.rollback()
+                self._forget(conn)
+                return conn
+            except Exception as e:
+                logger.warning(f"Connection health check failed, replacing connection: {str(e)}")
+                with self._lock:
+                    self._stats["failures"] += 1
+                self._forget(conn)
+                self._pool.putconn(conn, close=True)
+        raise PoolError("no healthy connection available")
+
+    def getconn(self):
+        """Check out a connection, waiting up to checkout_timeout if all are in use."""
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+                self._stats["failures"] += 1
+            raise PoolError(f"timed out after {self.checkout_timeout}s waiting for a database connection")
+        waited = time.monotonic() - start
+        try:
+            conn = self._checkout_healthy()
+        except Exception:
+            self._slots.release()
+            with self._lock:
+                self._stats["failures"] += 1
+            raise
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        return conn
+
+    def putconn(self, conn) -> None:
+        """Return a connection; broken ones are closed, errored ones rolled back and re-checked."""
+        close = bool(conn.closed)
+        suspect = False
+        if not close:
+            try:
+                status = conn.info.transaction_status
+                if status == TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status == TRANSACTION_STATUS_INERROR:
+                    suspect = True
+            except Exception:
+                close = True
+        try:
+            self._pool.putconn(conn, close=close)
+        finally:
+            with self._lock:
+                if close:
+                    self._returned_at.pop(id(conn), None)
+                    self._suspect.discard(id(conn))
+                else:
+                    self._returned_at[id(conn)] = time.monotonic()
+                    if suspect:
+                        self._suspect.add(id(conn))
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size, in-use count, checkout waits and failures so far."""
+        with self._lock:
+            stats = dict(self._stats)
+        checkouts = stats["checkouts"]
+        stats["max_connections"] = self.maxconn
+        stats["avg_wait_ms"] = round(1000 * stats.pop("wait_seconds_total") / checkouts, 2) if checkouts else 0.0
+        stats["max_wait_ms"] = round(1000 * stats.pop("wait_seconds_max"), 2)
+        return stats
+
+    def closeall(self) -> None:
+        self._pool.closeall()
+
 
 class PostgresClient:
     """Client for interacting with PostgreSQL database."""
@@ -46,8 +201,18 @@ class PostgresClient:
 
         self.results_table = "clip_results"
         self.queue_table = "processing_queue"
+        # NOTIFY channel announcing newly pending requests to idle workers
+        self.queue_channel = f"{self.queue_table}_pending"
         self._initialized = False
         self._connection_pool = None
+        self._queue_listener = None
+        self._queue_wakeup = threading.Condition()
+        self._pending_wakeups = 0
+        # Queue schema capabilities, resolved once by initialize()
+        self._queue_has_match_id = True
+        self._queue_has_only_draft = True
+        self._queue_dedupe_indexed = False
+        self._average_processing_times = {}  # request_type -> (expires_at monotonic, seconds)
 
         logger.info(f"Initialized PostgreSQL client with URL: {self.database_url}")
 
@@ -55,27 +220,15 @@ class PostgresClient:
         """Get a connection from the pool."""
         if not self._connection_pool:
             try:
-                self._connection_pool = ThreadedConnectionPool(
-                    1, 10, self.database_url
+                self._connection_pool = MonitoredConnectionPool(
+                    self.database_url, DB_POOL_MAX_CONNECTIONS
                 )
             except Exception as e:
                 logger.error(f"Error creating connection pool: {str(e)}")
                 return None
 
         try:
-            conn = self._connection_pool.getconn()
-            if conn:
-                # Validate the connection is still alive
-                try:
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT 1")
-                    cursor.close()
-                except Exception as e:
-                    logger.warning(f"Connection validation failed, getting new connection: {str(e)}")
-                    # Return the bad connection and try to get a new one
-                    self._connection_pool.putconn(conn, close=True)
-                    conn = self._connection_pool.getconn()
-            return conn
+            return self._connection_pool.getconn()
         except Exception as e:
             logger.error(f"Error getting connection from pool: {str(e)}")
             return None
@@ -85,6 +238,10 @@ class PostgresClient:
         if self._connection_pool and conn:
             self._connection_pool.putconn(conn)
 
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool telemetry (empty until the pool is created)."""
+        return self._connection_pool.stats() if self._connection_pool else {}
+
     def _test_connection(self) -> bool:
         """Test the connection to PostgreSQL."""
         conn = None
@@ -193,6 +350,19 @@ class PostgresClient:
             except Exception:
                 pass
 
+            # Resolve optional queue columns once, rather than on every enqueue
+            cursor.execute(
+                """
+                SELECT column_name FROM information_schema.columns
+                WHERE table_name = %s AND column_name IN ('match_id', 'only_draft')
+                """,
+                (self.queue_table,)
+            )
+            queue_columns = {row[0] for row in cursor.fetchall()}
+            self._queue_has_match_id = 'match_id' in queue_columns
+            self._queue_has_only_draft = 'only_draft' in queue_columns
+            self._queue_dedupe_indexed = self._create_queue_dedupe_indexes(cursor)
+
             # Create an index on clip_id for faster lookups
             create_clip_index_sql = f"""
             CREATE INDEX IF NOT EXISTS idx_{self.results_table}_clip_id
@@ -215,7 +385,10 @@ class PostgresClient:
                 f"CREATE INDEX IF NOT EXISTS idx_{self.queue_table}_request_id ON {self.queue_table} (request_id);",
                 f"CREATE INDEX IF NOT EXISTS idx_{self.queue_table}_status ON {self.queue_table} (status);",
                 f"CREATE INDEX IF NOT EXISTS idx_{self.queue_table}_position ON {self.queue_table} (position);",
-                f"CREATE INDEX IF NOT EXISTS idx_{self.queue_table}_not_before ON {self.queue_table} (not_before);"
+                f"CREATE INDEX IF NOT EXISTS idx_{self.queue_table}_not_before ON {self.queue_table} (not_before);",
+                # Pending rows only: keeps add_to_queue's position count and the claim
+                # ordering independent of how many finished rows the table holds
+                f"CREATE INDEX IF NOT EXISTS idx_{self.queue_table}_pending_position ON {self.queue_table} (position) WHERE status = 'pending';"
             ]
             for sql in create_queue_indices_sql:
                 cursor.execute(sql)
@@ -235,6 +408,44 @@ class PostgresClient:
             if conn:
                 self._return_connection(conn)
 
+    def _create_queue_dedupe_indexes(self, cursor) -> bool:
+        """
+        Enforce one active (pending/processing) queue row per clip, stream and draft match.
+
+        These partial unique indexes let add_to_queue dedupe with ON CONFLICT DO
+        NOTHING. Building them fails while duplicate active rows already exist; the
+        failure is contained in a savepoint and add_to_queue keeps checking for
+        duplicates itself for the life of the process (the build is retried on
+        the next start).
+
+        Returns:
+            True if the indexes exist, False otherwise
+        """
+        if not (self._queue_has_match_id and self._queue_has_only_draft):
+            return False
+        active = "status IN ('pending', 'processing')"
+        statements = [
+            f"""CREATE UNIQUE INDEX IF NOT EXISTS uq_{self.queue_table}_active_clip
+            ON {self.queue_table} (clip_id, (COALESCE(only_draft, FALSE)))
+            WHERE {active} AND clip_id IS NOT NULL""",
+            f"""CREATE UNIQUE INDEX IF NOT EXISTS uq_{self.queue_table}_active_stream
+            ON {self.queue_table} (stream_username)
+            WHERE {active} AND stream_username IS NOT NULL""",
+            f"""CREATE UNIQUE INDEX IF NOT EXISTS uq_{self.queue_table}_active_draft_match
+            ON {self.queue_table} (match_id)
+            WHERE {active} AND only_draft AND match_id IS NOT NULL""",
+        ]
+        cursor.execute("SAVEPOINT queue_dedupe_indexes")
+        try:
+            for sql in statements:
+                cursor.execute(sql)
+            cursor.execute("RELEASE SAVEPOINT queue_dedupe_indexes")
+            return True
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT queue_dedupe_indexes")
+            logger.warning(f"Could not create queue dedupe indexes, deduping with lookups instead: {str(e)}")
+            return False
+
     def get_clip_result(self, clip_id: str) -> Optional[Dict[str, Any]]:
         """
         Get cached result for a clip_id if it exists.
@@ -646,25 +857,7 @@ class PostgresClient:
                 return False
             cursor = conn.cursor()
 
-            cursor.execute(f"""
-            INSERT INTO {self.results_table} (
-                clip_id, clip_url, results, processing_time_seconds, match_id, processed_at
-            ) VALUES (
-                %s, %s, %s, %s, %s, NOW()
-            )
-            ON CONFLICT (clip_id) DO UPDATE SET
-                    clip_url = EXCLUDED.clip_url,
-                results = EXCLUDED.results,
-                processing_time_seconds = EXCLUDED.processing_time_seconds,
-                match_id = EXCLUDED.match_id,
-                processed_at = NOW()
-            """, (
-                    clip_id,
-                    clip_url,
-                json.dumps(result),
-                    processing_time_seconds,
-                    match_id,
-                ))
+            self._write_clip_result(cursor, clip_id, clip_url, result, processing_time_seconds, match_id)
 
             conn.commit()
             cursor.close()
@@ -680,6 +873,28 @@ class PostgresClient:
             if conn:
                 self._return_connection(conn)
 
+    def _write_clip_result(self, cursor, clip_id, clip_url, result, processing_time_seconds, match_id) -> None:
+        """Upsert a clip result row on cursor's transaction (no commit)."""
+        cursor.execute(f"""
+        INSERT INTO {self.results_table} (
+            clip_id, clip_url, results, processing_time_seconds, match_id, processed_at
+        ) VALUES (
+            %s, %s, %s, %s, %s, NOW()
+        )
+        ON CONFLICT (clip_id) DO UPDATE SET
+            clip_url = EXCLUDED.clip_url,
+            results = EXCLUDED.results,
+            processing_time_seconds = EXCLUDED.processing_time_seconds,
+            match_id = EXCLUDED.match_id,
+            processed_at = NOW()
+        """, (
+            clip_id,
+            clip_url,
+            json.dumps(result),
+            processing_time_seconds,
+            match_id,
+        ))
+
     def get_average_processing_time(self, request_type: str = 'clip') -> float:
         """
         Get the average processing time for clips or streams.
@@ -826,6 +1041,10 @@ class PostgresClient:
         """
         Add a request to the processing queue.
 
+        Once initialize() has built the dedupe indexes this is a single INSERT ...
+        ON CONFLICT DO NOTHING statement that also computes the queue position and
+        ETA; the existing row is only looked up when the insert hits a duplicate.
+
         Args:
             request_type: Type of request ('clip' or 'stream')
             clip_id: The Twitch clip ID (for clip requests)
@@ -844,31 +1063,6 @@ class PostgresClient:
             logger.warning("PostgreSQL not initialized, can't add to queue")
             return str(uuid.uuid4()), {}
 
-        # Check if match_id / only_draft columns exist
-        has_match_id_column = False
-        has_only_draft_column = False
-        try:
-            conn = self._get_connection()
-            if conn is not None:
-                cursor = conn.cursor()
-                cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'processing_queue' AND column_name = 'match_id'
-                """)
-                has_match_id_column = cursor.fetchone() is not None
-                cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'processing_queue' AND column_name = 'only_draft'
-                """)
-                has_only_draft_column = cursor.fetchone() is not None
-                cursor.close()
-                self._return_connection(conn)
-            else:
-                logger.warning("Failed to get connection for checking queue columns")
-        except Exception as e:
-            logger.warning(f"Error checking for match_id column: {e}")
-            # Continue anyway, we'll handle it in the query
-
         # Validate request type. 'clip_in_game' is a clip whose frame is the live
         # in-game HUD bar (vs the pre-game screens) — treated as a clip everywhere
         # storage/validation branches on request type.
@@ -886,6 +1080,8 @@ class PostgresClient:
 
         # Generate a unique request ID
         request_id = str(uuid.uuid4())
+        # Cached, so the enqueue itself doesn't pay for a full-table AVG
+        avg_time = self._estimated_processing_time(request_type)
 
         conn = None
         try:
@@ -895,122 +1091,57 @@ class PostgresClient:
                 return str(uuid.uuid4()), {}
             cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-            # Check if there's already a pending or processing request for this clip/stream
-            if request_type in ('clip', 'clip_in_game') and clip_id:
-                # Consider only_draft flag when deduping queued clip requests
-                if has_only_draft_column:
-                    query = f"""
-                    SELECT * FROM {self.queue_table}
-                    WHERE clip_id = %s AND status IN ('pending', 'processing') AND COALESCE(only_draft, FALSE) = %s
-                    LIMIT 1
-                    """
-                    cursor.execute(query, (clip_id, only_draft))
-                else:
-                    query = f"""
-                    SELECT * FROM {self.queue_table}
-                    WHERE clip_id = %s AND status IN ('pending', 'processing')
-                    LIMIT 1
-                    """
-                    cursor.execute(query, (clip_id,))
-                existing = cursor.fetchone()
-                if existing:
-                    # Return the existing request info
-                    cursor.close()
-                    logger.info(f"Returning existing queue entry for clip ID: {clip_id}")
-                    # Let the finally block return the connection
-                    return existing['request_id'], {**dict(existing), 'deduplicated': True}
-
-                # If this is a draft-only request and we already have a draft queued/processing for the same match, reuse it
-                if has_match_id_column and has_only_draft_column and match_id and only_draft:
-                    query = f"""
-                    SELECT * FROM {self.queue_table}
-                    WHERE match_id = %s AND status IN ('pending', 'processing') AND COALESCE(only_draft, FALSE) = TRUE
-                    ORDER BY created_at DESC
-                    LIMIT 1
-                    """
-                    cursor.execute(query, (str(match_id),))
-                    existing_match_draft = cursor.fetchone()
-                    if existing_match_draft:
-                        cursor.close()
-                        logger.info(f"Found existing draft request for match {match_id} in queue ({existing_match_draft['request_id']}), returning it instead of enqueuing a duplicate")
-                        return existing_match_draft['request_id'], {**dict(existing_match_draft), 'deduplicated': True}
-            elif request_type == 'stream' and stream_username:
-                query = f"""
-                SELECT * FROM {self.queue_table}
-                WHERE stream_username = %s AND status IN ('pending', 'processing')
-                LIMIT 1
-                """
-                cursor.execute(query, (stream_username,))
-                existing = cursor.fetchone()
+            # Without the dedupe indexes, look for an active duplicate up front
+            if not self._queue_dedupe_indexed:
+                existing = self._find_active_duplicate(cursor, request_type, clip_id, stream_username, match_id, only_draft)
                 if existing:
-                    # Return the existing request info
                     cursor.close()
-                    logger.info(f"Returning existing queue entry for stream: {stream_username}")
-                    # Let the finally block return the connection
                     return existing['request_id'], {**dict(existing), 'deduplicated': True}
 
-            # Calculate position and estimated wait time
-            cursor.execute(f"SELECT COUNT(*) FROM {self.queue_table} WHERE status = 'pending'")
-            position = cursor.fetchone()['count'] + 1
-
-            # Get average processing time
-            avg_time = self.get_average_processing_time(request_type)
-            estimated_wait_seconds = position * avg_time
-
-            # Calculate estimated completion time
+            columns = [
+                'request_id', 'clip_id', 'clip_url', 'stream_username', 'num_frames',
+                'debug', 'force', 'include_image', 'request_type', 'status', 'created_at'
+            ]
             now = datetime.now()
-            estimated_completion_time = now + timedelta(seconds=estimated_wait_seconds)
-
-            # Insert the new request
-            if has_match_id_column and has_only_draft_column:
-                query = f"""
-                INSERT INTO {self.queue_table} (
-                    request_id, clip_id, clip_url, stream_username, num_frames,
-                    debug, force, include_image, request_type, status,
-                    created_at, position, estimated_completion_time, estimated_wait_seconds, match_id, only_draft
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING *
-                """
-                cursor.execute(query, (
-                    request_id, clip_id, clip_url, stream_username, num_frames,
-                    debug, force, include_image, request_type, 'pending',
-                    now, position, estimated_completion_time, estimated_wait_seconds, match_id, only_draft
-                ))
-            elif has_match_id_column and not has_only_draft_column:
-                query = f"""
-                INSERT INTO {self.queue_table} (
-                    request_id, clip_id, clip_url, stream_username, num_frames,
-                    debug, force, include_image, request_type, status,
-                    created_at, position, estimated_completion_time, estimated_wait_seconds, match_id
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING *
-                """
-                cursor.execute(query, (
-                    request_id, clip_id, clip_url, stream_username, num_frames,
-                    debug, force, include_image, request_type, 'pending',
-                    now, position, estimated_completion_time, estimated_wait_seconds, match_id
-                ))
-            else:
-                # Fallback without match_id if column doesn't exist yet
-                query = f"""
-                INSERT INTO {self.queue_table} (
-                    request_id, clip_id, clip_url, stream_username, num_frames,
-                    debug, force, include_image, request_type, status,
-                    created_at, position, estimated_completion_time, estimated_wait_seconds
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING *
-                """
-                cursor.execute(query, (
-                    request_id, clip_id, clip_url, stream_username, num_frames,
-                    debug, force, include_image, request_type, 'pending',
-                    now, position, estimated_completion_time, estimated_wait_seconds
-                ))
+            values = [
+                request_id, clip_id, clip_url, stream_username, num_frames,
+                debug, force, include_image, request_type, 'pending', now
+            ]
+            if self._queue_has_match_id:
+                columns.append('match_id')
+                values.append(match_id)
+            if self._queue_has_only_draft:
+                columns.append('only_draft')
+                values.append(only_draft)
+
+            # One statement: position and ETA are computed in the INSERT (the pending
+            # count is an index-only scan of idx_..._pending_position), and a duplicate
+            # active request makes it insert nothing.
+            query = f"""
+            INSERT INTO {self.queue_table} (
+                {', '.join(columns)}, position, estimated_wait_seconds, estimated_completion_time
+            )
+            SELECT {', '.join(['%s'] * len(values))}, p.position, ROUND(p.position * %s::float8),
+                   %s + (p.position * %s::float8) * interval '1 second'
+            FROM (SELECT COUNT(*) + 1 AS position FROM {self.queue_table} WHERE status = 'pending') AS p
+            ON CONFLICT DO NOTHING
+            RETURNING *
+            """
+            cursor.execute(query, (*values, avg_time, now, avg_time))
 
             # Get the inserted row
             result = cursor.fetchone()
+            if result is None:
+                # Lost to an active request for the same clip/stream/draft match
+                existing = self._find_active_duplicate(cursor, request_type, clip_id, stream_username, match_id, only_draft)
+                conn.commit()
+                cursor.close()
+                if existing:
+                    return existing['request_id'], {**dict(existing), 'deduplicated': True}
+                logger.warning(f"Queue insert for {request_type} request conflicted but no active duplicate was found")
+                return request_id, {}
+
+            self._notify_queue(cursor, request_id)
             conn.commit()
             cursor.close()
 
@@ -1027,6 +1158,162 @@ class PostgresClient:
             if conn:
                 self._return_connection(conn)
 
+    def _active_duplicate_guard(self, alias: str) -> str:
+        """
+        SQL condition that no other active row duplicates row `alias`.
+
+        Mirrors the dedupe indexes, so a row moved back to pending under this
+        guard cannot raise a unique violation. Empty when the indexes don't exist.
+        """
+        if not self._queue_dedupe_indexed:
+            return ""
+        return f"""
+              AND NOT EXISTS (
+                SELECT 1 FROM {self.queue_table} AS d
+                WHERE d.request_id <> {alias}.request_id
+                  AND d.status IN ('pending', 'processing')
+                  AND (
+                    ({alias}.clip_id IS NOT NULL AND d.clip_id = {alias}.clip_id
+                     AND COALESCE(d.only_draft, FALSE) = COALESCE({alias}.only_draft, FALSE))
+                    OR ({alias}.stream_username IS NOT NULL AND d.stream_username = {alias}.stream_username)
+                    OR ({alias}.only_draft AND {alias}.match_id IS NOT NULL
+                        AND d.only_draft AND d.match_id = {alias}.match_id)
+                  )
+              )"""
+
+    def _find_active_duplicate(self, cursor, request_type, clip_id, stream_username, match_id, only_draft):
+        """Return the pending/processing row an enqueue would duplicate, or None."""
+        if request_type in ('clip', 'clip_in_game') and clip_id:
+            # Consider only_draft flag when deduping queued clip requests
+            if self._queue_has_only_draft:
+                query = f"""
+                SELECT * FROM {self.queue_table}
+                WHERE clip_id = %s AND status IN ('pending', 'processing') AND COALESCE(only_draft, FALSE) = %s
+                LIMIT 1
+                """
+                cursor.execute(query, (clip_id, only_draft))
+            else:
+                query = f"""
+                SELECT * FROM {self.queue_table}
+                WHERE clip_id = %s AND status IN ('pending', 'processing')
+                LIMIT 1
+                """
+                cursor.execute(query, (clip_id,))
+            existing = cursor.fetchone()
+            if existing:
+                logger.info(f"Returning existing queue entry for clip ID: {clip_id}")
+                return existing
+
+            # A draft-only request reuses any draft queued/processing for the same match
+            if self._queue_has_match_id and self._queue_has_only_draft and match_id and only_draft:
+                query = f"""
+                SELECT * FROM {self.queue_table}
+                WHERE match_id = %s AND status IN ('pending', 'processing') AND COALESCE(only_draft, FALSE) = TRUE
+                ORDER BY created_at DESC
+                LIMIT 1
+                """
+                cursor.execute(query, (str(match_id),))
+                existing = cursor.fetchone()
+                if existing:
+                    logger.info(f"Found existing draft request for match {match_id} in queue ({existing['request_id']}), returning it instead of enqueuing a duplicate")
+                return existing
+        elif request_type == 'stream' and stream_username:
+            query = f"""
+            SELECT * FROM {self.queue_table}
+            WHERE stream_username = %s AND status IN ('pending', 'processing')
+            LIMIT 1
+            """
+            cursor.execute(query, (stream_username,))
+            existing = cursor.fetchone()
+            if existing:
+                logger.info(f"Returning existing queue entry for stream: {stream_username}")
+            return existing
+        return None
+
+    def _estimated_processing_time(self, request_type: str) -> float:
+        """get_average_processing_time, recomputed at most every AVERAGE_PROCESSING_TIME_TTL seconds."""
+        cached = self._average_processing_times.get(request_type)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        avg_time = self.get_average_processing_time(request_type)
+        self._average_processing_times[request_type] = (time.monotonic() + AVERAGE_PROCESSING_TIME_TTL, avg_time)
+        return avg_time
+
+    def _notify_queue(self, cursor, request_id: str) -> None:
+        """NOTIFY idle workers that request_id is pending (delivered when the transaction commits)."""
+        cursor.execute("SELECT pg_notify(%s, %s)", (self.queue_channel, request_id))
+
+    def wait_for_queue_activity(self, timeout: float) -> bool:
+        """
+        Block until a request is queued or re-queued, or until timeout seconds pass.
+
+        add_to_queue and requeue_for_retry NOTIFY queue_channel when they commit.
+        A single LISTEN connection per client (started on first use) turns each
+        notification into one wake-up for one waiting worker. A re-queued request
+        isn't claimable until its not_before delay passes, and notifications are
+        lost while the listener reconnects, so callers still poll on the fallback
+        timeout.
+
+        Args:
+            timeout: Longest time to wait, in seconds
+
+        Returns:
+            True if woken by a notification, False if the timeout passed
+        """
+        self._ensure_queue_listener()
+        with self._queue_wakeup:
+            if self._queue_wakeup.wait_for(lambda: self._pending_wakeups > 0, timeout):
+                self._pending_wakeups -= 1
+                return True
+            return False
+
+    def _ensure_queue_listener(self) -> None:
+        """Start the LISTEN thread if it isn't running."""
+        with self._queue_wakeup:
+            if self._queue_listener is None or not self._queue_listener.is_alive():
+                self._queue_listener = threading.Thread(
+                    target=self._listen_for_queue_activity,
+                    daemon=True,
+                    name="QueueListener"
+                )
+                self._queue_listener.start()
+
+    def _listen_for_queue_activity(self) -> None:
+        """Hold a LISTEN connection on queue_channel, reconnecting whenever it drops."""
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.database_url)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {self.queue_channel}")
+                cursor.close()
+                logger.info(f"Listening for queue notifications on {self.queue_channel}")
+                while True:
+                    self._drain_queue_notifications(conn)
+            except Exception as e:
+                logger.warning(f"Queue listener connection lost, reconnecting in {QUEUE_LISTEN_RETRY_SECONDS}s: {e}")
+            finally:
+                if conn:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            time.sleep(QUEUE_LISTEN_RETRY_SECONDS)
+
+    def _drain_queue_notifications(self, conn) -> int:
+        """Wait up to QUEUE_LISTEN_POLL_SECONDS for notifications on conn and wake a worker for each."""
+        if select.select([conn], [], [], QUEUE_LISTEN_POLL_SECONDS) == ([], [], []):
+            return 0
+        conn.poll()
+        count = len(conn.notifies)
+        conn.notifies.clear()
+        if count:
+            with self._queue_wakeup:
+                self._pending_wakeups += count
+                self._queue_wakeup.notify(count)
+        return count
+
     def update_queue_status(
         self,
         request_id: str,
@@ -1061,60 +1348,7 @@ class PostgresClient:
                 return False
             cursor = conn.cursor()
 
-            now = datetime.now()
-
-            # Update fields based on status
-            if status == 'processing':
-                query = f"""
-                UPDATE {self.queue_table}
-                SET status = %s, started_at = %s
-                WHERE request_id = %s
-                """
-                cursor.execute(query, (status, now, request_id))
-            elif status == 'failed':
-                query = f"""
-                UPDATE {self.queue_table}
-                SET status = %s, completed_at = %s, result_id = %s, failure_reason = %s
-                WHERE request_id = %s
-                """
-                cursor.execute(query, (status, now, result_id, failure_reason, request_id))
-            elif status == 'completed':
-                query = f"""
-                UPDATE {self.queue_table}
-                SET status = %s, completed_at = %s, result_id = %s
-                WHERE request_id = %s
-                """
-                cursor.execute(query, (status, now, result_id, request_id))
-            else:
-                query = f"""
-                UPDATE {self.queue_table}
-                SET status = %s
-                WHERE request_id = %s
-                """
-                cursor.execute(query, (status, request_id))
-
-            # If a request is completed or failed, update positions for all pending requests
-            if status in ('completed', 'failed'):
-                update_positions_query = f"""
-                UPDATE {self.queue_table} AS q
-                SET position = q.position - 1,
-                    estimated_wait_seconds = q.estimated_wait_seconds -
-                    (SELECT COALESCE(AVG(EXTRACT(EPOCH FROM (completed_at - started_at))), 15)
-                     FROM {self.queue_table}
-                     WHERE status = 'completed' AND request_type = t.request_type
-                     LIMIT 1),
-                    estimated_completion_time = NOW() +
-                    (interval '1 second' * (q.position - 1) *
-                    (SELECT COALESCE(AVG(EXTRACT(EPOCH FROM (completed_at - started_at))), 15)
-                     FROM {self.queue_table}
-                     WHERE status = 'completed' AND request_type = t.request_type
-                     LIMIT 1))
-                FROM {self.queue_table} AS t
-                WHERE q.request_id = t.request_id
-                AND q.status = 'pending'
-                AND q.position > 1
-                """
-                cursor.execute(update_positions_query)
+            self._write_queue_status(cursor, request_id, status, result_id, failure_reason)
 
             conn.commit()
             cursor.close()
@@ -1132,6 +1366,123 @@ class PostgresClient:
             if conn:
                 self._return_connection(conn)
 
+    def _write_queue_status(self, cursor, request_id, status, result_id=None, failure_reason=None) -> None:
+        """Apply update_queue_status's row and position updates on cursor's transaction (no commit)."""
+        now = datetime.now()
+
+        # Update fields based on status
+        if status == 'processing':
+            query = f"""
+            UPDATE {self.queue_table}
+            SET status = %s, started_at = %s
+            WHERE request_id = %s
+            """
+            cursor.execute(query, (status, now, request_id))
+        elif status == 'failed':
+            query = f"""
+            UPDATE {self.queue_table}
+            SET status = %s, completed_at = %s, result_id = %s, failure_reason = %s
+            WHERE request_id = %s
+            """
+            cursor.execute(query, (status, now, result_id, failure_reason, request_id))
+        elif status == 'completed':
+            query = f"""
+            UPDATE {self.queue_table}
+            SET status = %s, completed_at = %s, result_id = %s
+            WHERE request_id = %s
+            """
+            cursor.execute(query, (status, now, result_id, request_id))
+        else:
+            query = f"""
+            UPDATE {self.queue_table}
+            SET status = %s
+            WHERE request_id = %s
+            """
+            cursor.execute(query, (status, request_id))
+
+        # If a request is completed or failed, update positions for all pending requests
+        if status in ('completed', 'failed'):
+            update_positions_query = f"""
+            UPDATE {self.queue_table} AS q
+            SET position = q.position - 1,
+                estimated_wait_seconds = q.estimated_wait_seconds -
+                (SELECT COALESCE(AVG(EXTRACT(EPOCH FROM (completed_at - started_at))), 15)
+                 FROM {self.queue_table}
+                 WHERE status = 'completed' AND request_type = t.request_type
+                 LIMIT 1),
+                estimated_completion_time = NOW() +
+                (interval '1 second' * (q.position - 1) *
+                (SELECT COALESCE(AVG(EXTRACT(EPOCH FROM (completed_at - started_at))), 15)
+                 FROM {self.queue_table}
+                 WHERE status = 'completed' AND request_type = t.request_type
+                 LIMIT 1))
+            FROM {self.queue_table} AS t
+            WHERE q.request_id = t.request_id
+            AND q.status = 'pending'
+            AND q.position > 1
+            """
+            cursor.execute(update_positions_query)
+
+    def complete_request(
+        self,
+        request_id: str,
+        result_id: Optional[str] = None,
+        clip_url: Optional[str] = None,
+        result: Optional[Dict[str, Any]] = None,
+        processing_time_seconds: Optional[float] = None,
+        match_id: Optional[str] = None,
+    ) -> bool:
+        """
+        Save a finished request's result and mark its queue row completed in one transaction.
+
+        Readers never see a saved result whose queue row still says processing,
+        and the request costs one connection checkout and one commit instead of
+        the two that save_clip_result plus update_queue_status would take.
+
+        Args:
+            request_id: The request ID
+            result_id: ID of the result (the clip ID for clip requests)
+            clip_url: The Twitch clip URL (with result)
+            result: The hero detection result to save under result_id, or None
+                to only mark the request completed
+            processing_time_seconds: Processing time in seconds (optional)
+            match_id: The Dota 2 match ID (optional)
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not self._initialized and not self.initialize():
+            logger.warning("PostgreSQL not initialized, can't complete request")
+            return False
+
+        conn = None
+        try:
+            conn = self._get_connection()
+            if conn is None:
+                logger.error("Failed to get database connection for completing request")
+                return False
+            cursor = conn.cursor()
+
+            if result is not None and result_id:
+                self._write_clip_result(cursor, result_id, clip_url, result, processing_time_seconds, match_id)
+            self._write_queue_status(cursor, request_id, 'completed', result_id=result_id)
+
+            conn.commit()
+            cursor.close()
+
+            logger.info(f"Completed request {request_id}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error completing request: {str(e)}")
+            logger.error(traceback.format_exc())
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                self._return_connection(conn)
+
     def requeue_for_retry(
         self,
         request_id: str,
@@ -1141,8 +1492,9 @@ class PostgresClient:
         """Re-queue a transiently failed request so a future worker pass can retry it.
 
         Returns True if the row was flipped back to 'pending' (caller should NOT then
-        mark it failed); returns False if max_retries is already exceeded (caller
-        should fall through to update_queue_status(..., 'failed')).
+        mark it failed); returns False if max_retries is already exceeded, or if
+        another pending/processing row already covers the same clip, stream or
+        draft match (caller should fall through to update_queue_status(..., 'failed')).
 
         The conditional UPDATE makes the bump atomic — concurrent workers can't
         race the retry budget past the cap.
@@ -1161,17 +1513,20 @@ class PostgresClient:
             # Bump retry_count and flip back to pending only if we haven't blown
             # the budget. The WHERE clause's retry_count < max_retries check is
             # what enforces the cap atomically.
+            # The duplicate guard skips rows whose clip was re-requested meanwhile
             query = f"""
-            UPDATE {self.queue_table}
+            UPDATE {self.queue_table} AS q
             SET status = 'pending',
                 started_at = NULL,
                 retry_count = COALESCE(retry_count, 0) + 1,
                 not_before = CURRENT_TIMESTAMP + (%s * interval '1 second')
             WHERE request_id = %s
-              AND COALESCE(retry_count, 0) < %s
+              AND COALESCE(retry_count, 0) < %s{self._active_duplicate_guard('q')}
             """
             cursor.execute(query, (delay_seconds, request_id, max_retries))
             requeued = cursor.rowcount > 0
+            if requeued:
+                self._notify_queue(cursor, request_id)
             conn.commit()
             cursor.close()
             if requeued:
@@ -1179,6 +1534,12 @@ class PostgresClient:
                     f"Re-queued request {request_id} for retry in {delay_seconds}s"
                 )
             return requeued
+        except psycopg2.errors.UniqueViolation:
+            # A duplicate became active between the guard and the write
+            logger.info(f"Not re-queueing request {request_id}: an active duplicate is already queued")
+            if conn:
+                conn.rollback()
+            return False
         except Exception as e:
             logger.error(f"Error re-queueing request {request_id}: {e}")
             logger.error(traceback.format_exc())
@@ -1358,6 +1719,114 @@ class PostgresClient:
             if conn:
                 self._return_connection(conn)
 
+    def claim_next_request(self) -> Optional[Dict[str, Any]]:
+        """
+        Atomically take the next pending request and mark it processing.
+
+        Selecting and marking happen in one UPDATE ... RETURNING, and the row is
+        picked with FOR UPDATE SKIP LOCKED, so concurrent workers in any number of
+        threads, processes or containers each claim a different request without a
+        process-wide lock. Rows gated by not_before are skipped as in
+        get_next_pending_request.
+
+        Returns:
+            The claimed request (status 'processing') if one was pending, None otherwise
+        """
+        if not self._initialized and not self.initialize():
+            logger.warning("PostgreSQL not initialized, can't claim next request")
+            return None
+
+        conn = None
+        try:
+            conn = self._get_connection()
+            if conn is None:
+                logger.error("Failed to get database connection for claiming next request")
+                return None
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+            query = f"""
+            UPDATE {self.queue_table}
+            SET status = 'processing', started_at = %s
+            WHERE request_id = (
+                SELECT request_id FROM {self.queue_table}
+                WHERE status = 'pending'
+                  AND (not_before IS NULL OR not_before <= CURRENT_TIMESTAMP)
+                ORDER BY position ASC
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *
+            """
+            cursor.execute(query, (datetime.now(),))
+
+            request = cursor.fetchone()
+            conn.commit()
+            cursor.close()
+
+            if request:
+                logger.info(f"Claimed next pending request: {request['request_id']}")
+                return dict(request)
+            else:
+                logger.debug("No pending requests in queue")
+                return None
+
+        except Exception as e:
+            logger.error(f"Error claiming next pending request: {str(e)}")
+            logger.error(traceback.format_exc())
+            if conn:
+                conn.rollback()
+            return None
+        finally:
+            if conn:
+                self._return_connection(conn)
+
+    def refresh_processing_request(self, request_id: str) -> bool:
+        """
+        Restart the stuck-request clock of a request that is still processing.
+
+        Unlike update_queue_status(..., 'processing') this only touches rows still
+        marked processing, so a request the stuck-request reset already failed
+        stays failed.
+
+        Args:
+            request_id: The request ID
+
+        Returns:
+            True if the row is still processing, False otherwise
+        """
+        if not self._initialized and not self.initialize():
+            logger.warning("PostgreSQL not initialized, can't refresh request")
+            return False
+
+        conn = None
+        try:
+            conn = self._get_connection()
+            if conn is None:
+                logger.error("Failed to get database connection for refreshing request")
+                return False
+            cursor = conn.cursor()
+
+            query = f"""
+            UPDATE {self.queue_table}
+            SET started_at = %s
+            WHERE request_id = %s AND status = 'processing'
+            """
+            cursor.execute(query, (datetime.now(), request_id))
+            refreshed = cursor.rowcount > 0
+            conn.commit()
+            cursor.close()
+            return refreshed
+
+        except Exception as e:
+            logger.error(f"Error refreshing request {request_id}: {str(e)}")
+            logger.error(traceback.format_exc())
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                self._return_connection(conn)
+
     def is_queue_processing(self) -> bool:
         """
         Check if there's currently a request being processed.
@@ -30,13 +30,16 @@ import threading
 import traceback
 
 # Import stream utilities
-from stream_utils import get_stream_url, is_preparing_screen
+from stream_utils import (
+    get_stream_url, is_preparing_screen, open_stream_session, get_stream_session, close_stream_session,
+    save_keyframe
+)
 import cv2
 import numpy as np
 
 # Try to import Dota 2 detection
 try:
-    from dota_hero_detection import process_frame_for_heroes
+    from dota_hero_detection import process_frame_for_heroes, hero_slot_fingerprints, verify_known_roster, load_image
     DOTA_DETECTION_AVAILABLE = True
 except ImportError:
     DOTA_DETECTION_AVAILABLE = False
@@ -76,6 +79,8 @@ STREAM_TIMEOUT = 10  # Seconds to wait before considering a stream capture faile
 HEALTH_CHECK_INTERVAL = 60  # Seconds between health checks
 CLEANUP_INTERVAL = 300  # Seconds between cleanup operations (5 minutes)
 MAX_FRAME_AGE = 3600  # Maximum age of frames to keep (1 hour)
+SESSION_MAX_PRIORITY = 2  # Streams at this priority or higher keep a live decoder session
+KEYFRAME_MIN_PRIORITY = 6  # Streams at this priority or lower use the stateless keyframe grabber
 
 class StreamStatus:
     """Track the status of a stream."""
@@ -128,6 +133,7 @@ class StreamManager:
             "successful_captures": 0,
             "failed_captures": 0,
             "dota_matches_found": 0,
+            "roster_fast_path_hits": 0,
             "start_time": time.time(),
         }
 
@@ -145,12 +151,16 @@ class StreamManager:
             priority: Stream priority (1-10, lower is higher priority)
         """
         with self._lock:
-            if username in self.streams:
+            updated = username in self.streams
+            if updated:
                 # Update existing stream
                 self.streams[username]["priority"] = priority
                 logger.debug(f"Updated stream {username} with priority {priority}")
-                return
+        if updated:
+            self._release_session_if_demoted(username)
+            return
 
+        with self._lock:
             # Add new stream
             self.streams[username] = {
                 "username": username,
@@ -165,6 +175,9 @@ class StreamManager:
                 "dota_matches": 0,
                 "last_error": None,
                 "frame_paths": [],
+                # Last confirmed roster and its slot fingerprints (roster fast path)
+                "roster": None,
+                "roster_fingerprints": None,
             }
 
             # Schedule for immediate capture if the manager is running
@@ -183,11 +196,14 @@ class StreamManager:
             username: Twitch username
         """
         with self._lock:
-            if username in self.streams:
+            removed = username in self.streams
+            if removed:
                 del self.streams[username]
                 if username in self.active_streams:
                     self.active_streams.remove(username)
-                logger.info(f"Removed stream {username}")
+        if removed:
+            close_stream_session(username)
+            logger.info(f"Removed stream {username}")
 
     def update_priority(self, username: str, priority: int) -> None:
         """
@@ -198,14 +214,41 @@ class StreamManager:
             priority: New priority (1-10, lower is higher priority)
         """
         with self._lock:
-            if username in self.streams:
+            updated = username in self.streams
+            if updated:
                 self.streams[username]["priority"] = priority
                 logger.debug(f"Updated {username} priority to {priority}")
+        if updated:
+            self._release_session_if_demoted(username)
+
+    def _uses_session(self, username: str) -> bool:
+        """Whether a stream is high-priority enough to keep a live decoder session."""
+        with self._lock:
+            info = self.streams.get(username)
+            return info is not None and info["priority"] <= SESSION_MAX_PRIORITY
+
+    def _uses_keyframe_capture(self, username: str) -> bool:
+        """Whether a stream is low-priority enough to be swept with the keyframe grabber."""
+        with self._lock:
+            info = self.streams.get(username)
+            return info is not None and info["priority"] >= KEYFRAME_MIN_PRIORITY
+
+    def _release_session_if_demoted(self, username: str) -> None:
+        # Closing waits for the session's reader thread, so callers must not hold
+        # self._lock here or every stream stalls behind it.
+        if not self._uses_session(username):
+            close_stream_session(username)
 
     async def _capture_frame(self, username: str) -> Optional[str]:
         """
         Capture a single frame from a stream.
 
+        High-priority streams (SESSION_MAX_PRIORITY) are served from a long-lived
+        decoder session that always holds the latest frame; the session is opened on
+        the first capture, which (like every other stream) connects directly.
+        Low-priority streams (KEYFRAME_MIN_PRIORITY) skip the decoder entirely and
+        decode the first frame of the newest HLS segment (save_keyframe).
+
         Args:
             username: Twitch username
 
@@ -213,6 +256,22 @@ class StreamManager:
             Path to the saved frame or None if capture failed
         """
         try:
+            if self._uses_session(username):
+                session = get_stream_session(username)
+                if session is None:
+                    # Replacing a session of another quality waits for its reader thread.
+                    await asyncio.get_event_loop().run_in_executor(
+                        self.executor, open_stream_session, username, self.quality
+                    )
+                else:
+                    frame_path = FRAMES_DIR / f"{username}_{int(time.time())}.jpg"
+                    result = await asyncio.get_event_loop().run_in_executor(
+                        self.executor, session.capture_frame, frame_path
+                    )
+                    if result:
+                        return result
+                    logger.debug(f"No fresh frame in the decoder session for {username}, capturing directly")
+
             # Get the stream URL
             stream_url = await asyncio.get_event_loop().run_in_executor(
                 self.executor, get_stream_url, username, self.quality
@@ -226,6 +285,11 @@ class StreamManager:
             timestamp = int(time.time())
             frame_path = FRAMES_DIR / f"{username}_{timestamp}.jpg"
 
+            if self._uses_keyframe_capture(username):
+                return await asyncio.get_event_loop().run_in_executor(
+                    self.executor, save_keyframe, stream_url, frame_path
+                )
+
             # Capture frame using OpenCV in a separate thread
             def _capture():
                 try:
@@ -286,6 +350,11 @@ class StreamManager:
         """
         Process a captured frame for Dota 2 detection.
 
+        A roster doesn't change during a match, so once a stream has a confirmed roster
+        each capture is first checked against it (verify_known_roster: slot fingerprints
+        plus matching against the known heroes only). The full process_frame_for_heroes
+        runs only when that check fails, and its result becomes the new roster.
+
         Args:
             username: Twitch username
             frame_path: Path to the captured frame
@@ -301,7 +370,37 @@ class StreamManager:
             # Process the frame for Dota 2 heroes
             def _process():
                 try:
-                    result = process_frame_for_heroes(frame_path, debug=False)
+                    with self._lock:
+                        info = self.streams.get(username, {})
+                        roster = info.get("roster")
+                        fingerprints = info.get("roster_fingerprints")
+
+                    # Decode once; the fast path, full detection and fingerprinting
+                    # all work on the same in-memory frame.
+                    frame = load_image(frame_path)
+                    if frame is None:
+                        logger.warning(f"Could not load frame for {username}: {frame_path}")
+                        return False
+
+                    result = None
+                    if roster and fingerprints:
+                        heroes = verify_known_roster(frame, roster, fingerprints)
+                        if heroes:
+                            result = {"heroes": heroes}
+                            with self._lock:
+                                self.stats["roster_fast_path_hits"] += 1
+
+                    if result is None:
+                        result = process_frame_for_heroes(frame, debug=False)
+                        # process_frame_for_heroes returns the heroes list itself
+                        if isinstance(result, list):
+                            result = {"heroes": result}
+                        heroes = result.get("heroes") if result else None
+                        fingerprints = hero_slot_fingerprints(frame) if heroes else None
+                        with self._lock:
+                            if username in self.streams:
+                                self.streams[username]["roster"] = heroes if fingerprints else None
+                                self.streams[username]["roster_fingerprints"] = fingerprints
 
                     # Save results
                     if result and result.get("heroes"):
@@ -596,6 +695,12 @@ class StreamManager:
             except Exception:
                 pass
 
+            # Close decoder sessions
+            with self._lock:
+                usernames = list(self.streams)
+            for username in usernames:
+                close_stream_session(username)
+
             # Shutdown executor
             self.executor.shutdown(wait=False)
 
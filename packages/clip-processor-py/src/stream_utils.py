@@ -1,14 +1,21 @@
 import os
 import logging
 import tempfile
+import threading
 import time
 from pathlib import Path
+from urllib.parse import urljoin
 import streamlink
 import cv2
 import numpy as np
 from streamlink.stream import Stream
 import re
 
+try:
+    import http_client
+except ImportError:
+    from . import http_client
+
 # Try to import pytesseract for OCR-based detection
 try:
     import pytesseract
@@ -36,6 +43,22 @@ logger = logging.getLogger(__name__)
 TEMP_DIR = Path("temp")
 TEMP_DIR.mkdir(exist_ok=True)
 
+# Decoder sessions: how often (seconds) the reader thread converts the newest grabbed
+# frame, how old that frame may be before a capture falls back to a fresh connection,
+# and how long to wait before reconnecting a dropped stream.
+STREAM_SESSION_FRAME_INTERVAL = float(os.environ.get("STREAM_SESSION_FRAME_INTERVAL", 1.0))
+STREAM_SESSION_MAX_FRAME_AGE = float(os.environ.get("STREAM_SESSION_MAX_FRAME_AGE", 10.0))
+STREAM_SESSION_RECONNECT_DELAY = float(os.environ.get("STREAM_SESSION_RECONNECT_DELAY", 5.0))
+# Consecutive failed reads before a session drops the connection and reconnects
+STREAM_SESSION_MAX_READ_FAILURES = 25
+# A session nobody has read a frame from for this many seconds drops its connection
+# and stops decoding until the next read; close() waits this long for its thread.
+STREAM_SESSION_IDLE_TIMEOUT = float(os.environ.get("STREAM_SESSION_IDLE_TIMEOUT", 60.0))
+STREAM_SESSION_CLOSE_TIMEOUT = float(os.environ.get("STREAM_SESSION_CLOSE_TIMEOUT", 5.0))
+
+# Timeout (seconds) for the keyframe grabber's playlist and segment requests
+HLS_REQUEST_TIMEOUT = float(os.environ.get("HLS_REQUEST_TIMEOUT", 10))
+
 def get_stream_url(username, quality='best'):
     """
     Get the stream URL for a given Twitch username.
@@ -86,7 +109,7 @@ def get_stream_url(username, quality='best'):
         logger.error(f"Error getting stream URL: {e}")
         return None
 
-def capture_frame_from_stream(username, quality='1080p60', max_retries=5, retry_delay=3, frames_to_skip=5):
+def capture_frame_from_stream(username, quality='1080p60', max_retries=5, retry_delay=3, frames_to_skip=5, return_frame=False):
     """
     Capture a single frame from a Twitch stream.
 
@@ -96,15 +119,31 @@ def capture_frame_from_stream(username, quality='1080p60', max_retries=5, retry_
         max_retries (int): Maximum number of retries to get past ads or "preparing" screens
         retry_delay (int): Seconds to wait between retries
         frames_to_skip (int): Number of frames to skip before capturing, helps avoid ads
+        return_frame (bool): Return the decoded BGR frame instead of writing a JPEG
 
     Returns:
-        str: Path to the saved frame or None if capture failed
+        str: Path to the saved frame (or the frame itself with return_frame) or None if capture failed
+
+    If a decoder session is open for the stream (open_stream_session), its latest
+    frame is returned straight away; the connect-and-skip path below is the fallback.
     """
     try:
         # Create a unique filename for this user's frame
         frames_dir = TEMP_DIR / "frames"
         frames_dir.mkdir(exist_ok=True)
 
+        session = get_stream_session(username)
+        if session is not None:
+            if return_frame:
+                frame = session.fresh_frame()
+                if frame is not None:
+                    return frame
+            else:
+                frame_path = session.capture_frame(frames_dir / f"{username}_{int(time.time())}.jpg")
+                if frame_path:
+                    return frame_path
+            logger.info(f"No fresh frame in the decoder session for {username}, opening the stream directly")
+
         # Try multiple times to get a frame that isn't an ad or "preparing" screen
         for retry in range(max_retries):
             frame_path = frames_dir / f"{username}_{int(time.time())}.jpg"
@@ -145,9 +184,12 @@ def capture_frame_from_stream(username, quality='1080p60', max_retries=5, retry_
             for attempt in range(max_attempts):
                 success, frame = capture.read()
                 if success:
-                    # Save the frame
-                    cv2.imwrite(str(frame_path), frame)
-                    logger.info(f"Frame captured and saved to {frame_path}")
+                    if return_frame:
+                        logger.info(f"Frame captured from stream for {username}")
+                    else:
+                        # Save the frame
+                        cv2.imwrite(str(frame_path), frame)
+                        logger.info(f"Frame captured and saved to {frame_path}")
 
                     # Check if the frame is likely an ad or "preparing" screen
                     if is_preparing_screen(frame):
@@ -158,7 +200,7 @@ def capture_frame_from_stream(username, quality='1080p60', max_retries=5, retry_
                     else:
                         # Release the capture and return the path
                         capture.release()
-                        return str(frame_path)
+                        return frame if return_frame else str(frame_path)
 
                 logger.warning(f"Failed to read frame, attempt {attempt+1}/{max_attempts}")
                 time.sleep(0.2)  # Wait 1/5 second to maintain 5fps
@@ -176,6 +218,354 @@ def capture_frame_from_stream(username, quality='1080p60', max_retries=5, retry_
         logger.error(f"Error capturing frame: {e}")
         return None
 
+def _parse_hls_playlist(text, playlist_url):
+    """
+    Split an HLS playlist into variant playlist URLs and (segment URL, title) pairs.
+
+    URIs are resolved against playlist_url. A master playlist only has variants, a
+    media playlist only has segments; the title is the #EXTINF text after the comma
+    (Twitch marks live segments "live" and stitched-in ads with something else).
+    """
+    variants, segments = [], []
+    pending_variant = False
+    pending_title = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-STREAM-INF"):
+            pending_variant = True
+        elif line.startswith("#EXTINF:"):
+            pending_title = line.partition(",")[2].strip()
+        elif not line.startswith("#"):
+            uri = urljoin(playlist_url, line)
+            if pending_variant:
+                variants.append(uri)
+            elif pending_title is not None:
+                segments.append((uri, pending_title))
+            pending_variant, pending_title = False, None
+    return variants, segments
+
+
+def _decode_first_frame(segment):
+    """Decode the first frame of a media segment (its leading IDR frame), or None."""
+    with tempfile.NamedTemporaryFile(suffix=".ts", delete=False) as f:
+        f.write(segment)
+        segment_path = f.name
+    try:
+        capture = cv2.VideoCapture(segment_path)
+        try:
+            success, frame = capture.read()
+        finally:
+            capture.release()
+        return frame if success else None
+    finally:
+        os.unlink(segment_path)
+
+
+def grab_keyframe(playlist_url):
+    """
+    Decode one frame from the newest segment of a live HLS playlist, statelessly.
+
+    Instead of opening a decoder on the stream and reading through frames_to_skip
+    frames, this fetches the playlist, downloads only the most recent live media
+    segment (skipping stitched-in ad segments when the titles mark them) and
+    decodes its first frame. HLS segments start on an IDR frame, so that one frame
+    decodes on its own. A master playlist is followed to its first variant.
+
+    Args:
+        playlist_url (str): Media (or master) playlist URL, e.g. from get_stream_url
+
+    Returns:
+        numpy.ndarray: The decoded BGR frame, or None on failure
+    """
+    try:
+        for _hop in range(2):
+            response = http_client.get(playlist_url, timeout=HLS_REQUEST_TIMEOUT)
+            response.raise_for_status()
+            variants, segments = _parse_hls_playlist(response.text, playlist_url)
+            if segments or not variants:
+                break
+            playlist_url = variants[0]
+
+        live = [uri for uri, title in segments if title in ("", "live")] or [uri for uri, _title in segments]
+        if not live:
+            logger.warning(f"No media segments in playlist: {playlist_url}")
+            return None
+
+        response = http_client.get(live[-1], timeout=HLS_REQUEST_TIMEOUT)
+        response.raise_for_status()
+        frame = _decode_first_frame(response.content)
+        if frame is None:
+            logger.warning(f"Could not decode a frame from segment: {live[-1]}")
+        return frame
+    except Exception as e:
+        logger.error(f"Error grabbing keyframe from {playlist_url}: {e}")
+        return None
+
+
+def save_keyframe(playlist_url, frame_path):
+    """
+    grab_keyframe and save the frame to frame_path.
+
+    Returns:
+        str: The saved path, or None if no frame was decoded or it is a
+        "preparing your stream"/ad screen
+    """
+    frame = grab_keyframe(playlist_url)
+    if frame is None:
+        return None
+    if is_preparing_screen(frame):
+        logger.warning("Detected 'preparing your stream' screen in keyframe")
+        return None
+    cv2.imwrite(str(frame_path), frame)
+    return str(frame_path)
+
+
+def capture_keyframe_from_stream(username, quality='1080p60', max_retries=3, retry_delay=3, frames_to_skip=None):
+    """
+    Capture a single frame from a Twitch stream with the stateless keyframe grabber.
+
+    A drop-in alternative to capture_frame_from_stream for sweeping many streams
+    cheaply: no decoder session and no skipped frames, just the newest segment's
+    first frame (see grab_keyframe).
+
+    Args:
+        username (str): Twitch username
+        quality (str): Stream quality (default: '1080p60')
+        max_retries (int): Maximum attempts to get past ads or "preparing" screens
+        retry_delay (int): Seconds to wait between retries
+        frames_to_skip: Ignored; accepted so callers can swap the two capture functions
+
+    Returns:
+        str: Path to the saved frame or None if capture failed
+    """
+    frames_dir = TEMP_DIR / "frames"
+    frames_dir.mkdir(exist_ok=True)
+
+    for retry in range(max_retries):
+        stream_url = get_stream_url(username, quality)
+        if not stream_url:
+            logger.error(f"Could not get stream URL for {username}")
+        else:
+            frame_path = save_keyframe(stream_url, frames_dir / f"{username}_{int(time.time())}.jpg")
+            if frame_path:
+                logger.info(f"Keyframe captured and saved to {frame_path}")
+                return frame_path
+        if retry < max_retries - 1:
+            time.sleep(retry_delay)
+
+    logger.error(f"Failed to capture a usable keyframe after {max_retries} retries")
+    return None
+
+
+class StreamDecoderSession:
+    """
+    Long-lived decoder for one stream that always holds its latest decoded frame.
+
+    capture_frame_from_stream pays for URL resolution, connection setup and
+    frames_to_skip deliberately slow reads on every call. A session does that once:
+    a background thread keeps a single cv2.VideoCapture open and grabs every frame as
+    it arrives (so the decoder never falls behind live), converting the newest one
+    every STREAM_SESSION_FRAME_INTERVAL seconds. A capture then just copies that
+    frame. Dropped connections are re-resolved and reopened after
+    STREAM_SESSION_RECONNECT_DELAY.
+
+    Decoding only runs while frames are being read: after STREAM_SESSION_IDLE_TIMEOUT
+    seconds without a read the connection is released and the thread sleeps until
+    the next one (which falls back to a direct capture while the session reconnects).
+    """
+
+    def __init__(self, username, quality='1080p60'):
+        self.username = username
+        self.quality = quality
+        self._frame = None
+        self._frame_time = 0.0
+        self._frame_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wanted = threading.Event()
+        self._last_read = time.time()
+        self._thread = None
+
+    def start(self):
+        """Start the reader thread (no-op if it is already running)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._last_read = time.time()
+            self._thread = threading.Thread(target=self._run, name=f"stream-session-{self.username}", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self, timeout=None):
+        """
+        Stop the reader thread and wait up to timeout seconds
+        (STREAM_SESSION_CLOSE_TIMEOUT by default) for it to release the capture.
+
+        Returns:
+            bool: True if the thread has exited
+        """
+        timeout = STREAM_SESSION_CLOSE_TIMEOUT if timeout is None else timeout
+        self._stop.set()
+        self._wanted.set()
+        thread = self._thread
+        if thread is None or thread is threading.current_thread():
+            return True
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"Decoder session for {self.username} did not stop within {timeout}s")
+            return False
+        return True
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def latest_frame(self, max_age=None):
+        """
+        Return (frame, captured_at) for the newest decoded frame.
+
+        Returns None when there is no frame yet or it is older than max_age seconds
+        (STREAM_SESSION_MAX_FRAME_AGE by default).
+        """
+        max_age = STREAM_SESSION_MAX_FRAME_AGE if max_age is None else max_age
+        # A read is what keeps the reader decoding (and wakes an idle one).
+        self._last_read = time.time()
+        self._wanted.set()
+        with self._frame_lock:
+            frame, captured_at = self._frame, self._frame_time
+        if frame is None or time.time() - captured_at > max_age:
+            return None
+        return frame, captured_at
+
+    def fresh_frame(self, max_age=None):
+        """
+        Return the latest frame if it is fresh and not a "preparing your stream"/ad
+        screen, otherwise None.
+        """
+        latest = self.latest_frame(max_age)
+        if latest is None:
+            return None
+        frame, _captured_at = latest
+        if is_preparing_screen(frame):
+            logger.warning(f"Detected 'preparing your stream' screen for {self.username}")
+            return None
+        return frame
+
+    def capture_frame(self, frame_path, max_age=None):
+        """
+        Save the latest frame to frame_path.
+
+        Returns:
+            str: The saved path, or None if there is no fresh frame or it is a
+            "preparing your stream"/ad screen
+        """
+        frame = self.fresh_frame(max_age)
+        if frame is None:
+            return None
+        cv2.imwrite(str(frame_path), frame)
+        logger.debug(f"Frame for {self.username} served from decoder session: {frame_path}")
+        return str(frame_path)
+
+    def _idle(self):
+        return time.time() - self._last_read > STREAM_SESSION_IDLE_TIMEOUT
+
+    def _wait_while_idle(self):
+        """Block until a frame is read or the session is closed."""
+        self._wanted.clear()
+        # Re-checked after clearing, so a read in between isn't missed.
+        if self._idle():
+            logger.info(f"Decoder session for {self.username} is idle, pausing until the next read")
+            self._wanted.wait()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._idle():
+                self._wait_while_idle()
+                continue
+            capture = None
+            try:
+                stream_url = get_stream_url(self.username, self.quality)
+                if not stream_url:
+                    logger.warning(f"Decoder session could not get stream URL for {self.username}")
+                    continue
+
+                capture = cv2.VideoCapture(stream_url)
+                if not capture.isOpened():
+                    logger.error(f"Decoder session failed to open stream for {self.username}")
+                    continue
+
+                logger.info(f"Decoder session connected for {self.username}")
+                self._read_frames(capture)
+            except Exception as e:
+                logger.error(f"Error in decoder session for {self.username}: {e}")
+            finally:
+                if capture is not None:
+                    capture.release()
+                # Back off before reconnecting (returns immediately once closed)
+                self._stop.wait(STREAM_SESSION_RECONNECT_DELAY)
+
+    def _read_frames(self, capture):
+        """Grab frames until the session is closed or the stream stops producing them."""
+        failures = 0
+        last_retrieve = 0.0
+        while not self._stop.is_set():
+            if self._idle():
+                logger.info(f"No frames read from the decoder session for {self.username}, disconnecting")
+                return
+            if not capture.grab():
+                failures += 1
+                if failures >= STREAM_SESSION_MAX_READ_FAILURES:
+                    logger.warning(f"Decoder session for {self.username} stopped receiving frames, reconnecting")
+                    return
+                self._stop.wait(0.2)
+                continue
+            failures = 0
+
+            now = time.time()
+            if now - last_retrieve < STREAM_SESSION_FRAME_INTERVAL:
+                continue
+            success, frame = capture.retrieve()
+            if success and frame is not None:
+                last_retrieve = now
+                with self._frame_lock:
+                    self._frame, self._frame_time = frame, now
+
+
+# Open decoder sessions, by username
+_STREAM_SESSIONS = {}
+_STREAM_SESSIONS_LOCK = threading.Lock()
+
+
+def open_stream_session(username, quality='1080p60'):
+    """Open (or return the already open) decoder session for a stream."""
+    with _STREAM_SESSIONS_LOCK:
+        session = _STREAM_SESSIONS.get(username)
+        replaced = None
+        if session is None or session.quality != quality:
+            replaced = session
+            session = StreamDecoderSession(username, quality)
+            _STREAM_SESSIONS[username] = session
+        session.start()
+    if replaced is not None:
+        replaced.close()
+    return session
+
+
+def get_stream_session(username):
+    """Return the open decoder session for a stream, or None."""
+    with _STREAM_SESSIONS_LOCK:
+        return _STREAM_SESSIONS.get(username)
+
+
+def close_stream_session(username):
+    """Close a stream's decoder session if one is open."""
+    with _STREAM_SESSIONS_LOCK:
+        session = _STREAM_SESSIONS.pop(username, None)
+    if session is not None:
+        session.close()
+        logger.info(f"Closed decoder session for {username}")
+
+
 def is_preparing_screen(frame):
     """
     Check if the frame contains a "preparing your stream" message or is an ad.
@@ -273,7 +663,7 @@ def is_preparing_screen(frame):
         logger.error(f"Error checking frame type: {e}")
         return False
 
-def capture_multiple_frames(username, quality='1080p60', num_frames=3, interval=2, max_retries=5, frames_to_skip=5):
+def capture_multiple_frames(username, quality='1080p60', num_frames=3, interval=2, max_retries=5, frames_to_skip=5, return_frames=False):
     """
     Capture multiple frames from a Twitch stream.
 
@@ -284,9 +674,11 @@ def capture_multiple_frames(username, quality='1080p60', num_frames=3, interval=
         interval (int): Interval between frames in seconds
         max_retries (int): Maximum retries per frame to get past ads/preparing screens
         frames_to_skip (int): Number of frames to skip before capturing, helps avoid ads
+        return_frames (bool): Return the decoded BGR frames instead of writing JPEGs
 
     Returns:
-        list: Paths to the saved frames or empty list if capture failed
+        list: Paths to the saved frames (or the frames themselves with return_frames)
+        or empty list if capture failed
     """
     try:
         # Create a unique session ID for this capture
@@ -337,7 +729,8 @@ def capture_multiple_frames(username, quality='1080p60', num_frames=3, interval=
                     if success:
                         # Save the frame
                         frame_path = frames_dir / f"{username}_{session_id}_frame_{i}.jpg"
-                        cv2.imwrite(str(frame_path), frame)
+                        if not return_frames:
+                            cv2.imwrite(str(frame_path), frame)
 
                         # Check if it's a "preparing" screen
                         if is_preparing_screen(frame):
@@ -347,8 +740,12 @@ def capture_multiple_frames(username, quality='1080p60', num_frames=3, interval=
                             break
                         else:
                             # Valid frame captured
-                            logger.info(f"Frame {i+1}/{num_frames} captured and saved to {frame_path}")
-                            frame_paths.append(str(frame_path))
+                            if return_frames:
+                                logger.info(f"Frame {i+1}/{num_frames} captured")
+                                frame_paths.append(frame)
+                            else:
+                                logger.info(f"Frame {i+1}/{num_frames} captured and saved to {frame_path}")
+                                frame_paths.append(str(frame_path))
                             retries_left = max_retries  # Reset retries for next frame
                             break
 
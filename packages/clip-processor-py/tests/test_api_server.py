@@ -196,7 +196,7 @@ def test_get_image_url_returns_none_on_copy_failure(tmp_path):
 # --------------------------------------------------------------------------- #
 def _run_worker_once(db, first_request):
     """Drive process_queue_worker through exactly one request then stop."""
-    db.get_next_pending_request.side_effect = [first_request, _StopLoop()]
+    db.claim_next_request.side_effect = [first_request, _StopLoop()]
     with patch.object(api_server, "db_client", db), \
          patch.object(api_server.time, "sleep"):
         # _StopLoop propagates to the worker's broad except and ends the loop.
@@ -224,14 +224,212 @@ def test_worker_clip_branch_saves_result_without_frame_image_url():
     assert pcr.call_args.kwargs["from_worker"] is True
     assert pcr.call_args.kwargs["add_to_queue"] is False
 
-    # frame_image_url stripped before persisting
-    db.save_clip_result.assert_called_once()
-    saved_result = db.save_clip_result.call_args[0][2]
-    assert "frame_image_url" not in saved_result
+    # frame_image_url stripped before persisting; result and status written together
+    db.save_clip_result.assert_not_called()
+    db.complete_request.assert_called_once()
+    completed = db.complete_request.call_args
+    assert completed.args[0] == "req1"
+    assert completed.kwargs["result_id"] == "abc"
+    assert "frame_image_url" not in completed.kwargs["result"]
 
-    # status transitions: processing -> completed
-    statuses = [c.args[1] for c in db.update_queue_status.call_args_list]
-    assert statuses == ["processing", "completed"]
+    # claim_next_request marks it processing; complete_request records the outcome
+    db.update_queue_status.assert_not_called()
+
+
+def test_worker_clip_result_is_written_once_in_one_commit(db_client, mock_cursor):
+    clip_request = {
+        "request_id": "req1",
+        "request_type": "clip",
+        "clip_url": "https://clips.twitch.tv/abc",
+        "clip_id": "abc",
+        "debug": False,
+        "force": False,
+        "include_image": True,
+    }
+    detection = {"players": [{"player_name": "x"}], "heroes": []}
+    with patch.object(db_client, "claim_next_request", side_effect=[clip_request, _StopLoop()]), \
+         patch.object(db_client, "get_clip_result", return_value=None), \
+         patch.object(api_server, "db_client", db_client), \
+         patch.object(api_server, "process_clip_url", return_value=detection):
+        api_server.process_queue_worker()
+
+    statements = [c.args[0] for c in mock_cursor.execute.call_args_list]
+    assert sum("INSERT INTO" in q for q in statements) == 1
+    db_client._mock_conn.commit.assert_called_once()
+
+
+def test_worker_completes_request_when_frame_was_not_saved():
+    # _save_frame returns None when cv2.imwrite fails; the detection still stands.
+    db = MagicMock()
+    clip_request = {
+        "request_id": "req1",
+        "request_type": "clip",
+        "clip_url": "https://clips.twitch.tv/abc",
+        "clip_id": "abc",
+        "debug": False,
+        "force": False,
+        "include_image": True,
+    }
+    worker_result = {"players": [{"player_name": "x"}], "best_frame_info": {"frame_path": None}}
+    with patch.object(api_server, "process_clip_request", return_value=worker_result):
+        _run_worker_once(db, clip_request)
+
+    db.complete_request.assert_called_once()
+    assert "saved_image_path" not in db.complete_request.call_args.kwargs["result"]
+    db.update_queue_status.assert_not_called()
+
+
+def test_process_clip_request_skips_image_url_without_saved_frame():
+    db = MagicMock()
+    db.get_clip_result.return_value = None
+    with patch.object(api_server, "db_client", db), \
+         patch.object(api_server, "process_clip_url",
+                      return_value={"players": [], "best_frame_info": {"frame_path": None}}), \
+         patch.object(api_server, "get_image_url") as image_url:
+        result = api_server.process_clip_request("https://clips.twitch.tv/abc", "abc", add_to_queue=False)
+
+    image_url.assert_not_called()
+    assert "frame_image_url" not in result
+
+
+def test_worker_marks_request_failed_when_completion_fails():
+    db = MagicMock()
+    db.complete_request.return_value = False
+    clip_request = {
+        "request_id": "req1",
+        "request_type": "clip",
+        "clip_url": "https://clips.twitch.tv/abc",
+        "clip_id": "abc",
+        "debug": False,
+        "force": False,
+        "include_image": True,
+    }
+    with patch.object(api_server, "process_clip_request", return_value={"players": [{"player_name": "x"}]}):
+        _run_worker_once(db, clip_request)
+
+    failed_call = db.update_queue_status.call_args_list[-1]
+    assert failed_call.args[1] == "failed"
+    assert failed_call.kwargs["failure_reason"] == "transient"
+
+
+class _OneRequestQueue:
+    """Stands in for prefetched_requests: hands out one request, then stops the worker."""
+
+    def __init__(self, request):
+        self.items = [request]
+        self.put_items = []
+
+    def get(self, timeout=None):
+        if not self.items:
+            raise _StopLoop()
+        return self.items.pop()
+
+    def put(self, item):
+        self.put_items.append(item)
+        raise _StopLoop()
+
+
+def test_worker_takes_prefetched_requests_from_the_prefetch_stage():
+    db = MagicMock()
+    clip_request = {
+        "request_id": "req1",
+        "request_type": "clip",
+        "clip_url": "https://clips.twitch.tv/abc",
+        "clip_id": "abc",
+        "debug": False,
+        "force": False,
+        "include_image": True,
+        "prefetched": {"clip_details": {"id": "abc"}},
+    }
+    slots = MagicMock()
+    with patch.object(api_server, "prefetched_requests", _OneRequestQueue(clip_request)), \
+         patch.object(api_server, "prefetch_slots", slots), \
+         patch.object(api_server, "db_client", db), \
+         patch.object(api_server.time, "sleep"), \
+         patch.object(api_server, "process_clip_request", return_value={"players": [{"player_name": "x"}]}) as pcr:
+        api_server.process_queue_worker()
+
+    db.claim_next_request.assert_not_called()  # the prefetch stage claims
+    slots.release.assert_called_once()
+    assert pcr.call_args.kwargs["prefetched"] == {"clip_details": {"id": "abc"}}
+    db.refresh_processing_request.assert_called_once_with("req1")
+    db.update_queue_status.assert_not_called()
+    db.complete_request.assert_called_once()
+
+
+def test_worker_drops_prefetched_request_reset_while_buffered():
+    db = MagicMock()
+    db.refresh_processing_request.return_value = False  # the stuck-request reset failed it
+    request = {"request_id": "req1", "request_type": "clip", "clip_url": "https://clips.twitch.tv/abc",
+               "clip_id": "abc", "prefetched": None}
+    with patch.object(api_server, "prefetched_requests", _OneRequestQueue(request)), \
+         patch.object(api_server, "prefetch_slots", MagicMock()), \
+         patch.object(api_server, "db_client", db), \
+         patch.object(api_server, "process_clip_request") as pcr:
+        api_server.process_queue_worker()
+
+    pcr.assert_not_called()
+    db.update_queue_status.assert_not_called()
+    db.complete_request.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "request_type, only_draft, sample",
+    [("clip", False, True), ("clip", True, False), ("clip_in_game", False, False)],
+)
+def test_prefetch_worker_claims_and_prefetches_clip_requests(request_type, only_draft, sample):
+    db = MagicMock()
+    db.claim_next_request.return_value = {
+        "request_id": "req1",
+        "request_type": request_type,
+        "clip_url": "https://clips.twitch.tv/abc",
+        "only_draft": only_draft,
+    }
+    buffer = _OneRequestQueue(None)
+    with patch.object(api_server, "prefetched_requests", buffer), \
+         patch.object(api_server, "prefetch_slots", MagicMock()), \
+         patch.object(api_server, "db_client", db), \
+         patch.object(api_server, "prefetch_clip_frames", return_value={"frame": "f"}) as prefetch:
+        api_server.process_prefetch_worker()
+
+    db.update_queue_status.assert_not_called()  # the claim itself marks it processing
+    assert prefetch.call_args.kwargs["sample"] is sample
+    assert buffer.put_items[0]["prefetched"] == {"frame": "f"}
+
+
+@pytest.mark.parametrize("stored", ["completed_match", "draft", "cached_clip"])
+def test_prefetch_worker_skips_requests_with_stored_results(stored):
+    db = MagicMock()
+    request = {"request_id": "req1", "request_type": "clip", "clip_url": "https://clips.twitch.tv/abc",
+               "clip_id": "abc", "match_id": "m1", "only_draft": stored == "draft", "force": False}
+    db.claim_next_request.return_value = request
+    db.check_for_match_processing.return_value = (
+        {"found": True, "status": "completed", "clip_id": "old"} if stored == "completed_match" else None)
+    db.get_latest_draft_for_match.return_value = {"clip_id": "old"} if stored == "draft" else None
+    db.get_clip_result.return_value = {"players": [], "is_draft": True}
+    buffer = _OneRequestQueue(None)
+    with patch.object(api_server, "prefetched_requests", buffer), \
+         patch.object(api_server, "prefetch_slots", MagicMock()), \
+         patch.object(api_server, "db_client", db), \
+         patch.object(api_server, "prefetch_clip_frames") as prefetch:
+        api_server.process_prefetch_worker()
+
+    prefetch.assert_not_called()
+    assert buffer.put_items[0]["prefetched"] is None
+
+
+def test_prefetch_worker_skips_stream_requests():
+    db = MagicMock()
+    db.claim_next_request.return_value = {"request_id": "req2", "request_type": "stream"}
+    buffer = _OneRequestQueue(None)
+    with patch.object(api_server, "prefetched_requests", buffer), \
+         patch.object(api_server, "prefetch_slots", MagicMock()), \
+         patch.object(api_server, "db_client", db), \
+         patch.object(api_server, "prefetch_clip_frames") as prefetch:
+        api_server.process_prefetch_worker()
+
+    prefetch.assert_not_called()
+    assert buffer.put_items[0]["prefetched"] is None
 
 
 def test_worker_stream_branch_does_not_call_save_clip_result():
@@ -252,8 +450,8 @@ def test_worker_stream_branch_does_not_call_save_clip_result():
     assert psr.call_count == 1
     assert psr.call_args.kwargs["from_worker"] is True
     db.save_clip_result.assert_not_called()
-    statuses = [c.args[1] for c in db.update_queue_status.call_args_list]
-    assert statuses == ["processing", "completed"]
+    db.complete_request.assert_called_once()
+    assert db.complete_request.call_args.kwargs["result"] is None
 
 
 def test_worker_clip_in_game_branch_calls_process_with_in_game_true():
@@ -357,7 +555,7 @@ def test_worker_clip_not_found_is_requeued_not_failed():
     db.requeue_for_retry.assert_called_once_with("req_transient")
     # Must NOT mark failed — only the initial 'processing' transition is allowed.
     statuses = [c.args[1] for c in db.update_queue_status.call_args_list]
-    assert statuses == ["processing"]
+    assert statuses == []
 
 
 def test_worker_all_renditions_404_is_requeued_not_failed():
@@ -387,7 +585,7 @@ def test_worker_all_renditions_404_is_requeued_not_failed():
     db.requeue_for_retry.assert_called_once_with("req_renditions_404")
     # Must NOT mark failed — only the initial 'processing' transition is allowed.
     statuses = [c.args[1] for c in db.update_queue_status.call_args_list]
-    assert statuses == ["processing"]
+    assert statuses == []
 
 
 def test_worker_clip_not_found_falls_back_to_failed_when_budget_exhausted():
@@ -412,7 +610,7 @@ def test_worker_clip_not_found_falls_back_to_failed_when_budget_exhausted():
         _run_worker_once(db, request)
 
     statuses = [c.args[1] for c in db.update_queue_status.call_args_list]
-    assert statuses == ["processing", "failed"]
+    assert statuses == ["failed"]
     failed_call = db.update_queue_status.call_args_list[-1]
     assert failed_call.kwargs.get("failure_reason") == "transient"
 
@@ -473,7 +671,7 @@ def test_worker_other_error_does_not_requeue():
 
     db.requeue_for_retry.assert_not_called()
     statuses = [c.args[1] for c in db.update_queue_status.call_args_list]
-    assert statuses == ["processing", "failed"]
+    assert statuses == ["failed"]
     failed_call = db.update_queue_status.call_args_list[-1]
     assert failed_call.kwargs.get("failure_reason") == "permanent"
 
@@ -526,8 +724,9 @@ def test_worker_marks_failed_when_no_players_detected():
         _run_worker_once(db, clip_request)
 
     statuses = [c.args[1] for c in db.update_queue_status.call_args_list]
-    assert statuses == ["processing", "failed"]
+    assert statuses == ["failed"]
     db.save_clip_result.assert_not_called()
+    db.complete_request.assert_not_called()
 
 
 # --------------------------------------------------------------------------- #
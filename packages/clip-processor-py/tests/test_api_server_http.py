@@ -94,6 +94,8 @@ def test_metrics_accepts_valid_key(client, monkeypatch):
     body = resp.get_json()
     assert body["num_threads"] == 7
     assert body["memory_mb"] == 50.0
+    assert "http" in body
+    assert "db_pool" in body
 
 
 def test_local_mode_bypasses_auth(client, monkeypatch):
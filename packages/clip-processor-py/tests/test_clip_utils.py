@@ -5,9 +5,15 @@ the retry loop's behavior is pinned before it gets extracted into a shared helpe
 """
 
 import json
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import MagicMock, patch
 from urllib.parse import quote
 
+import cv2
+import numpy as np
 import pytest
 
 import clip_utils
@@ -18,9 +24,16 @@ URL_1080 = f"{BASE}/1080/index.mp4"
 URL_720 = f"{BASE}/720/index.mp4"
 
 
-def make_token(clip_uri):
+@pytest.fixture(autouse=True)
+def _fresh_clip_details_cache():
+    clip_utils.clear_clip_details_cache()
+    yield
+    clip_utils.clear_clip_details_cache()
+
+
+def make_token(clip_uri, **extra):
     return {
-        "value": json.dumps({"clip_uri": clip_uri, "clip_slug": CLIP_SLUG}),
+        "value": json.dumps({"clip_uri": clip_uri, "clip_slug": CLIP_SLUG, **extra}),
         "signature": "sigvalue",
     }
 
@@ -59,7 +72,7 @@ def test_falls_back_to_720_when_1080_is_404():
         {"quality": "720", "sourceURL": URL_720},
     ]
     token = make_token(URL_720)
-    with patch("clip_utils.requests") as mock_requests:
+    with patch("clip_utils.http_client") as mock_requests:
         mock_requests.RequestException = Exception
         mock_requests.post.return_value = gql_response(qualities, token)
         mock_requests.get.side_effect = [probe(404), probe(206)]
@@ -76,7 +89,7 @@ def test_uses_1080_when_available():
         {"quality": "720", "sourceURL": URL_720},
     ]
     token = make_token(URL_720)
-    with patch("clip_utils.requests") as mock_requests:
+    with patch("clip_utils.http_client") as mock_requests:
         mock_requests.RequestException = Exception
         mock_requests.post.return_value = gql_response(qualities, token)
         mock_requests.get.side_effect = [probe(206)]
@@ -88,7 +101,7 @@ def test_uses_1080_when_available():
 def test_clip_uri_fallback_when_all_qualities_404():
     qualities = [{"quality": "1080", "sourceURL": URL_1080}]
     token = make_token(URL_720)
-    with patch("clip_utils.requests") as mock_requests:
+    with patch("clip_utils.http_client") as mock_requests:
         mock_requests.RequestException = Exception
         mock_requests.post.return_value = gql_response(qualities, token)
         mock_requests.get.side_effect = [probe(404), probe(206)]
@@ -106,7 +119,7 @@ def test_raises_when_every_candidate_404():
         {"quality": "720", "sourceURL": URL_720},
     ]
     token = make_token(URL_720)
-    with patch("clip_utils.requests") as mock_requests, \
+    with patch("clip_utils.http_client") as mock_requests, \
          patch("clip_utils.time.sleep"):
         mock_requests.RequestException = Exception
         mock_requests.post.return_value = gql_response(qualities, token)
@@ -123,7 +136,7 @@ def test_raises_when_every_candidate_404():
 # Retry / backoff
 # --------------------------------------------------------------------------- #
 def test_retries_then_raises_after_max_attempts():
-    with patch("clip_utils.requests") as mock_requests, \
+    with patch("clip_utils.http_client") as mock_requests, \
          patch("clip_utils.time.sleep") as sleep:
         mock_requests.RequestException = Exception
         mock_requests.post.side_effect = RuntimeError("network down")
@@ -139,7 +152,7 @@ def test_retries_then_raises_after_max_attempts():
 def test_succeeds_on_second_attempt():
     qualities = [{"quality": "1080", "sourceURL": URL_1080}]
     token = make_token(URL_1080)
-    with patch("clip_utils.requests") as mock_requests, \
+    with patch("clip_utils.http_client") as mock_requests, \
          patch("clip_utils.time.sleep"):
         mock_requests.RequestException = Exception
         mock_requests.post.side_effect = [RuntimeError("blip"), gql_response(qualities, token)]
@@ -171,7 +184,7 @@ def test_resolve_skips_404_and_returns_first_206():
         {"quality": "720", "sourceURL": URL_720},
     ]
     token = make_token(URL_720)
-    with patch("clip_utils.requests") as mock_requests:
+    with patch("clip_utils.http_client") as mock_requests:
         mock_requests.RequestException = Exception
         mock_requests.get.side_effect = [probe(404), probe(206)]
         url, quality = clip_utils._resolve_available_download_url(qualities, token)
@@ -183,7 +196,7 @@ def test_resolve_falls_back_to_clip_uri_when_advertised_404():
     # Only 1080 advertised (and 404); token's clip_uri points at a real 720 file.
     qualities = [{"quality": "1080", "sourceURL": URL_1080}]
     token = make_token(URL_720)
-    with patch("clip_utils.requests") as mock_requests:
+    with patch("clip_utils.http_client") as mock_requests:
         mock_requests.RequestException = Exception
         mock_requests.get.side_effect = [probe(404), probe(206)]
         url, quality = clip_utils._resolve_available_download_url(qualities, token)
@@ -200,7 +213,7 @@ def test_resolve_raises_when_every_candidate_404():
         {"quality": "720", "sourceURL": URL_720},
     ]
     token = make_token(URL_720)
-    with patch("clip_utils.requests") as mock_requests:
+    with patch("clip_utils.http_client") as mock_requests:
         mock_requests.RequestException = Exception
         mock_requests.get.side_effect = [probe(404), probe(404)]
         with pytest.raises(ValueError, match="Clip renditions not yet available"):
@@ -209,7 +222,7 @@ def test_resolve_raises_when_every_candidate_404():
 
 def test_resolve_raises_when_no_candidates():
     token = {"value": json.dumps({}), "signature": "s"}  # no clip_uri
-    with patch("clip_utils.requests") as mock_requests:
+    with patch("clip_utils.http_client") as mock_requests:
         mock_requests.RequestException = Exception
         with pytest.raises(ValueError, match="No valid sourceURL"):
             clip_utils._resolve_available_download_url([], token)
@@ -222,7 +235,7 @@ def test_get_clip_details_raises_when_clip_missing():
     resp = MagicMock()
     resp.raise_for_status.return_value = None
     resp.json.return_value = {"data": {"clip": None}}
-    with patch("clip_utils.requests") as mock_requests, \
+    with patch("clip_utils.http_client") as mock_requests, \
          patch("clip_utils.time.sleep"):
         mock_requests.RequestException = Exception
         mock_requests.post.return_value = resp
@@ -230,6 +243,101 @@ def test_get_clip_details_raises_when_clip_missing():
             clip_utils.get_clip_details(f"https://clips.twitch.tv/{CLIP_SLUG}", max_retries=1)
 
 
+# --------------------------------------------------------------------------- #
+# get_clip_details — cache and single-flight
+# --------------------------------------------------------------------------- #
+def _cached_lookup(token, calls=2, **kwargs):
+    """Call get_clip_details `calls` times; return (results, GQL post count)."""
+    qualities = [{"quality": "720", "sourceURL": URL_720}]
+    with patch("clip_utils.http_client") as mock_requests:
+        mock_requests.RequestException = Exception
+        mock_requests.post.return_value = gql_response(qualities, token)
+        mock_requests.get.return_value = probe(206)
+        results = [
+            clip_utils.get_clip_details(f"{scheme}://clips.twitch.tv/{CLIP_SLUG}", **kwargs)
+            for scheme in ("https", "http")[:calls]
+        ]
+    return results, mock_requests.post.call_count
+
+
+def test_get_clip_details_reuses_cached_lookup():
+    results, posts = _cached_lookup(make_token(URL_720, expires=time.time() + 3600))
+    assert posts == 1
+    assert results[0]["download_url"] == results[1]["download_url"]
+    assert results[1]["url"].startswith("http://")  # the caller's own URL is kept
+
+
+def test_get_clip_details_does_not_cache_past_token_expiry():
+    # Token expires inside the safety margin -> every call re-fetches.
+    _results, posts = _cached_lookup(make_token(URL_720, expires=time.time() + 30))
+    assert posts == 2
+
+
+def test_get_clip_details_use_cache_false_always_fetches():
+    _results, posts = _cached_lookup(make_token(URL_720), use_cache=False)
+    assert posts == 2
+
+
+def test_get_clip_details_callers_get_independent_copies():
+    results, _posts = _cached_lookup(make_token(URL_720, expires=time.time() + 3600), calls=1)
+    results[0]["qualities"].clear()
+    again, posts = _cached_lookup(make_token(URL_720, expires=time.time() + 3600), calls=1)
+    assert posts == 0
+    assert again[0]["qualities"]
+
+
+def test_caching_a_lookup_prunes_expired_entries():
+    clip_utils._clip_details_cache["stale-clip"] = (time.monotonic() - 1, {"clip_id": "stale-clip"})
+    _cached_lookup(make_token(URL_720, expires=time.time() + 3600), calls=1)
+    assert "stale-clip" not in clip_utils._clip_details_cache
+    assert CLIP_SLUG in clip_utils._clip_details_cache
+
+
+def test_clip_details_cache_is_capped(monkeypatch):
+    monkeypatch.setattr(clip_utils, "CLIP_DETAILS_CACHE_SIZE", 2)
+    for clip_id in ("first", "second"):
+        clip_utils._clip_details_cache[clip_id] = (time.monotonic() + 600, {"clip_id": clip_id})
+    _cached_lookup(make_token(URL_720, expires=time.time() + 3600), calls=1)
+    assert list(clip_utils._clip_details_cache) == ["second", CLIP_SLUG]
+
+
+def test_get_clip_details_does_not_cache_failures():
+    with patch("clip_utils.http_client") as mock_requests, \
+         patch("clip_utils.time.sleep"):
+        mock_requests.RequestException = Exception
+        mock_requests.post.side_effect = RuntimeError("network down")
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                clip_utils.get_clip_details(f"https://clips.twitch.tv/{CLIP_SLUG}", max_retries=1)
+    assert mock_requests.post.call_count == 2
+
+
+def test_concurrent_get_clip_details_share_one_lookup():
+    qualities = [{"quality": "720", "sourceURL": URL_720}]
+    release = threading.Event()
+
+    def slow_post(*args, **kwargs):
+        release.wait(5)
+        return gql_response(qualities, make_token(URL_720))
+
+    with patch("clip_utils.http_client") as mock_requests:
+        mock_requests.RequestException = Exception
+        mock_requests.post.side_effect = slow_post
+        mock_requests.get.return_value = probe(206)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [
+                pool.submit(clip_utils.get_clip_details, f"https://clips.twitch.tv/{CLIP_SLUG}")
+                for _ in range(4)
+            ]
+            while mock_requests.post.call_count == 0:
+                time.sleep(0.01)
+            time.sleep(0.05)  # let the other callers join the in-flight lookup
+            release.set()
+            results = [f.result() for f in futures]
+    assert mock_requests.post.call_count == 1
+    assert len({r["download_url"] for r in results}) == 1
+
+
 # --------------------------------------------------------------------------- #
 # download_single_frame — early-return seams (no network/cv2)
 # --------------------------------------------------------------------------- #
@@ -243,12 +351,362 @@ def test_download_single_frame_reuses_existing_frame(tmp_path):
     frames_dir.mkdir()
     (frames_dir / "c1.jpg").write_bytes(b"cached")
     with patch.object(clip_utils, "TEMP_DIR", tmp_path), \
-         patch("clip_utils.requests") as mock_requests:
+         patch("clip_utils.http_client") as mock_requests:
         out = clip_utils.download_single_frame({"id": "c1", "download_url": "http://x"})
     assert out.endswith("c1.jpg")
     mock_requests.get.assert_not_called()  # reused, never hit the network
 
 
+def test_download_single_frame_return_frame_decodes_existing_frame(tmp_path):
+    frames_dir = tmp_path / "frames"
+    frames_dir.mkdir()
+    cv2.imwrite(str(frames_dir / "c1.jpg"), np.full((8, 8, 3), 200, np.uint8))
+    with patch.object(clip_utils, "TEMP_DIR", tmp_path), \
+         patch("clip_utils.http_client") as mock_requests:
+        out = clip_utils.download_single_frame({"id": "c1", "download_url": "http://x"}, return_frame=True)
+    assert isinstance(out, np.ndarray) and out.shape == (8, 8, 3)
+    mock_requests.get.assert_not_called()
+
+
+# --------------------------------------------------------------------------- #
+# Byte-range keyframe fetching
+# --------------------------------------------------------------------------- #
+def _write_clip(path, frames=100, fps=10):
+    """An MPEG-4 Part 2 clip (moov after mdat) with a marker at x = 10 + i in frame i.
+
+    Only the marker moves over a noisy background, so keyframes are large and the
+    encoder uses small P-frames between them, like a real clip."""
+    background = np.random.default_rng(0).integers(0, 80, (240, 320, 3), dtype=np.uint8)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (320, 240))
+    for i in range(frames):
+        frame = background.copy()
+        frame[10:30, 10 + i:30 + i] = 255
+        writer.write(frame)
+    writer.release()
+
+
+def _frame_index(frame):
+    """Recover i from a decoded _write_clip frame."""
+    return int(np.argmax(frame[20, :, 0] > 150)) - 10
+
+
+@pytest.fixture
+def clip_server(tmp_path):
+    """Serve tmp_path over HTTP with Range support, recording the bytes sent."""
+    import functools
+    import http.server
+    import re as _re
+    import threading
+
+    served = {"bytes": 0, "ranges": True}
+
+    class RangeHandler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            data = (tmp_path / self.path.lstrip("/")).read_bytes()
+            match = _re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+            if served["ranges"] and match:
+                start, end = int(match.group(1)), min(int(match.group(2)), len(data) - 1)
+                body = data[start:end + 1]
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            else:
+                body = data
+                self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            # Counted before sending: a client can finish reading (and a test reset
+            # the counter) before this handler thread gets to run again.
+            served["bytes"] += len(body)
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(RangeHandler, directory=str(tmp_path)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    served["url"] = f"http://127.0.0.1:{server.server_address[1]}"
+    yield served
+    server.shutdown()
+    server.server_close()
+
+
+def test_read_mp4_video_track_parses_sample_tables(tmp_path, clip_server):
+    _write_clip(tmp_path / "clip.mp4")
+    track = clip_utils.read_mp4_video_track(f"{clip_server['url']}/clip.mp4")
+    assert track.codec == "mpeg4"
+    assert len(track.sample_offsets) == 100
+    assert track.sync_samples[0] == 0 and len(track.sync_samples) > 1
+    assert track.duration == pytest.approx(9.9)
+
+
+def test_fetch_keyframe_downloads_only_moov_and_keyframe(tmp_path, clip_server):
+    _write_clip(tmp_path / "clip.mp4")
+    url = f"{clip_server['url']}/clip.mp4"
+    track = clip_utils.read_mp4_video_track(url)
+    clip_server["bytes"] = 0
+
+    frame, keyframe_time = clip_utils.fetch_keyframe(url, timestamp=3.3, track=track)
+
+    sample = track.keyframe_near(3.3)
+    assert sample in track.sync_samples
+    assert keyframe_time == pytest.approx(sample / 10)
+    assert frame.shape == (240, 320, 3)
+    assert _frame_index(frame) == sample
+    assert clip_server["bytes"] == track.sample_range(sample)[1]  # just the keyframe
+
+
+def test_iter_keyframes_fetches_each_keyframe_once(tmp_path, clip_server):
+    _write_clip(tmp_path / "clip.mp4")
+    url = f"{clip_server['url']}/clip.mp4"
+    track = clip_utils.read_mp4_video_track(url)
+    clip_server["bytes"] = 0
+
+    # 0.0 and 0.1 share keyframe 0.
+    out = dict(clip_utils.iter_keyframes(url, [0.0, 0.1, 4.8, 9.9], track=track, max_workers=3))
+
+    samples = sorted({track.keyframe_near(t) for t in (0.0, 0.1, 4.8, 9.9)})
+    assert samples[0] == 0 and len(samples) == 3
+    assert sorted(out) == [track.sample_time(s) for s in samples]
+    for s in samples:
+        assert _frame_index(out[track.sample_time(s)]) == s
+    assert clip_server["bytes"] == sum(track.sample_range(s)[1] for s in samples)
+
+
+def test_closing_iter_keyframes_cancels_fetches_not_yet_started():
+    track = MagicMock()
+    track.keyframe_near.side_effect = lambda t: int(t)
+    track.sample_time.side_effect = float
+    fetched = []
+    release = threading.Event()
+
+    def fetch(url, track, sample):
+        fetched.append(sample)
+        if sample:
+            release.wait(5)  # later fetches are still running when the caller stops
+        return np.zeros((2, 2, 3), np.uint8)
+
+    with patch("clip_utils._fetch_keyframe_sample", side_effect=fetch):
+        keyframes = clip_utils.iter_keyframes("http://clip", range(20), track=track, max_workers=1)
+        next(keyframes)
+        threading.Timer(0.5, release.set).start()
+        keyframes.close()
+    assert fetched in ([0], [0, 1])  # at most the fetch already running finishes
+
+
+def test_sample_clip_keyframes_spreads_over_the_clip(tmp_path, clip_server):
+    _write_clip(tmp_path / "clip.mp4")
+    details = {"id": "c9", "download_url": f"{clip_server['url']}/clip.mp4"}
+    with patch.object(clip_utils, "MP4_HEAD_FETCH_BYTES", 4096):
+        keyframes = sorted(clip_utils.sample_clip_keyframes(details, interval=3), key=lambda kf: kf[0])
+    times = [t for t, _ in keyframes]
+    # Timestamps 0.9, 3.9, 6.9 and 9.9 (back from the end), each on its nearest keyframe.
+    assert len(times) >= 3 and times[0] < 2.0 and times[-1] >= 8.0
+    assert all(frame.shape == (1080, 1920, 3) for _, frame in keyframes)
+    assert clip_server["bytes"] < (tmp_path / "clip.mp4").stat().st_size / 2
+
+
+def test_download_single_frame_uses_range_requests(tmp_path, clip_server):
+    _write_clip(tmp_path / "clip.mp4")
+    with patch.object(clip_utils, "TEMP_DIR", tmp_path), \
+         patch.object(clip_utils, "MP4_HEAD_FETCH_BYTES", 4096), \
+         patch.object(clip_utils, "download_clip") as whole:
+        frame = clip_utils.download_single_frame(
+            {"id": "c7", "download_url": f"{clip_server['url']}/clip.mp4"}, return_frame=True)
+    whole.assert_not_called()
+    assert frame.shape == (1080, 1920, 3)
+    # Head + moov + one keyframe, not the clip.
+    assert clip_server["bytes"] < (tmp_path / "clip.mp4").stat().st_size / 4
+
+
+def test_download_single_frame_falls_back_without_range_support(tmp_path, clip_server):
+    _write_clip(tmp_path / "clip.mp4")
+    clip_server["ranges"] = False
+    with patch.object(clip_utils, "TEMP_DIR", tmp_path), \
+         patch.object(clip_utils, "download_clip", return_value=str(tmp_path / "clip.mp4")) as whole:
+        frame = clip_utils.download_single_frame(
+            {"id": "c8", "download_url": f"{clip_server['url']}/clip.mp4"}, timestamp=5, return_frame=True)
+    whole.assert_called_once()
+    assert frame.shape == (1080, 1920, 3)
+
+
+class _BitWriter:
+    """Just enough of an H.264 RBSP writer for the test clip below."""
+
+    def __init__(self):
+        self.bits = []
+
+    def u(self, value, width):
+        self.bits += [(value >> i) & 1 for i in range(width - 1, -1, -1)]
+
+    def ue(self, *values):
+        for value in values:
+            code = value + 1
+            self.u(0, code.bit_length() - 1)
+            self.u(code, code.bit_length())
+
+    def align(self):
+        self.bits += [0] * (-len(self.bits) % 8)
+
+    def raw(self, data):
+        self.align()
+        for byte in data:
+            self.u(byte, 8)
+
+    def nal(self, header):
+        self.u(1, 1)  # rbsp_stop_one_bit
+        self.align()
+        rbsp = bytes(int("".join(map(str, self.bits[i:i + 8])), 2) for i in range(0, len(self.bits), 8))
+        out, zeros = bytearray([header]), 0
+        for byte in rbsp:  # emulation prevention
+            if zeros >= 2 and byte <= 3:
+                out.append(3)
+                zeros = 0
+            out.append(byte)
+            zeros = zeros + 1 if byte == 0 else 0
+        return bytes(out)
+
+
+def _box(kind, *payload):
+    body = b"".join(payload)
+    return struct.pack(">I4s", 8 + len(body), kind.encode()) + body
+
+
+def _full_box(kind, version_flags, *payload):
+    return _box(kind, struct.pack(">I", version_flags), *payload)
+
+
+def _write_h264_clip(path, lumas, gop=5, fps=10, width=64, height=48):
+    """A Baseline H.264 MP4 (moov after mdat, avcC with 4-byte NAL lengths).
+
+    No encoder is needed: keyframe k is an IDR of uncompressed I_PCM macroblocks
+    with flat luma lumas[k], followed by gop - 1 all-skip P frames."""
+    mbs_wide, mbs_high = width // 16, height // 16
+    sps = _BitWriter()
+    sps.u(66 << 16 | 0xC0 << 8 | 30, 24)  # Baseline, constraint flags, level 3
+    sps.ue(0, 0, 2, 1)  # id, 4-bit frame_num, pic_order_cnt_type 2, one reference frame
+    sps.u(0, 1)  # no frame_num gaps
+    sps.ue(mbs_wide - 1, mbs_high - 1)
+    sps.u(0b1100, 4)  # frame_mbs_only, direct_8x8_inference, no cropping, no VUI
+    sps = sps.nal(0x67)
+    pps = _BitWriter()
+    pps.ue(0, 0)  # pps id, sps id
+    pps.u(0, 2)  # CAVLC, no field order flag
+    pps.ue(0, 0, 0)  # one slice group, one reference in each list
+    pps.u(0, 3)  # no weighted prediction
+    pps.ue(0, 0, 0)  # qp, qs and chroma qp offsets, all se(0)
+    pps.u(0, 3)  # no deblocking control, constrained intra or redundant pictures
+    pps = pps.nal(0x68)
+
+    samples = []
+    for k, luma in enumerate(lumas):
+        idr = _BitWriter()
+        idr.ue(0, 7, 0)  # first mb, I slice, pps id
+        idr.u(0, 4)  # frame_num
+        idr.ue(k)  # idr_pic_id
+        idr.u(0, 2)  # dec_ref_pic_marking
+        idr.ue(0)  # slice_qp_delta se(0)
+        for _ in range(mbs_wide * mbs_high):
+            idr.ue(25)  # I_PCM
+            idr.raw(bytes([luma]) * 256 + bytes([128]) * 128)
+        samples.append(idr.nal(0x65))
+        for frame_num in range(1, gop):
+            skip = _BitWriter()
+            skip.ue(0, 5, 0)  # first mb, P slice, pps id
+            skip.u(frame_num, 4)
+            skip.u(0, 3)  # no ref count override or list modification, sliding window marking
+            skip.ue(0, mbs_wide * mbs_high)  # slice_qp_delta, mb_skip_run over the whole frame
+            samples.append(skip.nal(0x41))
+    samples = [struct.pack(">I", len(nal)) + nal for nal in samples]
+
+    ftyp = _box("ftyp", b"isom", struct.pack(">I", 512), b"isomiso2avc1mp41")
+    mdat = _box("mdat", *samples)
+    avcc = _box("avcC", bytes([1, 66, 0xC0, 30, 0xFF, 0xE1]), struct.pack(">H", len(sps)), sps,
+                bytes([1]), struct.pack(">H", len(pps)), pps)
+    avc1 = _box("avc1", bytes(6), struct.pack(">HHH12xHHIIIH32sHh", 1, 0, 0, width, height,
+                                              0x480000, 0x480000, 0, 1, b"", 0x18, -1), avcc)
+    count = len(samples)
+    stbl = _box(
+        "stbl",
+        _full_box("stsd", 0, struct.pack(">I", 1), avc1),
+        _full_box("stts", 0, struct.pack(">III", 1, count, 1)),
+        _full_box("stss", 0, struct.pack(f">I{len(lumas)}I", len(lumas), *range(1, count + 1, gop))),
+        _full_box("stsc", 0, struct.pack(">IIII", 1, 1, count, 1)),
+        _full_box("stsz", 0, struct.pack(f">II{count}I", 0, count, *map(len, samples))),
+        _full_box("stco", 0, struct.pack(">II", 1, len(ftyp) + 8)),
+    )
+    matrix = struct.pack(">9I", 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+    minf = _box("minf", _full_box("vmhd", 1, bytes(8)),
+                _box("dinf", _full_box("dref", 0, struct.pack(">I", 1), _full_box("url ", 1))), stbl)
+    mdia = _box("mdia", _full_box("mdhd", 0, struct.pack(">IIIIHH", 0, 0, fps, count, 0x55C4, 0)),
+                _full_box("hdlr", 0, bytes(4), b"vide", bytes(12), b"VideoHandler\0"), minf)
+    tkhd = _full_box("tkhd", 3, struct.pack(">IIIII8xHHHH", 0, 0, 1, 0, count * 1000 // fps, 0, 0, 0, 0),
+                     matrix, struct.pack(">II", width << 16, height << 16))
+    mvhd = _full_box("mvhd", 0, struct.pack(">IIIIIH10x", 0, 0, 1000, count * 1000 // fps, 0x10000, 0x100),
+                     matrix, bytes(24), struct.pack(">I", 2))
+    path.write_bytes(ftyp + mdat + _box("moov", mvhd, _box("trak", tkhd, mdia)))
+
+
+def test_fetch_keyframe_decodes_an_h264_idr(tmp_path, clip_server):
+    path = tmp_path / "clip.mp4"
+    _write_h264_clip(path, lumas=[60, 100, 140, 180])
+    cap = cv2.VideoCapture(str(path))
+    ok, _ = cap.read()
+    cap.release()
+    if not ok:
+        pytest.skip("this OpenCV build can't decode H.264")
+    url = f"{clip_server['url']}/clip.mp4"
+    track = clip_utils.read_mp4_video_track(url)
+    assert track.codec == "h264" and track.sync_samples == [0, 5, 10, 15]
+    clip_server["bytes"] = 0
+
+    frame, keyframe_time = clip_utils.fetch_keyframe(url, timestamp=1.1, track=track)
+
+    assert keyframe_time == pytest.approx(1.0)
+    assert frame.shape == (48, 64, 3)
+    # Studio-range luma 140 is RGB 144; a neighbouring keyframe would be ~97 or ~190.
+    assert abs(frame.mean() - 144) < 4
+    assert clip_server["bytes"] == track.sample_range(10)[1]  # just the IDR
+
+
+def test_range_get_rejects_a_206_for_another_range():
+    response = MagicMock(status_code=206, content=b"x" * 100, headers={"Content-Range": "bytes 0-99/1000"})
+    with patch("clip_utils.http_client") as mock_requests:
+        mock_requests.get.return_value = response
+        with pytest.raises(ValueError, match="Content-Range"):
+            clip_utils._range_get("http://clip", 100, 199)
+        response.headers = {}
+        with pytest.raises(ValueError, match="Content-Range"):
+            clip_utils._range_get("http://clip", 0, 99)
+        response.headers = {"Content-Range": "bytes 0-99/1000"}
+        assert clip_utils._range_get("http://clip", 0, 99) == b"x" * 100
+        # Shortened at the end of the file is fine; a body that disagrees isn't.
+        response.headers = {"Content-Range": "bytes 900-999/1000"}
+        assert clip_utils._range_get("http://clip", 900, 1199) == b"x" * 100
+        response.content = b"x" * 10
+        with pytest.raises(ValueError, match="body"):
+            clip_utils._range_get("http://clip", 900, 1199)
+
+
+def test_h264_keyframe_becomes_annex_b_stream():
+    sps, pps = b"\x67\x42\x00\x1f", b"\x68\xce\x3c\x80"
+    avcc = bytes([1, 0x42, 0, 0x1F, 0xFF, 0xE1]) + len(sps).to_bytes(2, "big") + sps \
+        + bytes([1]) + len(pps).to_bytes(2, "big") + pps
+    length_size, parameter_sets = clip_utils._nal_parameter_sets(avcc, 0, "h264")
+    assert length_size == 4 and parameter_sets == [sps, pps]
+
+    track = clip_utils.Mp4VideoTrack.__new__(clip_utils.Mp4VideoTrack)
+    track.nal_length_size = length_size
+    track.decoder_config = b"".join(b"\x00\x00\x00\x01" + nal for nal in parameter_sets)
+    idr, sei = b"\x65\x88\x84", b"\x06\x05"
+    sample = len(sei).to_bytes(4, "big") + sei + len(idr).to_bytes(4, "big") + idr
+    assert track.elementary_stream(sample) == (
+        b"\x00\x00\x00\x01" + sps + b"\x00\x00\x00\x01" + pps
+        + b"\x00\x00\x00\x01" + sei + b"\x00\x00\x00\x01" + idr
+    )
+
+
 # --------------------------------------------------------------------------- #
 # download_clip
 # --------------------------------------------------------------------------- #
@@ -260,7 +718,7 @@ def test_download_clip_raises_without_url():
 def test_download_clip_reuses_existing_file(tmp_path):
     (tmp_path / "c1.mp4").write_bytes(b"cached")
     with patch.object(clip_utils, "TEMP_DIR", tmp_path), \
-         patch("clip_utils.requests") as req:
+         patch("clip_utils.http_client") as req:
         out = clip_utils.download_clip({"id": "c1", "download_url": "http://x"})
     assert out.endswith("c1.mp4")
     req.get.assert_not_called()
@@ -273,7 +731,7 @@ def test_download_clip_streams_and_writes(tmp_path):
     resp.iter_content.return_value = [b"abc", b"def"]
     with patch.object(clip_utils, "TEMP_DIR", tmp_path), \
          patch.object(clip_utils, "tqdm", MagicMock()), \
-         patch("clip_utils.requests") as req:
+         patch("clip_utils.http_client") as req:
         req.get.return_value = resp
         out = clip_utils.download_clip({"id": "c2", "download_url": "http://x"})
     assert (tmp_path / "c2.mp4").read_bytes() == b"abcdef"
@@ -336,6 +794,83 @@ def test_extract_frames_resizes_when_not_1080(tmp_path):
     cv2.resize.assert_called()
 
 
+def test_extract_frames_return_frames_skips_the_disk(tmp_path):
+    with patch.object(clip_utils, "TEMP_DIR", tmp_path), \
+         patch.object(clip_utils, "tqdm", MagicMock()), \
+         patch.object(clip_utils, "cv2") as cv2:
+        cap = _opened_capture(cv2)
+        out = clip_utils.extract_frames(
+            str(tmp_path / "c5.mp4"), clip_details={"selected_quality": "1080"}, return_frames=True
+        )
+    assert out == [cap.read.return_value[1]] * 2
+    cv2.imwrite.assert_not_called()
+    assert not list((tmp_path / "frames").iterdir())
+
+
+def test_extract_frames_roi_only_reads_in_one_forward_pass(tmp_path):
+    with patch.object(clip_utils, "TEMP_DIR", tmp_path), \
+         patch.object(clip_utils, "tqdm", MagicMock()):
+        cap = MagicMock()
+        cap.isOpened.return_value = True
+        cap.get.side_effect = {
+            cv2.CAP_PROP_FPS: 10, cv2.CAP_PROP_FRAME_COUNT: 50,
+            cv2.CAP_PROP_FRAME_WIDTH: 1280, cv2.CAP_PROP_FRAME_HEIGHT: 720,
+        }.get
+        cap.grab.side_effect = [True] * 50 + [False]
+        cap.retrieve.return_value = (True, np.full((720, 1280, 3), 90, np.uint8))
+        with patch.object(clip_utils.cv2, "VideoCapture", return_value=cap):
+            out = clip_utils.extract_frames(str(tmp_path / "c6.mp4"), frame_interval=2, roi_only=True)
+
+    # Timestamps 1, 3, 5 (frames 10, 30, 50): two retrieved, the third is past the end.
+    assert len(out) == 2 and cap.retrieve.call_count == 2
+    assert cap.grab.call_count == 51
+    cap.set.assert_not_called()  # 2s gaps are grabbed through, not seeked
+    assert not list((tmp_path / "frames").iterdir())  # nothing written
+
+
+def test_keep_detection_rois_upscales_only_the_bands():
+    frame = np.full((720, 1280, 3), 90, np.uint8)
+    out = clip_utils.keep_detection_rois(frame)
+    assert out.shape == (1080, 1920, 3)
+    kept = np.zeros(1080, bool)
+    for top, bottom in clip_utils.DETECTION_ROI_ROWS:
+        kept[top:bottom] = True
+    assert (out[kept] == 90).all()
+    assert (out[~kept] == 0).all()
+
+
+def test_detection_roi_rows_follow_the_configured_name_rows(monkeypatch):
+    assert clip_utils.detection_roi_rows() == [(0, 162), (459, 540)]
+    monkeypatch.setenv("DRAFT_Y_START", "600")
+    monkeypatch.setenv("DRAFT_Y_END", "640")
+    assert clip_utils.detection_roi_rows() == [(0, 162), (459, 540), (576, 666)]
+    # Rows given against a 720p reference are scaled onto the 1080p canvas.
+    monkeypatch.setenv("DRAFT_BASE_HEIGHT", "720")
+    monkeypatch.setenv("TOPBAR_Y_END", "120")
+    rows = clip_utils.detection_roi_rows()
+    assert rows[0] == (0, 198) and (576, 666) not in rows
+    assert all(bottom % 9 == 0 and top % 9 == 0 for top, bottom in rows)
+
+
+def test_keep_detection_rois_keeps_a_moved_draft_band(monkeypatch):
+    monkeypatch.setenv("DRAFT_Y_START", "600")
+    monkeypatch.setenv("DRAFT_Y_END", "640")
+    out = clip_utils.keep_detection_rois(np.full((1080, 1920, 3), 90, np.uint8))
+    assert (out[600:640] == 90).all()
+
+
+def test_extract_frames_roi_only_decodes_the_requested_frames(tmp_path):
+    _write_clip(tmp_path / "c10.mp4")
+    with patch.object(clip_utils, "TEMP_DIR", tmp_path), \
+         patch.object(clip_utils, "tqdm", MagicMock()):
+        out = clip_utils.extract_frames(str(tmp_path / "c10.mp4"), frame_interval=3, roi_only=True)
+    # 100 frames at 10fps, sampled back from the end at 10, 7, 4 and 1s (frame 100 is
+    # past the end). The 320x240 source is scaled 6x, so the marker's x / 6 recovers i.
+    indices = [round(np.argmax(f[90, :, 0] > 150) / 6) - 10 for f in out]
+    assert indices == [10, 40, 70]
+    assert all(f.shape == (1080, 1920, 3) and not f[600:].any() for f in out)
+
+
 def test_extract_frames_no_resize_when_1080(tmp_path):
     with patch.object(clip_utils, "TEMP_DIR", tmp_path), \
          patch.object(clip_utils, "tqdm", MagicMock()), \
@@ -5,9 +5,11 @@ exercised with synthetic arrays. Heavy network/IO deps (clip download, stream
 capture) are mocked at the process_media boundary.
 """
 
+import hashlib
 import itertools
 import json
 import os
+import threading
 from unittest.mock import patch
 
 import cv2
@@ -15,6 +17,7 @@ import numpy as np
 import pytest
 
 import dota_hero_detection as dhd
+import dota_heroes
 
 
 @pytest.fixture(autouse=True)
@@ -29,10 +32,11 @@ def _restore_env():
 
 @pytest.fixture(autouse=True)
 def _reset_heroes_singleton():
-    saved = dhd._LOADED_HEROES_DATA
+    saved = dhd._LOADED_HEROES_DATA, dhd._TEMPLATE_BANK
     dhd._LOADED_HEROES_DATA = None
+    dhd._TEMPLATE_BANK = None
     yield
-    dhd._LOADED_HEROES_DATA = saved
+    dhd._LOADED_HEROES_DATA, dhd._TEMPLATE_BANK = saved
 
 
 @pytest.fixture(autouse=True)
@@ -414,11 +418,19 @@ def test_score_names_counts_only_real_names():
 # _sample_clip_frames — spreading candidate frames across the clip
 # --------------------------------------------------------------------------- #
 def _stub_frame_sampling(monkeypatch, returns):
-    """Stub download_clip/extract_frames and record the frame_interval requested."""
+    """Stub download_clip/extract_frames and record the frame_interval requested.
+
+    Sparse keyframe sampling is made to fail so the whole-clip fallback runs."""
     seen = {}
 
-    def fake_extract(path, clip_details=None, frame_interval=None):
+    def no_range_support(details, interval):
+        raise ValueError("Server doesn't support range requests")
+
+    monkeypatch.setattr(dhd, "sample_clip_keyframes", no_range_support)
+
+    def fake_extract(path, clip_details=None, frame_interval=None, return_frames=False):
         seen["interval"] = frame_interval
+        seen["return_frames"] = return_frames
         return returns
 
     monkeypatch.setattr(dhd, "download_clip", lambda details: "/tmp/clip.mp4")
@@ -436,6 +448,27 @@ def test_sample_clip_frames_spreads_interval_over_the_duration(monkeypatch):
     assert seen["interval"] == 7  # 60 // 8, comfortably finer than the panel window
 
 
+def test_sample_clip_frames_keeps_frames_in_memory(monkeypatch):
+    seen = _stub_frame_sampling(monkeypatch, [])
+    dhd._sample_clip_frames({"duration": 60}, count=8)
+    assert seen["return_frames"] is True
+
+
+def test_sample_clip_frames_prefers_sparse_keyframes(monkeypatch):
+    frames = {t: np.full((4, 4, 3), t, np.uint8) for t in (0, 14, 28)}
+    seen = {}
+
+    def keyframes(details, interval):
+        seen["interval"] = interval
+        yield from ((t, frames[t]) for t in (28, 0, 14))  # completion order
+
+    monkeypatch.setattr(dhd, "sample_clip_keyframes", keyframes)
+    monkeypatch.setattr(dhd, "download_clip", lambda details: pytest.fail("downloaded the clip"))
+    out = dhd._sample_clip_frames({"duration": 60}, count=4)
+    assert [f[0, 0, 0] for f in out] == [0, 14, 28]  # back in clip order
+    assert seen["interval"] == 15
+
+
 def test_sample_clip_frames_falls_back_when_duration_unknown(monkeypatch):
     seen = _stub_frame_sampling(monkeypatch, [])
     dhd._sample_clip_frames({}, count=8)
@@ -709,6 +742,53 @@ def test_process_media_propagates_renditions_not_yet_available():
             dhd.process_media("http://clip", source_type="clip")
 
 
+def test_process_media_uses_prefetched_clip_frames():
+    heroes, info = _heroes_and_info()
+    frame = np.zeros((120, 1920, 3), np.uint8)
+    prefetched = {"clip_details": {"id": "c1", "duration": 30}, "frame": frame, "sampled": [frame]}
+    with patch.object(dhd, "get_clip_details") as details, \
+         patch.object(dhd, "download_single_frame") as download, \
+         patch.object(dhd, "_sample_clip_frames") as sample, \
+         patch.object(dhd, "process_frames_for_heroes", return_value=(heroes, info)) as pffh, \
+         patch.object(dhd, "is_valid_hud", return_value=True), \
+         patch.object(dhd, "extract_team_captains_from_frame", return_value={}):
+        result = dhd.process_media("http://clip", source_type="clip", prefetched=prefetched)
+    assert result is not None
+    details.assert_not_called()
+    download.assert_not_called()
+    sample.assert_not_called()
+    assert len(pffh.call_args.args[0]) == 2  # frame 0 + the prefetched sample
+
+
+def test_process_media_reraises_prefetched_lookup_error():
+    error = ValueError("Clip not found or inaccessible: c1")
+    with patch.object(dhd, "get_clip_details") as details:
+        with pytest.raises(ValueError, match="Clip not found"):
+            dhd.process_media("http://clip", source_type="clip", prefetched={"error": error})
+    details.assert_not_called()
+
+
+def test_prefetch_clip_frames_fetches_details_and_frames():
+    frame = np.zeros((8, 8, 3), np.uint8)
+    with patch.object(dhd, "get_clip_details", return_value={"id": "c1"}), \
+         patch.object(dhd, "download_single_frame", return_value=frame) as download, \
+         patch.object(dhd, "_sample_clip_frames", return_value=[frame]) as sample:
+        prefetched = dhd.prefetch_clip_frames("http://clip")
+        draft_only = dhd.prefetch_clip_frames("http://clip", sample=False)
+    assert prefetched == {"clip_details": {"id": "c1"}, "frame": frame, "sampled": [frame]}
+    assert download.call_args.kwargs["return_frame"] is True
+    assert sample.call_count == 1
+    assert "sampled" not in draft_only
+
+
+def test_prefetch_clip_frames_keeps_lookup_error():
+    with patch.object(dhd, "get_clip_details", side_effect=ValueError("gone")), \
+         patch.object(dhd, "download_single_frame") as download:
+        prefetched = dhd.prefetch_clip_frames("http://clip")
+    assert str(prefetched["error"]) == "gone"
+    download.assert_not_called()
+
+
 def test_process_media_only_draft_returns_draft_result():
     with patch.object(dhd, "get_clip_details", return_value={"id": "c1"}), \
          patch.object(dhd, "download_single_frame", return_value="frame0.jpg"), \
@@ -739,6 +819,106 @@ def test_process_media_rejects_invalid_hud():
         assert dhd.process_media("http://clip", source_type="clip") is None
 
 
+def test_process_media_clip_saves_only_the_best_frame(tmp_path, monkeypatch):
+    # Frames stay decoded in memory through scoring; the winner alone is written,
+    # so the API can still serve it from /images.
+    monkeypatch.setattr(dhd, "TEMP_DIR", tmp_path)
+    frame0 = np.zeros((1080, 1920, 3), np.uint8)
+    sampled = [np.full((1080, 1920, 3), 40, np.uint8), np.full((1080, 1920, 3), 80, np.uint8)]
+    heroes, _ = _heroes_and_info()
+    info = {"frame_index": 2, "frame_path": None, "match_score": 1.0, "detected_colors": {}}
+
+    def score_arriving(frame_paths, debug=False, arriving_frames=None):
+        frame_paths.extend(arriving_frames)
+        return heroes, info
+
+    with patch.object(dhd, "get_clip_details", return_value={"id": "c1", "duration": 30}), \
+         patch.object(dhd, "download_single_frame", return_value=frame0) as single, \
+         patch.object(dhd, "_iter_clip_frames", return_value=iter(sampled)), \
+         patch.object(dhd, "process_frames_for_heroes", side_effect=score_arriving) as scored, \
+         patch.object(dhd, "is_valid_hud", return_value=True), \
+         patch.object(dhd, "extract_team_captains_from_frame", return_value={}) as captains:
+        result = dhd.process_media("http://clip", source_type="clip")
+
+    assert single.call_args.kwargs["return_frame"] is True
+    frames = scored.call_args.args[0]
+    assert len(frames) == 3 and frames[0] is frame0
+    assert captains.call_args.args[0] is sampled[1]
+    saved = result["best_frame_info"]["frame_path"]
+    assert saved == str(tmp_path / "frames" / "c1_best.jpg")
+    assert [p.name for p in (tmp_path / "frames").iterdir()] == ["c1_best.jpg"]
+    assert int(cv2.imread(saved).mean()) in range(75, 86)
+
+
+def test_process_frames_reports_no_path_for_in_memory_frames():
+    frame = np.zeros((1080, 1920, 3), np.uint8)
+    with patch.object(dhd, "detect_hero_color_bars", return_value=(1.0, {})), \
+         patch.object(dhd, "process_frame_for_heroes", return_value=[]) as pf:
+        _, info = dhd.process_frames_for_heroes([frame])
+    assert pf.call_args.args[0] is frame
+    assert info["frame_index"] == 0 and info["frame_path"] is None
+
+
+def test_process_frames_scores_arriving_frames_before_waiting_for_the_rest():
+    frame0 = np.zeros((4, 4, 3), np.uint8)
+    arrived = [np.full((4, 4, 3), v, np.uint8) for v in (1, 2, 3)]
+    pulled = []
+
+    def arriving():
+        try:
+            for frame in arrived:
+                pulled.append(frame)
+                yield frame
+        finally:
+            pulled.append("closed")
+
+    scores = {0: 0.5, 1: 0.8, 2: 1.0, 3: 0.9}
+    frame_paths = [frame0]
+    with patch.object(dhd, "detect_hero_color_bars", side_effect=lambda f, *a, **k: (scores[int(f[0, 0, 0])], {})), \
+         patch.object(dhd, "process_frame_for_heroes", return_value=[]) as pf:
+        _, info = dhd.process_frames_for_heroes(frame_paths, arriving_frames=arriving())
+    # The perfect match stops the scan: the third frame is never pulled and the
+    # sampler is closed, so its remaining fetches are dropped.
+    assert pulled == [arrived[0], arrived[1], "closed"]
+    assert info["frame_index"] == 2 and frame_paths[2] is arrived[1]
+    assert pf.call_args.args[0] is arrived[1]
+
+
+def test_process_frames_falls_back_to_frames_in_hand_after_arrivals():
+    frame0 = np.zeros((4, 4, 3), np.uint8)
+    frame_paths = [frame0]
+    late = np.full((4, 4, 3), 1, np.uint8)
+    with patch.object(dhd, "detect_hero_color_bars", side_effect=lambda f, *a, **k: (0.9 if f is frame0 else 0.7, {})), \
+         patch.object(dhd, "process_frame_for_heroes", return_value=[]):
+        _, info = dhd.process_frames_for_heroes(frame_paths, arriving_frames=iter([late]))
+    assert info["frame_index"] == 0 and len(frame_paths) == 2
+
+
+def test_iter_clip_frames_yields_in_completion_order(monkeypatch):
+    frames = {t: np.full((4, 4, 3), t, np.uint8) for t in (0, 14, 28)}
+    monkeypatch.setattr(dhd, "sample_clip_keyframes", lambda details, interval: ((t, frames[t]) for t in (28, 0, 14)))
+    monkeypatch.setattr(dhd, "download_clip", lambda details: pytest.fail("downloaded the clip"))
+    out = list(dhd._iter_clip_frames({"duration": 60}, count=4))
+    assert [f[0, 0, 0] for f in out] == [28, 0, 14]
+
+
+def test_iter_clip_frames_falls_back_and_never_raises(monkeypatch):
+    seen = _stub_frame_sampling(monkeypatch, ["/tmp/f1.jpg"])
+    assert list(dhd._iter_clip_frames({"duration": 60}, count=8)) == ["/tmp/f1.jpg"]
+    assert seen["interval"] == 7
+
+    def no_download(details):
+        raise RuntimeError("clip gone")
+
+    monkeypatch.setattr(dhd, "download_clip", no_download)
+    assert list(dhd._iter_clip_frames({"duration": 60}, count=8)) == []
+
+
+def test_load_image_passes_decoded_frames_through():
+    frame = np.zeros((4, 4, 3), np.uint8)
+    assert dhd.load_image(frame) is frame
+
+
 # --------------------------------------------------------------------------- #
 # process_media pick-screen fallback (colour gate failed, top bar readable)
 # --------------------------------------------------------------------------- #
@@ -855,6 +1035,259 @@ def test_get_top_hero_matches_ranks_matching_template_first(monkeypatch):
     assert matches[0]["match_score"] > inverted_score + 0.5  # clearly discriminative
 
 
+def _random_heroes_data(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {"id": i, "name": f"npc_{i}", "localized_name": f"Hero{i}",
+         "variants": [{"variant": "base",
+                       "cached_template": cv2.GaussianBlur(
+                           rng.integers(0, 256, (72, 128, 3), dtype=np.uint8), (5, 5), 0)}]}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("border_size", [0, 20])
+def test_template_stack_matches_per_template_scores(border_size):
+    # The batched stack must reproduce what match_template scores one call at a time.
+    heroes_data = _random_heroes_data(6)
+    icon = heroes_data[3]["variants"][0]["cached_template"] // 2 + 40
+    stack = dhd.TemplateStack(heroes_data, border_size=border_size)
+    scores = stack.score(icon)
+
+    for (hero_id, name, localized, variant), score, template in zip(stack.entries, scores, stack.templates):
+        args = (icon, template, {}, variant, hero_id, name, localized)
+        expected = dhd.match_template(args + (border_size,) if border_size else args)
+        assert score == pytest.approx(expected["match_score"], abs=1e-5)
+    assert stack.entries[int(np.argmax(scores))][0] == 3
+
+
+def test_template_stack_shares_spectra_through_a_mapped_file(tmp_path):
+    heroes_data = _random_heroes_data(6)
+    icon = heroes_data[3]["variants"][0]["cached_template"] // 2 + 40
+    private = dhd.TemplateStack(heroes_data, apply_blur=True, border_size=20)
+    shared = dhd.TemplateStack(heroes_data, apply_blur=True, border_size=20, spectra_dir=tmp_path)
+    assert isinstance(shared._spectra, np.memmap) and not shared._spectra.flags.writeable
+    assert np.allclose(shared.score(icon), private.score(icon), atol=1e-6)
+    assert shared.nbytes < private.nbytes - private._spectra.nbytes + 1
+
+    # A second process maps the same file instead of transforming the templates again.
+    (spectra_file,) = tmp_path.glob("templates_spectra_blur_b20_*.npy")
+    with patch.object(dhd.np.fft, "rfft2", wraps=np.fft.rfft2) as rfft2:
+        again = dhd.TemplateStack(heroes_data, apply_blur=True, border_size=20, spectra_dir=tmp_path)
+    assert all(call.args[0].shape == (1, 1) for call in rfft2.call_args_list)
+    assert again._spectra.filename == str(spectra_file)
+
+    # New templates get a new file; the stale one for the same config is removed.
+    dhd.TemplateStack(_random_heroes_data(5), apply_blur=True, border_size=20, spectra_dir=tmp_path)
+    remaining = list(tmp_path.glob("templates_spectra_blur_b20_*.npy"))
+    assert len(remaining) == 1 and remaining[0] != spectra_file
+
+
+def test_template_stack_skips_missing_templates_and_zero_energy():
+    heroes_data = _random_heroes_data(2)
+    heroes_data[0]["variants"].append({"variant": "alt", "cached_template": None})
+    stack = dhd.TemplateStack(heroes_data)
+    assert len(stack) == 2
+    # A black icon has no energy, which OpenCV scores as 0 rather than NaN.
+    assert list(stack.score(np.zeros((72, 128, 3), np.uint8))) == [0.0, 0.0]
+
+
+@pytest.mark.parametrize("border_size", [0, 20])
+def test_compact_template_stack_matches_grayscale_scores_in_less_memory(border_size):
+    heroes_data = _random_heroes_data(6)
+    icon = heroes_data[3]["variants"][0]["cached_template"] // 2 + 40
+    full = dhd.TemplateStack(heroes_data, border_size=border_size, compact=False)
+    compact = dhd.TemplateStack(heroes_data, border_size=border_size, compact=True)
+    assert compact.templates.shape == full.templates.shape[:3]
+    assert compact.nbytes < full.nbytes / 2
+
+    # Compact scores are TM_CCORR_NORMED on grayscale planes.
+    gray_icon = cv2.cvtColor(icon, cv2.COLOR_BGR2GRAY)
+    for score, template in zip(compact.score(icon), compact.templates):
+        expected = cv2.minMaxLoc(cv2.matchTemplate(template, gray_icon, cv2.TM_CCORR_NORMED))[1]
+        assert score == pytest.approx(expected, abs=1e-4)
+    assert compact.entries[int(np.argmax(compact.score(icon)))][0] == 3
+    assert list(compact.shortlist(icon, 10)) == list(full.shortlist(icon, 10))
+
+
+def test_template_storage_report_compares_layouts(monkeypatch):
+    heroes_data = _random_heroes_data(4)
+    icons = [(team, pos, heroes_data[pos]["variants"][0]["cached_template"])
+             for team in ("Radiant", "Dire") for pos in range(4)]
+    monkeypatch.setattr(dhd, "load_heroes_data", lambda: heroes_data)
+    monkeypatch.setattr(dhd, "load_image", lambda path: np.zeros((1080, 1920, 3), np.uint8))
+    monkeypatch.setattr(dhd, "extract_hero_bar", lambda frame: (True, frame, 960))
+    monkeypatch.setattr(dhd, "extract_hero_icons", lambda top_bar, center_x: icons)
+    monkeypatch.setattr(dhd, "_standardize_hero_icon", lambda icon, apply_blur: icon)
+
+    report = dhd.template_storage_report(["frame.jpg"])
+    assert report["path"] == "picking"
+    assert (report["frames"], report["slots"], report["templates"]) == (1, 8, 4)
+    assert report["bytes"]["compact"] < report["bytes"]["full"]
+    assert report["top1_agreement"] == 1.0
+    assert set(report["seconds_per_slot"]) == {"full", "compact"}
+
+
+def test_cascade_shortlist_keeps_top_match_and_limits_full_scoring(monkeypatch):
+    monkeypatch.delenv("APPLY_BLUR", raising=False)
+    monkeypatch.setenv("ADD_BORDER", "1")
+    heroes_data = _random_heroes_data(12)
+    # Standardized icon of hero 5's portrait (crop_hero_portrait expects the 108x66 slot).
+    template = heroes_data[5]["variants"][0]["cached_template"]
+    icon = cv2.resize(template, (46, 40))
+    icon = cv2.copyMakeBorder(icon, 0, 26, 26, 36, cv2.BORDER_CONSTANT, value=[0, 0, 0])
+
+    monkeypatch.setattr(dhd, "CASCADE_TOP_K", 0)
+    full = dhd.get_top_hero_matches(icon, heroes_data, top_n=20, min_score=-1.0)
+    monkeypatch.setattr(dhd, "CASCADE_TOP_K", 3)
+    cascade = dhd.get_top_hero_matches(icon, heroes_data, top_n=20, min_score=-1.0)
+
+    assert len(full) == 12 and len(cascade) == 3
+    assert cascade[0]["hero_id"] == full[0]["hero_id"] == 5
+    assert cascade[0]["match_score"] == pytest.approx(full[0]["match_score"])
+
+
+def test_template_stack_scores_subset_by_index():
+    heroes_data = _random_heroes_data(5)
+    stack = dhd.TemplateStack(heroes_data, border_size=20)
+    icon = heroes_data[2]["variants"][0]["cached_template"]
+    full = stack.score(icon)
+    assert np.allclose(stack.score(icon, np.array([1, 3])), full[[1, 3]])
+    assert 2 in stack.shortlist(icon, 2)
+    assert list(stack.shortlist(icon, 10)) == [0, 1, 2, 3, 4]
+
+
+def _colored_portrait(bgr, seed):
+    # Distinct colour + a distinct light/dark layout so both descriptor halves differ.
+    rng = np.random.default_rng(seed)
+    img = np.zeros((72, 128, 3), np.uint8)
+    img[:] = bgr
+    for _ in range(4):
+        y, x = rng.integers(0, 56), rng.integers(0, 112)
+        img[y:y + 16, x:x + 16] = 255 - np.array(bgr, np.uint8)
+    return img
+
+
+def test_descriptor_index_ranks_heroes_by_best_variant():
+    colors = [(200, 30, 30), (30, 200, 30), (30, 30, 200), (200, 200, 30)]
+    heroes_data = [
+        {"id": i, "name": f"npc_{i}", "localized_name": f"Hero{i}",
+         "variants": [{"variant": "base", "cached_template": _colored_portrait(c, i)}]}
+        for i, c in enumerate(colors)
+    ]
+    # A second variant of hero 1 that looks like hero 2: hero 1 must only be listed once.
+    heroes_data[1]["variants"].append({"variant": "alt", "cached_template": _colored_portrait(colors[2], 2)})
+    index = dhd.HeroDescriptorIndex.from_heroes_data(heroes_data)
+    assert len(index) == 5
+
+    candidates = index.query(_colored_portrait(colors[3], 3), top_heroes=4)
+    assert candidates[0] == 3
+    assert sorted(candidates) == [0, 1, 2, 3]
+    assert index.query(_colored_portrait(colors[3], 3), top_heroes=2)[0] == 3
+    assert len(index.query(_colored_portrait(colors[3], 3), top_heroes=2)) == 2
+
+
+def test_descriptor_index_recalls_blurred_icons_when_built_with_the_same_blur():
+    # Pairs of same-tint heroes: a textured portrait and a smooth one. A blurred icon of
+    # the textured hero drifts towards the smooth one unless the index is blurred too.
+    rng = np.random.default_rng(1)
+    heroes_data = []
+    for i in range(10):
+        tint = rng.integers(40, 216, 3)
+        textured = np.clip(tint + rng.normal(0, 60, (72, 128, 3)), 0, 255).astype(np.uint8)
+        smooth = cv2.GaussianBlur(np.clip(tint + rng.normal(0, 60, (72, 128, 3)), 0, 255).astype(np.uint8), (5, 5), 0)
+        for hero_id, template in ((2 * i, textured), (2 * i + 1, smooth)):
+            heroes_data.append({"id": hero_id, "name": f"npc_{hero_id}", "localized_name": str(hero_id),
+                                "variants": [{"variant": "base", "cached_template": template}]})
+    icons = [(hero["id"], cv2.GaussianBlur(np.clip(hero["variants"][0]["cached_template"].astype(int)
+                                                   + rng.integers(-6, 7, (72, 128, 3)), 0, 255).astype(np.uint8),
+                                           (5, 5), 0))
+             for hero in heroes_data if hero["id"] % 2 == 0]
+
+    blurred = dhd.HeroDescriptorIndex.from_heroes_data(heroes_data, apply_blur=True)
+    raw = dhd.HeroDescriptorIndex.from_heroes_data(heroes_data)
+    assert all(blurred.query(icon, 1) == [hero_id] for hero_id, icon in icons)
+
+    def true_similarity(index):
+        return np.mean([index._descriptors[hero_id] @ dhd._compact_descriptor(icon) for hero_id, icon in icons])
+    assert true_similarity(blurred) > true_similarity(raw)
+
+
+def test_get_top_hero_matches_restricts_to_candidate_heroes(monkeypatch):
+    monkeypatch.delenv("ADD_BORDER", raising=False)
+    monkeypatch.delenv("APPLY_BLUR", raising=False)
+    heroes_data = _random_heroes_data(6)
+    icon = np.full((66, 108, 3), 90, np.uint8)
+
+    explicit = dhd.get_top_hero_matches(icon, heroes_data, top_n=10, min_score=-1.0, hero_ids=[1, 4])
+    assert sorted(m["hero_id"] for m in explicit) == [1, 4]
+
+    # With DESCRIPTOR_CANDIDATE_HEROES set, the descriptor index supplies the candidates.
+    monkeypatch.setattr(dhd, "DESCRIPTOR_CANDIDATE_HEROES", 2)
+    monkeypatch.setattr(dhd, "_DESCRIPTOR_INDEX", None)
+    with patch.object(dhd.HeroDescriptorIndex, "query", return_value=[5, 0]) as query:
+        queried = dhd.get_top_hero_matches(icon, heroes_data, top_n=10, min_score=-1.0)
+    query.assert_called_once()
+    assert sorted(m["hero_id"] for m in queried) == [0, 5]
+    assert dhd.get_top_hero_matches(icon, heroes_data, min_score=-1.0, hero_ids=[]) == []
+
+
+def test_get_template_stack_reuses_stack_per_data_and_config(monkeypatch):
+    monkeypatch.setattr(dhd, "_TEMPLATE_STACK", None)
+    heroes_data = _random_heroes_data(2)
+    stack = dhd.get_template_stack(heroes_data, border_size=20)
+    assert dhd.get_template_stack(heroes_data, border_size=20) is stack
+    assert dhd.get_template_stack(heroes_data, apply_blur=True, border_size=20) is not stack
+    assert dhd.get_template_stack(_random_heroes_data(2), apply_blur=True, border_size=20) is not stack
+
+
+# --------------------------------------------------------------------------- #
+# Roster fast path (hero_slot_fingerprints / verify_known_roster)
+# --------------------------------------------------------------------------- #
+def _slot_icon(template):
+    # A 108x66 slot whose crop_hero_portrait region is the (shrunk) template.
+    icon = cv2.resize(template, (46, 40))
+    return cv2.copyMakeBorder(icon, 0, 26, 26, 36, cv2.BORDER_CONSTANT, value=[0, 0, 0])
+
+
+def _mock_bar(monkeypatch, heroes_data, slot_heroes):
+    icons = [(team, pos, _slot_icon(heroes_data[hero_id]["variants"][0]["cached_template"]))
+             for (team, pos), hero_id in slot_heroes.items()]
+    monkeypatch.setattr(dhd, "load_heroes_data", lambda: heroes_data)
+    monkeypatch.setattr(dhd, "extract_hero_bar", lambda frame: (True, frame, 960))
+    monkeypatch.setattr(dhd, "extract_hero_icons", lambda top_bar, center_x: icons)
+
+
+def test_verify_known_roster_matches_only_known_heroes(monkeypatch):
+    monkeypatch.delenv("APPLY_BLUR", raising=False)
+    monkeypatch.setenv("ADD_BORDER", "1")
+    heroes_data = _random_heroes_data(12)
+    frame = np.zeros((1080, 1920, 3), np.uint8)
+    slots = {("Radiant", 0): 2, ("Radiant", 1): 5, ("Dire", 0): 7, ("Dire", 1): 9}
+    _mock_bar(monkeypatch, heroes_data, slots)
+    roster = [{"team": team, "position": pos, "hero_id": hero_id, "player_name": f"p{hero_id}",
+               "match_score": 0.5} for (team, pos), hero_id in slots.items()]
+    fingerprints = dhd.hero_slot_fingerprints(frame)
+    assert set(fingerprints) == set(slots)
+
+    with patch.object(dhd, "get_top_hero_matches", wraps=dhd.get_top_hero_matches) as matcher:
+        verified = dhd.verify_known_roster(frame, roster, fingerprints)
+    assert [(h["team"], h["position"], h["hero_id"]) for h in verified] == [
+        ("Radiant", 0, 2), ("Radiant", 1, 5), ("Dire", 0, 7), ("Dire", 1, 9)]
+    assert all(h["player_name"] == f"p{h['hero_id']}" and h["match_score"] > 0.9 for h in verified)
+    assert {tuple(c.kwargs["hero_ids"]) for c in matcher.call_args_list} == {(2, 5, 7, 9)}
+
+    # A slot that now shows a different hero fails the fingerprint check.
+    _mock_bar(monkeypatch, heroes_data, {**slots, ("Dire", 1): 3})
+    assert dhd.verify_known_roster(frame, roster, fingerprints) is None
+    # A roster whose hero no longer matches its slot fails verification.
+    _mock_bar(monkeypatch, heroes_data, slots)
+    swapped = [dict(h, hero_id=5 if h["hero_id"] == 2 else 2 if h["hero_id"] == 5 else h["hero_id"])
+               for h in roster]
+    assert dhd.verify_known_roster(frame, swapped, fingerprints) is None
+    assert dhd.verify_known_roster(frame, [], fingerprints) is None
+
+
 # --------------------------------------------------------------------------- #
 # load_heroes_data (precompute + singleton)
 # --------------------------------------------------------------------------- #
@@ -866,16 +1299,242 @@ def test_load_heroes_data_precomputes_and_caches(tmp_path, monkeypatch):
         {"id": 7, "name": "npc_dota_hero_axe", "localized_name": "Axe",
          "variants": [{"variant": "base", "image_path": str(portrait)}]}
     ]))
-    cache = tmp_path / "templates_cache.npz"
+    cache = tmp_path / "templates_cache.npy"
     monkeypatch.setattr(dhd, "HEROES_FILE", heroes_file)
     monkeypatch.setattr(dhd, "TEMPLATES_CACHE_FILE", cache)
 
     data = dhd.load_heroes_data()
-    assert data[0]["variants"][0]["cached_template"] is not None
+    template = data[0]["variants"][0]["cached_template"]
+    assert template is not None and template.shape == (72, 128, 3)
     assert cache.exists()  # precomputed cache written
+    manifest = json.loads((tmp_path / "templates_cache.json").read_text())
+    assert [entry["key"] for entry in manifest["entries"]] == [str(portrait)]
+    assert manifest["entries"][0]["sha1"] == hashlib.sha1(portrait.read_bytes()).hexdigest()
+    assert manifest["shape"] == [1, 72, 128, 3]
+    # Served from the read-only memory-mapped array, not a private copy.
+    assert isinstance(template, np.memmap) and not template.flags.writeable
     # singleton: second call returns the same object without recomputing
     assert dhd.load_heroes_data() is data
 
+    # A fresh process maps the cache without recomputing any template.
+    dhd._LOADED_HEROES_DATA = None
+    with patch.object(dhd, "_compute_cached_template", side_effect=AssertionError("recomputed")):
+        reloaded = dhd.load_heroes_data()
+    assert np.array_equal(reloaded[0]["variants"][0]["cached_template"], template)
+
+
+def test_load_heroes_data_rebuilds_cache_for_new_roster(tmp_path, monkeypatch):
+    portrait = tmp_path / "7_base.png"
+    cv2.imwrite(str(portrait), np.full((72, 108, 3), 80, np.uint8))
+    heroes = [{"id": 7, "name": "npc_dota_hero_axe", "localized_name": "Axe",
+               "variants": [{"variant": "base", "image_path": str(portrait)}]}]
+    heroes_file = tmp_path / "hero_data.json"
+    heroes_file.write_text(json.dumps(heroes))
+    monkeypatch.setattr(dhd, "HEROES_FILE", heroes_file)
+    monkeypatch.setattr(dhd, "TEMPLATES_CACHE_FILE", tmp_path / "templates_cache.npy")
+    dhd.load_heroes_data()
+    old_digest = json.loads((tmp_path / "templates_cache.json").read_text())["roster_digests"]["picking"]
+
+    # The roster changed (new hero): the signature marks the cache stale, but the
+    # unchanged portrait is reused by content hash and only the new one is computed.
+    other = tmp_path / "8_base.png"
+    cv2.imwrite(str(other), np.full((72, 108, 3), 160, np.uint8))
+    heroes.append({"id": 8, "name": "npc_dota_hero_bane", "localized_name": "Bane",
+                   "variants": [{"variant": "base", "image_path": str(other)}]})
+    heroes_file.write_text(json.dumps(heroes))
+    dhd._LOADED_HEROES_DATA = None
+    with patch.object(dhd, "_compute_cached_template", wraps=dhd._compute_cached_template) as compute:
+        data = dhd.load_heroes_data()
+    assert [c.args[0] for c in compute.call_args_list] == [str(other)]
+
+    manifest = json.loads((tmp_path / "templates_cache.json").read_text())
+    assert manifest["roster_digests"]["picking"] != old_digest
+    assert [entry["key"] for entry in manifest["entries"]] == [str(portrait), str(other)]
+    assert all(v["cached_template"] is not None for h in data for v in h["variants"])
+
+
+def test_load_heroes_data_recomputes_only_changed_images(tmp_path, monkeypatch):
+    paths = [tmp_path / f"{hero_id}_base.png" for hero_id in (7, 8)]
+    for shade, path in zip((80, 160), paths):
+        cv2.imwrite(str(path), np.full((72, 108, 3), shade, np.uint8))
+    heroes_file = tmp_path / "hero_data.json"
+    heroes_file.write_text(json.dumps([
+        {"id": hero_id, "name": f"npc_dota_hero_{hero_id}", "localized_name": str(hero_id),
+         "variants": [{"variant": "base", "image_path": str(path)}]}
+        for hero_id, path in zip((7, 8), paths)
+    ]))
+    monkeypatch.setattr(dhd, "HEROES_FILE", heroes_file)
+    monkeypatch.setattr(dhd, "TEMPLATES_CACHE_FILE", tmp_path / "templates_cache.npy")
+    dhd.load_heroes_data()
+
+    # A patch redraws one portrait in place; the roster itself is unchanged.
+    cv2.imwrite(str(paths[1]), np.full((72, 108, 3), 220, np.uint8))
+    dhd._LOADED_HEROES_DATA = None
+    with patch.object(dhd, "_compute_cached_template", wraps=dhd._compute_cached_template) as compute:
+        data = dhd.load_heroes_data()
+    assert [c.args[0] for c in compute.call_args_list] == [str(paths[1])]
+    assert int(data[1]["variants"][0]["cached_template"].mean()) > 200
+
+    # Re-downloading identical bytes (new mtime) after invalidation costs a hash, not a decode.
+    paths[0].write_bytes(paths[0].read_bytes())
+    with patch.object(dota_heroes, "ASSETS_DIR", tmp_path):
+        dota_heroes.invalidate_template_cache()
+    dhd._LOADED_HEROES_DATA = None
+    with patch.object(dhd, "_compute_cached_template", side_effect=AssertionError("recomputed")):
+        data = dhd.load_heroes_data()
+    assert all(v["cached_template"] is not None for h in data for v in h["variants"])
+    assert "picking" in json.loads((tmp_path / "templates_cache.json").read_text())["roster_digests"]
+
+
+def test_load_heroes_data_warm_start_with_broken_image_is_read_only(tmp_path, monkeypatch):
+    good, broken = tmp_path / "7_base.png", tmp_path / "8_base.png"
+    cv2.imwrite(str(good), np.full((72, 108, 3), 80, np.uint8))
+    broken.write_bytes(b"not a png")
+    heroes_file = tmp_path / "hero_data.json"
+    heroes_file.write_text(json.dumps([
+        {"id": hero_id, "name": f"npc_dota_hero_{hero_id}", "localized_name": str(hero_id),
+         "variants": [{"variant": "base", "image_path": str(path)}]}
+        for hero_id, path in ((7, good), (8, broken))
+    ]))
+    monkeypatch.setattr(dhd, "HEROES_FILE", heroes_file)
+    monkeypatch.setattr(dhd, "TEMPLATES_CACHE_FILE", tmp_path / "templates_cache.npy")
+    dhd.load_heroes_data()
+    manifest = json.loads((tmp_path / "templates_cache.json").read_text())
+    assert [entry["key"] for entry in manifest["failed_entries"]] == [str(broken)]
+
+    dhd._LOADED_HEROES_DATA = None
+    with patch.object(dhd, "_save_template_cache", side_effect=AssertionError("rewritten")), \
+         patch.object(dhd, "_compute_cached_template", side_effect=AssertionError("recomputed")):
+        data = dhd.load_heroes_data()
+    assert data[0]["variants"][0]["cached_template"] is not None
+
+    # After invalidation the broken image is re-hashed but not decoded again.
+    with patch.object(dota_heroes, "ASSETS_DIR", tmp_path):
+        dota_heroes.invalidate_template_cache()
+    dhd._LOADED_HEROES_DATA = None
+    with patch.object(dhd, "_compute_cached_template", side_effect=AssertionError("recomputed")):
+        dhd.load_heroes_data()
+
+
+def test_template_cache_rejects_array_and_manifest_from_different_writers(tmp_path, monkeypatch):
+    monkeypatch.setattr(dhd, "TEMPLATES_CACHE_FILE", tmp_path / "templates_cache.npy")
+    entries = [{"key": "a", "kind": "picking", "sha1": "x", "size": 1, "mtime_ns": 1}]
+    dhd._save_template_cache([np.full((72, 128, 3), 10, np.uint8)], entries, {"picking": "r"})
+    first_manifest = (tmp_path / "templates_cache.json").read_bytes()
+    manifest, templates = dhd._read_template_cache()
+    assert manifest is not None and int(templates[0, 0, 0, 0]) == 10
+
+    # Another process's array lands, but our manifest is replaced last.
+    dhd._save_template_cache([np.full((72, 128, 3), 99, np.uint8)], entries, {"picking": "r"})
+    (tmp_path / "templates_cache.json").write_bytes(first_manifest)
+    assert dhd._read_template_cache() == (None, None)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_template_cache_writers_use_private_temp_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(dhd, "TEMPLATES_CACHE_FILE", tmp_path / "templates_cache.npy")
+    temp_names = []
+    real_mkstemp = dhd.tempfile.mkstemp
+
+    def recording_mkstemp(**kwargs):
+        fd, name = real_mkstemp(**kwargs)
+        temp_names.append(name)
+        return fd, name
+
+    entries = [{"key": "a", "kind": "picking", "sha1": "x", "size": 1, "mtime_ns": 1}]
+    with patch.object(dhd.tempfile, "mkstemp", side_effect=recording_mkstemp):
+        threads = [threading.Thread(target=dhd._save_template_cache,
+                                    args=([np.full((72, 128, 3), shade, np.uint8)], entries, {}))
+                   for shade in (10, 99)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert len(set(temp_names)) == 4
+    manifest, templates = dhd._read_template_cache()
+    if manifest is not None:  # a consistent pair, never a mix
+        assert int(templates[0, 0, 0, 0]) in (10, 99)
+
+
+def test_load_heroes_data_builds_frozen_template_bank(tmp_path, monkeypatch):
+    portrait = tmp_path / "7_base.png"
+    cv2.imwrite(str(portrait), np.full((72, 108, 3), 80, np.uint8))
+    heroes_file = tmp_path / "hero_data.json"
+    heroes_file.write_text(json.dumps([
+        {"id": 7, "name": "npc_dota_hero_axe", "localized_name": "Axe",
+         "variants": [{"variant": "base", "image_path": str(portrait)}]}
+    ]))
+    monkeypatch.setattr(dhd, "HEROES_FILE", heroes_file)
+    monkeypatch.setattr(dhd, "TEMPLATES_CACHE_FILE", tmp_path / "templates_cache.npy")
+    monkeypatch.delenv("ADD_BORDER", raising=False)
+    monkeypatch.delenv("APPLY_BLUR", raising=False)
+
+    data = dhd.load_heroes_data()
+    bank = dhd._TEMPLATE_BANK
+    # The process_media config plus the one the environment currently selects.
+    assert set(bank.configs) == {(True, 20), (False, 0)}
+    stack = bank.get(True, 20)
+    assert stack.templates.shape == (1, 112, 168, 3)
+    # The descriptor index is built alongside the stacks.
+    assert dhd.get_hero_descriptor_index(data, True) is bank.index(True) and len(bank.index(True)) == 1
+    assert not stack.templates.flags.writeable
+
+    # The hot path reads the prebuilt stack instead of re-preprocessing templates.
+    with patch.object(dhd, "TemplateStack", side_effect=AssertionError("rebuilt")):
+        assert dhd.get_template_stack(data, apply_blur=True, border_size=20) is stack
+        monkeypatch.setenv("ADD_BORDER", "1")
+        monkeypatch.setenv("APPLY_BLUR", "1")
+        matches = dhd.get_top_hero_matches(np.full((66, 108, 3), 80, np.uint8), data, min_score=0.0)
+    assert matches[0]["hero_id"] == 7
+
+
+# --------------------------------------------------------------------------- #
+# shared matching executor
+# --------------------------------------------------------------------------- #
+def test_get_match_executor_is_shared(monkeypatch):
+    monkeypatch.setattr(dhd, "_MATCH_EXECUTOR", None)
+    monkeypatch.setattr(dhd, "MATCH_WORKERS", 2)
+    executor = dhd.get_match_executor()
+    try:
+        assert dhd.get_match_executor() is executor
+        assert executor._max_workers == 2
+    finally:
+        executor.shutdown()
+
+
+def test_match_hero_slots_spreads_slots_over_the_pool_in_order(monkeypatch):
+    monkeypatch.setattr(dhd, "_MATCH_EXECUTOR", None)
+    monkeypatch.setattr(dhd, "MATCH_WORKERS", 4)
+    slots = [("Radiant", i, i) for i in range(5)] + [("Dire", i, 10 + i) for i in range(5)]
+    threads = set()
+    barrier = threading.Barrier(4, timeout=5)
+
+    def match_slot(team, position, icon):
+        threads.add(threading.get_ident())
+        if icon < 4:
+            barrier.wait()  # the first four slots must run at the same time
+        return (team, position, icon * 2)
+
+    try:
+        results = dhd.match_hero_slots(slots, match_slot)
+    finally:
+        dhd._MATCH_EXECUTOR.shutdown()
+    assert results == [(t, p, icon * 2) for t, p, icon in slots]
+    assert len(threads) == 4 and threading.get_ident() not in threads
+
+
+def test_match_hero_slots_runs_inline_inside_a_matching_job(monkeypatch):
+    monkeypatch.setattr(dhd, "_MATCH_EXECUTOR", None)
+    monkeypatch.setattr(dhd, "MATCH_WORKERS", 1)
+    slots = [("Radiant", i, i) for i in range(3)]
+    try:
+        # With one worker, waiting on the pool from inside it would never return.
+        nested = dhd.get_match_executor().submit(
+            dhd.match_hero_slots, slots, lambda team, position, icon: icon + 1)
+        assert nested.result(timeout=5) == [1, 2, 3]
+    finally:
+        dhd._MATCH_EXECUTOR.shutdown()
+
 
 # --------------------------------------------------------------------------- #
 # process_frame_for_heroes
@@ -959,6 +1618,37 @@ def test_detect_color_bars_matches_when_colors_present():
     assert score >= 0.5  # the 5 Radiant bars match
 
 
+def test_color_bar_similarities_match_per_slot_loop():
+    # The vectorized gate must agree with sampling each slot's bar separately.
+    frame = np.random.default_rng(3).integers(0, 256, (1080, 1920, 3), dtype=np.uint8)
+    sims, rgb = dhd.color_bar_similarities(frame, _EXPECTED_COLORS)
+    center_x = 1920 // 2
+    pitch = dhd.HERO_WIDTH + dhd.HERO_GAP
+    xs = [center_x - dhd.CLOCK_LEFT_EXTEND - (5 - i) * pitch for i in range(5)]
+    xs += [center_x + dhd.CLOCK_RIGHT_EXTEND + i * pitch for i in range(5)]
+    for slot, ((team, pos), x) in enumerate(zip(dhd._COLOR_BAR_SLOTS, xs)):
+        mid = x + dhd.HERO_WIDTH // 2
+        b, g, r = (int(c) for c in cv2.mean(frame[0:dhd.HERO_TOP_PADDING, mid - 10:mid + 10])[:3])
+        hexv = _EXPECTED_COLORS[team][pos].lstrip("#")
+        expected = [int(hexv[j:j+2], 16) for j in (0, 2, 4)]
+        dist = np.sqrt(sum((a - e) ** 2 for a, e in zip((r, g, b), expected)))
+        assert tuple(rgb[slot]) == (r, g, b)
+        assert sims[slot] == pytest.approx(1 - dist / 442)
+
+
+def test_detect_color_bars_accepts_top_rows_only():
+    frame = np.zeros((1080, 1920, 3), np.uint8)
+    for slot, cols in enumerate(dhd._color_bar_sample_columns(1920)):
+        team, pos = dhd._COLOR_BAR_SLOTS[slot]
+        hexv = _EXPECTED_COLORS[team][pos].lstrip("#")
+        frame[0:dhd.HERO_TOP_PADDING, cols] = [int(hexv[j:j+2], 16) for j in (4, 2, 0)]
+    full_score, full_colors = dhd.detect_hero_color_bars(frame, _EXPECTED_COLORS)
+    strip_score, strip_colors = dhd.detect_hero_color_bars(
+        frame[:dhd.HERO_TOP_PADDING], _EXPECTED_COLORS)
+    assert full_score == strip_score == 1.0
+    assert strip_colors == full_colors
+
+
 # --------------------------------------------------------------------------- #
 # isFrameDraft / processDraft
 # --------------------------------------------------------------------------- #
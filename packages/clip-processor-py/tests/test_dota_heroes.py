@@ -103,7 +103,7 @@ def test_get_hero_list_uses_valve_roster_and_spectral_alticons():
         }
     }
     with patch.object(
-        dota_heroes.requests,
+        dota_heroes.http_client,
         "get",
         side_effect=[
             FakeJsonResponse(valve_response),
@@ -166,7 +166,7 @@ def test_get_hero_data_refreshes_missing_remote_hero_and_missing_variants():
              patch.object(dota_heroes, "download_hero_abilities", return_value={}), \
              patch.object(dota_heroes, "get_hero_list", return_value=current_heroes), \
              patch.object(dota_heroes.requests, "Session", return_value=_probe_session(set())), \
-             patch.object(dota_heroes.requests, "get", return_value=FakeImageResponse()):
+             patch.object(dota_heroes.http_client, "get", return_value=FakeImageResponse()):
             refreshed = dota_heroes.get_hero_data(refresh=True)
 
         hero_ids = {h["id"] for h in refreshed}
@@ -246,6 +246,38 @@ def test_roster_signature_changes_when_variant_path_changes():
     assert sig_a != sig_b
 
 
+def test_roster_digest_tracks_signature():
+    hero = {"id": 5, "name": "npc_dota_hero_crystal_maiden", "tag": "crystal_maiden",
+            "localized_name": "Crystal Maiden",
+            "variants": [{"variant": "base", "image_path": "/a/5_base.png"}]}
+    moved = dict(hero, variants=[{"variant": "base", "image_path": "/b/5_base.png"}])
+    # Fields outside the signature (e.g. abilities) don't change the digest.
+    with_abilities = dict(hero, abilities=["frostbite"])
+    digest = dota_heroes.hero_roster_digest([hero])
+    assert digest == dota_heroes.hero_roster_digest([with_abilities])
+    assert digest != dota_heroes.hero_roster_digest([moved])
+    assert len(digest) == 64
+
+
+def test_invalidate_template_cache_marks_manifest_stale_and_removes_legacy_cache(tmp_path):
+    (tmp_path / "templates_cache.npy").write_bytes(b"array")
+    (tmp_path / "templates_cache.json").write_text(json.dumps({"roster_digests": {"picking": "abc"}, "entries": []}))
+    (tmp_path / "templates_cache.npz").write_bytes(b"stale")
+    with patch.object(dota_heroes, "ASSETS_DIR", tmp_path):
+        dota_heroes.invalidate_template_cache()
+    # The array stays as a reuse pool; only the roster digests are cleared.
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["templates_cache.json", "templates_cache.npy"]
+    assert json.loads((tmp_path / "templates_cache.json").read_text()) == {"roster_digests": {}, "entries": []}
+
+
+def test_invalidate_template_cache_removes_unreadable_manifest(tmp_path):
+    (tmp_path / "templates_cache.npy").write_bytes(b"array")
+    (tmp_path / "templates_cache.json").write_text("{not json")
+    with patch.object(dota_heroes, "ASSETS_DIR", tmp_path):
+        dota_heroes.invalidate_template_cache()
+    assert list(tmp_path.iterdir()) == []
+
+
 # --------------------------------------------------------------------------- #
 # all_variant_images_exist / get_missing_expected_variants
 # --------------------------------------------------------------------------- #
@@ -397,7 +429,7 @@ def test_get_hero_data_downloads_discovered_variant_and_persists_marker():
              patch.object(dota_heroes, "download_hero_abilities", return_value={}), \
              patch.object(dota_heroes, "get_hero_list", return_value=current_heroes), \
              patch.object(dota_heroes.requests, "Session", return_value=_probe_session(existing)), \
-             patch.object(dota_heroes.requests, "get", return_value=FakeImageResponse()):
+             patch.object(dota_heroes.http_client, "get", return_value=FakeImageResponse()):
             refreshed = dota_heroes.get_hero_data(refresh=True)
 
         # Discovered "_alt" portrait was downloaded and recorded.
@@ -416,5 +448,5 @@ def test_get_hero_data_downloads_discovered_variant_and_persists_marker():
 # get_hero_list fallback when every remote source fails
 # --------------------------------------------------------------------------- #
 def test_get_hero_list_returns_empty_when_all_sources_raise():
-    with patch.object(dota_heroes.requests, "get", side_effect=RuntimeError("network down")):
+    with patch.object(dota_heroes.http_client, "get", side_effect=RuntimeError("network down")):
         assert dota_heroes.get_hero_list() == []
@@ -0,0 +1,112 @@
+"""Tests for the shared pooled HTTP client."""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+import http_client
+
+
+@pytest.fixture
+def server():
+    """Keep-alive HTTP server recording each request's client port and peak concurrency."""
+    seen = {"ports": [], "active": 0, "peak": 0, "delay": 0.0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            with lock:
+                seen["ports"].append(self.client_address[1])
+                seen["active"] += 1
+                seen["peak"] = max(seen["peak"], seen["active"])
+            time.sleep(seen["delay"])
+            body = b"x" * 1000
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            with lock:
+                seen["active"] -= 1
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    http_client.close()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", seen
+    http_client.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_requests_to_one_host_reuse_a_connection(server):
+    url, seen = server
+    for _ in range(3):
+        assert http_client.get(f"{url}/a").content == b"x" * 1000
+    assert len(seen["ports"]) == 3
+    assert len(set(seen["ports"])) == 1
+
+
+def test_metrics_count_requests_bytes_and_streamed_bytes(server):
+    url, _seen = server
+    http_client.get(f"{url}/a")
+    response = http_client.get(f"{url}/b", stream=True)
+    assert sum(len(chunk) for chunk in response.iter_content(256)) == 1000
+    stats = http_client.metrics()[url.split("//")[1]]
+    assert stats["requests"] == 2
+    assert stats["errors"] == 0
+    assert stats["bytes"] == 2000
+    assert stats["max_latency_ms"] >= stats["avg_latency_ms"] > 0
+
+
+def test_default_timeout_applied_unless_given(server):
+    url, _seen = server
+    with patch.object(http_client, "HTTP_TIMEOUT", 3.5), \
+         patch("requests.Session.request") as send:
+        send.return_value.content = b""
+        send.return_value.status_code = 200
+        http_client.get(f"{url}/a")
+        http_client.get(f"{url}/a", timeout=1)
+    assert send.call_args_list[0].kwargs["timeout"] == 3.5
+    assert send.call_args_list[1].kwargs["timeout"] == 1
+
+
+def test_concurrency_per_host_is_limited(server):
+    url, seen = server
+    seen["delay"] = 0.05
+    with patch.object(http_client, "HTTP_MAX_CONCURRENT_PER_HOST", 2):
+        threads = [threading.Thread(target=http_client.get, args=(f"{url}/a",)) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert len(seen["ports"]) == 6
+    assert seen["peak"] <= 2
+
+
+def test_transport_errors_are_recorded_and_raised():
+    http_client.close()
+    with pytest.raises(http_client.RequestException):
+        http_client.get("http://127.0.0.1:9/", timeout=1)
+    assert http_client.metrics()["127.0.0.1:9"]["errors"] == 1
+    http_client.close()
+
+
+def test_least_recently_used_hosts_are_closed_beyond_the_limit():
+    http_client.close()
+    with patch.object(http_client, "HTTP_MAX_HOSTS", 2):
+        first = http_client._client_for("https://video-edge-1.example/seg.ts")
+        http_client._client_for("https://video-edge-2.example/seg.ts")
+        http_client._client_for("https://video-edge-1.example/seg.ts")  # refreshes edge-1
+        with patch.object(http_client._clients["video-edge-2.example"].session, "close") as closed:
+            http_client._client_for("https://video-edge-3.example/seg.ts")
+        closed.assert_called_once()
+    assert list(http_client.metrics()) == ["video-edge-1.example", "video-edge-3.example"]
+    assert http_client._client_for("https://video-edge-1.example/x") is first
+    http_client.close()
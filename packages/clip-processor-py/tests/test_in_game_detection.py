@@ -4,6 +4,7 @@ These validate the crop math/bounds derived from tooltips/src/components/TopHud.
 (hero 60x40, 62px pitch, clock +/-102.5, 9deg skew). Template-matching accuracy on
 real footage is a separate calibration step that needs an actual gameplay frame.
 """
+import json
 from unittest.mock import patch
 
 import cv2
@@ -109,6 +110,51 @@ def test_match_in_game_icon_respects_top_n():
     assert len(match_in_game_icon(_solid((40, 0, 0)), templates, top_n=5)) == 5
 
 
+def _textured(seed):
+    rng = np.random.default_rng(seed)
+    return cv2.GaussianBlur(rng.integers(0, 256, (72, 128, 3), dtype=np.uint8), (5, 5), 0)
+
+
+def test_match_in_game_icon_cascade_keeps_best_match():
+    templates = [_bordered_template(i, f"Hero{i}", _textured(i)) for i in range(10)]
+    icon = _textured(6)
+    full = match_in_game_icon(icon, templates, top_n=10, top_k=0)
+    cascade = match_in_game_icon(icon, templates, top_n=10, top_k=3)
+    # Only the shortlist is slid at full resolution, but the winner is unchanged.
+    assert len(full) == 10 and len(cascade) == 3
+    assert cascade[0]["hero_id"] == full[0]["hero_id"] == 6
+    assert cascade[0]["match_score"] == full[0]["match_score"]
+
+
+def test_match_in_game_icon_restricts_to_candidate_heroes(monkeypatch):
+    templates = [_bordered_template(i, f"Hero{i}", _textured(i)) for i in range(6)]
+    results = match_in_game_icon(_textured(2), templates, top_n=6, hero_ids=[2, 4])
+    assert [r["hero_id"] for r in results] == [2, 4]
+
+    # The descriptor index ranks the icon's own hero first.
+    index = dota_hero_detection.get_in_game_descriptor_index(templates)
+    assert index.query(_textured(4), 1) == [4]
+    monkeypatch.setattr(dota_hero_detection, "DESCRIPTOR_CANDIDATE_HEROES", 1)
+    assert [r["hero_id"] for r in match_in_game_icon(_textured(4), templates, top_n=6)] == [4]
+
+
+def test_cascade_recall_report_in_game(monkeypatch):
+    templates = [_bordered_template(i, f"Hero{i}", _textured(i)) for i in range(6)]
+    icons = [("Radiant", i, _textured(i)) for i in range(5)] + [("Dire", 0, _textured(5))]
+    monkeypatch.setattr(dota_hero_detection, "load_in_game_templates", lambda: templates)
+    monkeypatch.setattr(dota_hero_detection, "load_image", lambda _p: np.zeros((1080, 1920, 3), np.uint8))
+    monkeypatch.setattr(dota_hero_detection, "extract_in_game_hero_icons",
+                        lambda frame, debug=False: icons)
+
+    report = dota_hero_detection.cascade_recall_report(["a.jpg", "b.jpg"], k_values=(2, 6), in_game=True)
+
+    assert report["path"] == "in_game"
+    assert (report["frames"], report["slots"], report["templates"]) == (2, 12, 6)
+    # Each icon is its own template, so the coarse prefilter ranks it first.
+    assert report["recall"] == {2: 1.0, 6: 1.0}
+    assert report["misses"] == {2: 0, 6: 0}
+
+
 # --------------------------------------------------------------------------- #
 # load_in_game_templates
 # --------------------------------------------------------------------------- #
@@ -116,6 +162,7 @@ def test_load_in_game_templates_globs_and_borders(tmp_path, monkeypatch):
     # Reset the module-level cache so this test controls what gets loaded.
     monkeypatch.setattr(dota_hero_detection, "_IN_GAME_TEMPLATES", None)
     monkeypatch.setattr(dota_hero_detection, "HEROES_DIR", tmp_path)
+    monkeypatch.setattr(dota_hero_detection, "TEMPLATES_CACHE_FILE", tmp_path / "templates_cache.npy")
 
     # Two hero portrait PNGs on disk: 1_base.png (hero 1) and 2_alt.png (hero 2).
     cv2.imwrite(str(tmp_path / "1_base.png"), _solid((255, 0, 0)))
@@ -141,6 +188,63 @@ def test_load_in_game_templates_globs_and_borders(tmp_path, monkeypatch):
         assert localized in ("HeroA", "HeroB")
 
 
+def test_load_in_game_templates_persists_in_template_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(dota_hero_detection, "_IN_GAME_TEMPLATES", None)
+    monkeypatch.setattr(dota_hero_detection, "HEROES_DIR", tmp_path)
+    monkeypatch.setattr(dota_hero_detection, "TEMPLATES_CACHE_FILE", tmp_path / "templates_cache.npy")
+    cv2.imwrite(str(tmp_path / "1_base.png"), _solid((255, 0, 0)))
+    cv2.imwrite(str(tmp_path / "1_persona.png"), _solid((0, 255, 0)))
+    heroes_data = [{"id": 1, "name": "npc_1", "localized_name": "HeroA"}]
+    with patch.object(dota_hero_detection, "load_heroes_data", return_value=heroes_data):
+        first = load_in_game_templates()
+
+        # A fresh process maps the resized portraits instead of decoding them again.
+        monkeypatch.setattr(dota_hero_detection, "_IN_GAME_TEMPLATES", None)
+        with patch.object(dota_hero_detection, "_compute_in_game_template",
+                          side_effect=AssertionError("decoded")):
+            second = load_in_game_templates()
+
+    assert len(second) == len(first) == 2
+    for (_, _, _, a), (_, _, _, b) in zip(first, second):
+        assert np.array_equal(a, b)
+    manifest = json.loads((tmp_path / "templates_cache.json").read_text())
+    assert {entry["kind"] for entry in manifest["entries"]} == {"in_game"}
+
+    # Loading the picking templates keeps the in-game rows alongside its own.
+    portrait = tmp_path / "1_base.png"
+    heroes_file = tmp_path / "hero_data.json"
+    heroes_file.write_text(json.dumps([dict(heroes_data[0], variants=[{"variant": "base",
+                                                                        "image_path": str(portrait)}])]))
+    monkeypatch.setattr(dota_hero_detection, "HEROES_FILE", heroes_file)
+    monkeypatch.setattr(dota_hero_detection, "_LOADED_HEROES_DATA", None)
+    monkeypatch.setattr(dota_hero_detection, "_TEMPLATE_BANK", None)
+    dota_hero_detection.load_heroes_data()
+    manifest = json.loads((tmp_path / "templates_cache.json").read_text())
+    assert sorted(entry["kind"] for entry in manifest["entries"]) == ["in_game", "in_game", "picking"]
+
+
+def test_compact_in_game_templates_are_grayscale_and_still_match(tmp_path, monkeypatch):
+    monkeypatch.setattr(dota_hero_detection, "HEROES_DIR", tmp_path)
+    monkeypatch.setattr(dota_hero_detection, "TEMPLATES_CACHE_FILE", tmp_path / "templates_cache.npy")
+    heroes_data = []
+    for hero_id in (1, 2, 3):
+        cv2.imwrite(str(tmp_path / f"{hero_id}_base.png"), _textured(hero_id))
+        heroes_data.append({"id": hero_id, "name": f"npc_{hero_id}", "localized_name": f"Hero{hero_id}"})
+
+    full = dota_hero_detection._build_in_game_templates(heroes_data, compact=False)
+    compact = dota_hero_detection._build_in_game_templates(heroes_data, compact=True)
+    bs = IN_GAME_BORDER_SIZE
+    assert all(t[3].shape == (72 + 2 * bs, 128 + 2 * bs) for t in compact)
+    assert sum(t[3].nbytes for t in compact) * 3 == sum(t[3].nbytes for t in full)
+
+    # A colour icon is converted to match the compact planes, through every stage.
+    monkeypatch.setattr(dota_hero_detection, "DESCRIPTOR_CANDIDATE_HEROES", 2)
+    monkeypatch.setattr(dota_hero_detection, "_IN_GAME_INDEX", None)
+    monkeypatch.setattr(dota_hero_detection, "_IN_GAME_COARSE", None)
+    matches = match_in_game_icon(_textured(2), compact, top_n=1, top_k=1)
+    assert matches[0]["hero_id"] == 2
+
+
 def test_load_in_game_templates_is_cached(monkeypatch):
     sentinel = [(1, "npc_1", "HeroA", np.zeros((112, 168, 3), np.uint8))]
     monkeypatch.setattr(dota_hero_detection, "_IN_GAME_TEMPLATES", sentinel)
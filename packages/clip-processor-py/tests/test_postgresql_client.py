@@ -8,7 +8,9 @@ These pin:
 """
 
 import json
-from unittest.mock import MagicMock
+import threading
+import time
+from unittest.mock import MagicMock, patch
 
 import pytest
 
@@ -120,13 +122,16 @@ def test_update_status_rolls_back_on_error(db_client, mock_cursor):
 def test_requeue_for_retry_returns_true_when_row_updated(db_client, mock_cursor):
     mock_cursor.rowcount = 1
     assert db_client.requeue_for_retry("r1", delay_seconds=42, max_retries=3) is True
-    query, params = mock_cursor.execute.call_args.args
+    query, params = mock_cursor.execute.call_args_list[0].args
     assert "status = 'pending'" in query
     assert "retry_count = COALESCE(retry_count, 0) + 1" in query
     assert "not_before" in query and "interval '1 second'" in query
     # max_retries is enforced in the WHERE clause, not Python, so the cap is atomic
     assert "COALESCE(retry_count, 0) < %s" in query
     assert params == (42, "r1", 3)
+    # idle workers are notified in the same transaction
+    assert mock_cursor.execute.call_args.args == (
+        "SELECT pg_notify(%s, %s)", ("processing_queue_pending", "r1"))
     db_client._mock_conn.commit.assert_called_once()
 
 
@@ -134,6 +139,95 @@ def test_requeue_for_retry_returns_false_when_cap_reached(db_client, mock_cursor
     # WHERE clause filtered the row out (retry_count >= max_retries) — no row updated
     mock_cursor.rowcount = 0
     assert db_client.requeue_for_retry("r1") is False
+    assert mock_cursor.execute.call_count == 1  # nothing to notify about
+
+
+def test_requeue_for_retry_skips_rows_with_an_active_duplicate(db_client, mock_cursor):
+    # The dedupe indexes would reject a failed->pending flip while the clip is
+    # queued again, so the UPDATE only matches rows without an active duplicate.
+    db_client._queue_dedupe_indexed = True
+    mock_cursor.rowcount = 0
+    assert db_client.requeue_for_retry("r1") is False
+    query = mock_cursor.execute.call_args_list[0].args[0]
+    assert "NOT EXISTS" in query and "d.clip_id = q.clip_id" in query
+
+
+def test_requeue_for_retry_treats_unique_violation_as_deduplicated(db_client, mock_cursor, caplog):
+    import psycopg2.errors
+
+    db_client._queue_dedupe_indexed = True
+    mock_cursor.execute.side_effect = psycopg2.errors.UniqueViolation()
+    assert db_client.requeue_for_retry("r1") is False
+    db_client._mock_conn.rollback.assert_called_once()
+    assert not [r for r in caplog.records if r.levelname == "ERROR"]
+
+
+def test_refresh_processing_request_only_touches_processing_rows(db_client, mock_cursor):
+    mock_cursor.rowcount = 0  # already failed by the stuck-request reset
+    assert db_client.refresh_processing_request("r1") is False
+    query, params = mock_cursor.execute.call_args.args
+    assert "status = 'processing'" in query.split("WHERE")[1]
+    assert "SET status" not in query
+    assert params[1] == "r1"
+
+
+# --------------------------------------------------------------------------- #
+# queue wake-ups (LISTEN/NOTIFY)
+# --------------------------------------------------------------------------- #
+def test_add_to_queue_notifies_idle_workers(db_client, mock_cursor):
+    mock_cursor.fetchone.side_effect = [
+        [15.0],  # average processing time
+        None,  # no duplicate
+        {"request_id": "new-id", "status": "pending"},  # inserted row
+    ]
+    request_id, _info = db_client.add_to_queue(
+        request_type="clip", clip_id="c1", clip_url="https://clips.twitch.tv/c1"
+    )
+    assert mock_cursor.execute.call_args.args == (
+        "SELECT pg_notify(%s, %s)", ("processing_queue_pending", request_id))
+
+
+class _NotifyingConn:
+    """Stands in for the LISTEN connection: poll() delivers queued notifications."""
+
+    def __init__(self, count):
+        self.count = count
+        self.notifies = []
+
+    def poll(self):
+        self.notifies.extend(object() for _ in range(self.count))
+        self.count = 0
+
+
+def test_wait_for_queue_activity_wakes_on_notification(db_client, monkeypatch):
+    monkeypatch.setattr(db_client, "_ensure_queue_listener", MagicMock())
+    conn = _NotifyingConn(2)
+    with patch("postgresql_client.select.select", return_value=([conn], [], [])):
+        assert db_client._drain_queue_notifications(conn) == 2
+    assert conn.notifies == []
+    # one wake-up per notification, then back to waiting out the timeout
+    assert db_client.wait_for_queue_activity(5) is True
+    assert db_client.wait_for_queue_activity(5) is True
+    assert db_client.wait_for_queue_activity(0.01) is False
+
+
+def test_wait_for_queue_activity_wakes_a_blocked_worker(db_client, monkeypatch):
+    monkeypatch.setattr(db_client, "_ensure_queue_listener", MagicMock())
+    woken = []
+    waiter = threading.Thread(target=lambda: woken.append(db_client.wait_for_queue_activity(5)))
+    waiter.start()
+    time.sleep(0.05)
+    with patch("postgresql_client.select.select", side_effect=lambda r, w, x, t: (r, [], [])):
+        db_client._drain_queue_notifications(_NotifyingConn(1))
+    waiter.join(2)
+    assert woken == [True]
+
+
+def test_drain_queue_notifications_times_out_quietly(db_client):
+    conn = _NotifyingConn(1)
+    with patch("postgresql_client.select.select", return_value=([], [], [])):
+        assert db_client._drain_queue_notifications(conn) == 0
+    assert conn.count == 1  # not polled
 
 
 # --------------------------------------------------------------------------- #
@@ -186,6 +280,32 @@ def test_save_clip_result_serializes_result(db_client, mock_cursor):
     assert json.loads(params[2]) == result  # results column = json.dumps(result)
 
 
+def test_complete_request_saves_result_and_status_in_one_commit(db_client, mock_cursor):
+    result = {"players": [{"player_name": "x", "team": "Radiant", "position": 0}]}
+    assert db_client.complete_request("req1", result_id="c1", clip_url="u", result=result, match_id="m1") is True
+    statements = [c.args[0] for c in mock_cursor.execute.call_args_list]
+    assert "INSERT INTO" in statements[0]
+    assert json.loads(mock_cursor.execute.call_args_list[0].args[1][2]) == result
+    assert "SET status = %s, completed_at = %s, result_id = %s" in statements[1]
+    assert mock_cursor.execute.call_args_list[1].args[1][0] == "completed"
+    assert db_client._get_connection.call_count == 1
+    db_client._mock_conn.commit.assert_called_once()
+
+
+def test_complete_request_without_result_only_marks_completed(db_client, mock_cursor):
+    assert db_client.complete_request("req2") is True
+    statements = [c.args[0] for c in mock_cursor.execute.call_args_list]
+    assert not any("INSERT INTO" in q for q in statements)
+    assert mock_cursor.execute.call_args_list[0].args[1][0] == "completed"
+
+
+def test_complete_request_rolls_back_both_writes_on_error(db_client, mock_cursor):
+    mock_cursor.execute.side_effect = [None, Exception("deadlock detected")]
+    assert db_client.complete_request("req1", result_id="c1", clip_url="u", result={"players": []}) is False
+    db_client._mock_conn.commit.assert_not_called()
+    db_client._mock_conn.rollback.assert_called_once()
+
+
 def test_get_clip_result_returns_results_payload(db_client, mock_cursor):
     payload = {"players": [{"player_name": "x", "team": "Radiant", "position": 0}]}
     mock_cursor.fetchone.return_value = {"results": payload}
@@ -201,14 +321,11 @@ def test_get_clip_result_returns_none_when_missing(db_client, mock_cursor):
 # Queue lifecycle (ported from the old test/test_queue.py)
 # --------------------------------------------------------------------------- #
 def test_add_to_queue_inserts_and_returns_position(db_client, mock_cursor):
-    # add_to_queue consumes fetchone in this order: two schema-column checks,
-    # the dedup lookup, the pending-count, the avg-time query, then RETURNING *.
+    # add_to_queue consumes fetchone in this order: the (cached) avg-time query,
+    # the dedup lookup (no dedupe indexes in this fixture), then RETURNING *.
     mock_cursor.fetchone.side_effect = [
-        None,            # match_id column check -> absent
-        None,            # only_draft column check -> absent
-        None,            # no existing duplicate
-        {"count": 2},    # pending count -> position 3
         [15.0],          # get_average_processing_time
+        None,            # no existing duplicate
         {"request_id": "row-id", "status": "pending", "position": 3},  # RETURNING *
     ]
     request_id, queue_info = db_client.add_to_queue(
@@ -224,11 +341,8 @@ def test_add_to_queue_accepts_clip_in_game(db_client, mock_cursor):
     # Regression: 'clip_in_game' must be treated as a clip, not rejected by the
     # request-type whitelist (which previously dropped every queued in-game request).
     mock_cursor.fetchone.side_effect = [
-        None,            # match_id column check
-        None,            # only_draft column check
-        None,            # no existing duplicate
-        {"count": 0},    # pending count -> position 1
         [15.0],          # get_average_processing_time
+        None,            # no existing duplicate
         {"request_id": "ig-id", "status": "pending", "position": 1},  # RETURNING *
     ]
     request_id, queue_info = db_client.add_to_queue(
@@ -240,6 +354,68 @@ def test_add_to_queue_accepts_clip_in_game(db_client, mock_cursor):
     db_client._mock_conn.commit.assert_called_once()
 
 
+def test_add_to_queue_is_one_statement_with_dedupe_indexes(db_client, mock_cursor):
+    db_client._queue_dedupe_indexed = True
+    db_client._average_processing_times["clip"] = (time.monotonic() + 60, 12.0)
+    mock_cursor.fetchone.return_value = {"request_id": "row-id", "status": "pending", "position": 1}
+    request_id, queue_info = db_client.add_to_queue(
+        request_type="clip", clip_id="c1", clip_url="https://clips.twitch.tv/c1", match_id="m1"
+    )
+    assert queue_info["status"] == "pending"
+    queries = [c.args[0] for c in mock_cursor.execute.call_args_list]
+    assert len(queries) == 2  # the INSERT, then the NOTIFY
+    assert "ON CONFLICT DO NOTHING" in queries[0]
+    assert "COUNT(*) + 1 AS position" in queries[0]
+    params = mock_cursor.execute.call_args_list[0].args[1]
+    assert params[0] == request_id and "m1" in params
+    assert params[-3:-1] == (12.0, params[10])  # avg time, created_at
+    db_client._mock_conn.commit.assert_called_once()
+
+
+def test_add_to_queue_conflict_returns_active_duplicate(db_client, mock_cursor):
+    db_client._queue_dedupe_indexed = True
+    db_client._average_processing_times["clip"] = (time.monotonic() + 60, 12.0)
+    mock_cursor.fetchone.side_effect = [
+        None,  # ON CONFLICT DO NOTHING inserted nothing
+        {"request_id": "existing-id", "status": "processing", "position": 1},
+    ]
+    request_id, queue_info = db_client.add_to_queue(
+        request_type="clip", clip_id="c1", clip_url="https://clips.twitch.tv/c1"
+    )
+    assert request_id == "existing-id"
+    assert queue_info["deduplicated"] is True
+    assert "pg_notify" not in mock_cursor.execute.call_args.args[0]
+
+
+def test_estimated_processing_time_is_cached(db_client):
+    db_client.get_average_processing_time = MagicMock(return_value=20.0)
+    assert db_client._estimated_processing_time("clip") == 20.0
+    assert db_client._estimated_processing_time("clip") == 20.0
+    assert db_client.get_average_processing_time.call_count == 1
+
+
+def test_initialize_resolves_queue_columns_and_dedupe_indexes(db_client, mock_cursor):
+    from postgresql_client import PostgresClient
+
+    db_client._initialized = False
+    mock_cursor.fetchall.return_value = [("match_id",), ("only_draft",)]
+    assert PostgresClient.initialize(db_client) is True
+    assert db_client._queue_has_match_id and db_client._queue_has_only_draft
+    assert db_client._queue_dedupe_indexed is True
+    queries = " ".join(c.args[0] for c in mock_cursor.execute.call_args_list)
+    assert "uq_processing_queue_active_clip" in queries
+    assert "WHERE status = 'pending'" in queries
+
+
+def test_dedupe_indexes_fall_back_when_duplicates_exist(db_client, mock_cursor):
+    def execute(sql, *args):
+        if "CREATE UNIQUE INDEX" in sql:
+            raise RuntimeError("could not create unique index")
+    mock_cursor.execute.side_effect = execute
+    assert db_client._create_queue_dedupe_indexes(mock_cursor) is False
+    assert mock_cursor.execute.call_args.args[0] == "ROLLBACK TO SAVEPOINT queue_dedupe_indexes"
+
+
 @pytest.mark.parametrize(
     "fetched, expected",
     [
@@ -277,6 +453,33 @@ def test_get_next_pending_request_gates_on_not_before(db_client, mock_cursor):
     assert "not_before IS NULL OR not_before <= CURRENT_TIMESTAMP" in query
 
 
+def test_claim_next_request_claims_and_commits(db_client, mock_cursor):
+    mock_cursor.fetchone.return_value = {
+        "request_id": "test-id", "clip_id": "test-clip", "status": "processing", "position": 1
+    }
+    request = db_client.claim_next_request()
+    assert request["request_id"] == "test-id"
+    assert request["status"] == "processing"
+    db_client._mock_conn.commit.assert_called_once()
+
+
+def test_claim_next_request_is_a_single_skip_locked_update(db_client, mock_cursor):
+    mock_cursor.fetchone.return_value = None
+    assert db_client.claim_next_request() is None
+    assert mock_cursor.execute.call_count == 1
+    query = mock_cursor.execute.call_args.args[0]
+    assert "SET status = 'processing'" in query
+    assert "FOR UPDATE SKIP LOCKED" in query
+    assert "RETURNING *" in query
+    assert "not_before IS NULL OR not_before <= CURRENT_TIMESTAMP" in query
+
+
+def test_claim_next_request_rolls_back_on_error(db_client, mock_cursor):
+    mock_cursor.execute.side_effect = RuntimeError("deadlock")
+    assert db_client.claim_next_request() is None
+    db_client._mock_conn.rollback.assert_called_once()
+
+
 def test_add_to_queue_returns_existing_duplicate(db_client, mock_cursor):
     mock_cursor.fetchone.return_value = {
         "request_id": "existing-id",
@@ -473,3 +676,90 @@ def test_is_queue_processing_false_when_zero(db_client, mock_cursor):
     assert db_client.is_queue_processing() is False
 
 
+
+
+# --------------------------------------------------------------------------- #
+# MonitoredConnectionPool
+# --------------------------------------------------------------------------- #
+class _FakeThreadedPool:
+    """Stand-in for ThreadedConnectionPool handing out MagicMock connections."""
+
+    def __init__(self, minconn, maxconn, dsn):
+        self.idle = []
+        self.closed = []
+
+    def getconn(self):
+        if self.idle:
+            return self.idle.pop()
+        conn = MagicMock()
+        conn.closed = 0
+        conn.info.transaction_status = 0  # TRANSACTION_STATUS_IDLE
+        return conn
+
+    def putconn(self, conn, close=False):
+        (self.closed if close else self.idle).append(conn)
+
+
+@pytest.fixture
+def pool():
+    import postgresql_client
+    with patch.object(postgresql_client, "ThreadedConnectionPool", _FakeThreadedPool):
+        yield postgresql_client.MonitoredConnectionPool(
+            "postgres://x", 2, idle_check_seconds=30, checkout_timeout=0.2
+        )
+
+
+def test_pool_reuses_fresh_connection_without_ping(pool):
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    conn.cursor.assert_not_called()
+    assert pool.stats()["health_checks"] == 0
+
+
+def test_pool_pings_connection_after_idle(pool):
+    conn = pool.getconn()
+    pool.putconn(conn)
+    pool._returned_at[id(conn)] -= 60
+    assert pool.getconn() is conn
+    conn.cursor.return_value.execute.assert_called_once_with("SELECT 1")
+    assert pool.stats()["health_checks"] == 1
+
+
+def test_pool_replaces_errored_connection_that_fails_ping(pool):
+    conn = pool.getconn()
+    conn.info.transaction_status = 3  # TRANSACTION_STATUS_INERROR
+    conn.cursor.return_value.execute.side_effect = Exception("server closed the connection")
+    pool.putconn(conn)
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert pool._pool.closed == [conn]
+    assert pool.stats()["failures"] == 1
+
+
+def test_pool_closes_broken_connection_on_return(pool):
+    conn = pool.getconn()
+    conn.closed = 2
+    pool.putconn(conn)
+    assert pool._pool.closed == [conn]
+    assert pool.stats()["in_use"] == 0
+
+
+def test_pool_waits_for_a_free_connection_and_records_it(pool):
+    first, second = pool.getconn(), pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(first,)).start()
+    assert pool.getconn() is first
+    stats = pool.stats()
+    assert stats["in_use"] == 2
+    assert stats["max_connections"] == 2
+    assert stats["max_wait_ms"] >= 40
+
+
+def test_pool_checkout_times_out_when_exhausted(pool):
+    pool.getconn(), pool.getconn()
+    import postgresql_client
+    with pytest.raises(postgresql_client.PoolError):
+        pool.getconn()
+    stats = pool.stats()
+    assert stats["timeouts"] == 1
+    assert stats["in_use"] == 2
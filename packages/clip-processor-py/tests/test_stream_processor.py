@@ -7,6 +7,7 @@ methods plus a single `_process_stream` iteration with `_capture_frame`/
 """
 
 import asyncio
+import threading
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -29,6 +30,13 @@ def _no_capture_sleep():
         yield
 
 
+@pytest.fixture(autouse=True)
+def _decode_frames_to_their_path():
+    # _process_frame decodes each capture once; the fake paths here stand in for the frame.
+    with patch.object(stream_processor, "load_image", side_effect=lambda path: path) as decode:
+        yield decode
+
+
 def _mock_capture(read_result, opened=True):
     cap = MagicMock()
     cap.isOpened.return_value = opened
@@ -182,6 +190,80 @@ def test_capture_frame_writes_and_returns_path(manager, tmp_path):
     cap.release.assert_called()
 
 
+def test_high_priority_stream_captures_from_decoder_session(manager, tmp_path):
+    manager.add_stream("alice", priority=1)
+    opened_on = []
+    session = MagicMock()
+    session.capture_frame.return_value = "/frames/alice.jpg"
+    with patch.object(stream_processor, "FRAMES_DIR", tmp_path), \
+         patch.object(stream_processor, "get_stream_url", return_value=None) as get_url, \
+         patch.object(stream_processor, "open_stream_session") as open_session, \
+         patch.object(stream_processor, "get_stream_session", side_effect=[None, session]):
+        open_session.side_effect = lambda *args: opened_on.append(threading.current_thread())
+        # First capture opens the session and still connects directly.
+        assert asyncio.run(manager._capture_frame("alice")) is None
+        open_session.assert_called_once_with("alice", "720p")
+        # Off the event loop: replacing a session waits for its reader thread.
+        assert opened_on != [threading.current_thread()]
+        get_url.assert_called_once()
+        # Later captures come straight from the session.
+        assert asyncio.run(manager._capture_frame("alice")) == "/frames/alice.jpg"
+    get_url.assert_called_once()
+
+
+def test_low_priority_stream_never_opens_session(manager):
+    manager.add_stream("bob", priority=5)
+    with patch.object(stream_processor, "get_stream_url", return_value=None), \
+         patch.object(stream_processor, "open_stream_session") as open_session:
+        assert asyncio.run(manager._capture_frame("bob")) is None
+    open_session.assert_not_called()
+
+
+def test_low_priority_stream_uses_keyframe_grabber(manager, tmp_path):
+    manager.add_stream("carol", priority=8)
+    with patch.object(stream_processor, "FRAMES_DIR", tmp_path), \
+         patch.object(stream_processor, "get_stream_url", return_value="http://s/index.m3u8"), \
+         patch.object(stream_processor.cv2, "VideoCapture") as vc, \
+         patch.object(stream_processor, "save_keyframe", return_value="/frames/carol.jpg") as save:
+        assert asyncio.run(manager._capture_frame("carol")) == "/frames/carol.jpg"
+    assert save.call_args.args[0] == "http://s/index.m3u8"
+    vc.assert_not_called()
+
+
+def test_demoting_or_removing_stream_closes_session(manager):
+    manager.add_stream("alice", priority=1)
+    with patch.object(stream_processor, "close_stream_session") as close_session:
+        manager.update_priority("alice", 2)
+        close_session.assert_not_called()
+        manager.update_priority("alice", 6)
+        close_session.assert_called_once_with("alice")
+        manager.remove_stream("alice")
+    assert close_session.call_count == 2
+
+
+def test_sessions_are_closed_without_holding_the_manager_lock(manager):
+    # close() waits for the reader thread; other streams must not stall behind it.
+    def try_lock():
+        if manager._lock.acquire(blocking=False):
+            manager._lock.release()
+            held.append(False)
+        else:
+            held.append(True)
+
+    def lock_is_free(username):
+        probe = threading.Thread(target=try_lock)
+        probe.start()
+        probe.join()
+
+    held = []
+    manager.add_stream("alice", priority=1)
+    with patch.object(stream_processor, "close_stream_session", side_effect=lock_is_free):
+        manager.add_stream("alice", priority=6)
+        manager.update_priority("alice", 7)
+        manager.remove_stream("alice")
+    assert held == [False, False, False]
+
+
 # --------------------------------------------------------------------------- #
 # _process_frame
 # --------------------------------------------------------------------------- #
@@ -206,6 +288,80 @@ def test_process_frame_returns_false_when_no_heroes(manager, tmp_path):
         assert asyncio.run(manager._process_frame("alice", "/t/f.jpg")) is False
 
 
+def test_process_frame_accepts_heroes_list(manager, tmp_path):
+    # The real process_frame_for_heroes returns the heroes list itself.
+    with patch.object(stream_processor, "DOTA_DETECTION_AVAILABLE", True), \
+         patch.object(stream_processor, "RESULTS_DIR", tmp_path), \
+         patch.object(stream_processor, "hero_slot_fingerprints", return_value=None), \
+         patch.object(stream_processor, "process_frame_for_heroes", return_value=[{"hero_id": 1}]):
+        assert asyncio.run(manager._process_frame("alice", "/t/f.jpg")) is True
+
+
+def test_process_frame_reuses_confirmed_roster(manager, tmp_path):
+    manager.add_stream("alice")
+    roster = [{"team": "Radiant", "position": 0, "hero_id": 1}]
+    fingerprints = {("Radiant", 0): "fp"}
+    with patch.object(stream_processor, "DOTA_DETECTION_AVAILABLE", True), \
+         patch.object(stream_processor, "RESULTS_DIR", tmp_path), \
+         patch.object(stream_processor, "hero_slot_fingerprints", return_value=fingerprints), \
+         patch.object(stream_processor, "verify_known_roster", return_value=roster) as verify, \
+         patch.object(stream_processor, "process_frame_for_heroes", return_value=roster) as full:
+        # First capture: full detection confirms the roster.
+        assert asyncio.run(manager._process_frame("alice", "/t/f1.jpg")) is True
+        verify.assert_not_called()
+        assert manager.streams["alice"]["roster"] == roster
+        assert manager.streams["alice"]["roster_fingerprints"] == fingerprints
+
+        # Later captures: verified against the known roster, no full detection.
+        assert asyncio.run(manager._process_frame("alice", "/t/f2.jpg")) is True
+        verify.assert_called_once_with("/t/f2.jpg", roster, fingerprints)
+        full.assert_called_once()
+    assert manager.stats["roster_fast_path_hits"] == 1
+
+
+def test_process_frame_decodes_the_capture_once(manager, tmp_path, _decode_frames_to_their_path):
+    roster = [{"team": "Radiant", "position": 0, "hero_id": 1}]
+    with patch.object(stream_processor, "DOTA_DETECTION_AVAILABLE", True), \
+         patch.object(stream_processor, "RESULTS_DIR", tmp_path), \
+         patch.object(stream_processor, "hero_slot_fingerprints", return_value={("Radiant", 0): "fp"}) as fp, \
+         patch.object(stream_processor, "process_frame_for_heroes", return_value=roster) as full:
+        assert asyncio.run(manager._process_frame("alice", "/t/f.jpg")) is True
+    _decode_frames_to_their_path.assert_called_once_with("/t/f.jpg")
+    full.assert_called_once_with("/t/f.jpg", debug=False)
+    fp.assert_called_once_with("/t/f.jpg")
+
+
+def test_process_frame_returns_false_when_frame_unreadable(manager, _decode_frames_to_their_path):
+    _decode_frames_to_their_path.side_effect = lambda path: None
+    with patch.object(stream_processor, "DOTA_DETECTION_AVAILABLE", True), \
+         patch.object(stream_processor, "process_frame_for_heroes") as full:
+        assert asyncio.run(manager._process_frame("alice", "/t/f.jpg")) is False
+    full.assert_not_called()
+
+
+def test_process_frame_rediscovers_roster_when_verification_fails(manager, tmp_path):
+    manager.add_stream("alice")
+    manager.streams["alice"]["roster"] = [{"team": "Radiant", "position": 0, "hero_id": 1}]
+    manager.streams["alice"]["roster_fingerprints"] = {("Radiant", 0): "old"}
+    new_roster = [{"team": "Radiant", "position": 0, "hero_id": 2}]
+    with patch.object(stream_processor, "DOTA_DETECTION_AVAILABLE", True), \
+         patch.object(stream_processor, "RESULTS_DIR", tmp_path), \
+         patch.object(stream_processor, "hero_slot_fingerprints", return_value={("Radiant", 0): "new"}), \
+         patch.object(stream_processor, "verify_known_roster", return_value=None), \
+         patch.object(stream_processor, "process_frame_for_heroes", return_value=new_roster):
+        assert asyncio.run(manager._process_frame("alice", "/t/f.jpg")) is True
+    assert manager.streams["alice"]["roster"] == new_roster
+    assert manager.streams["alice"]["roster_fingerprints"] == {("Radiant", 0): "new"}
+    assert manager.stats["roster_fast_path_hits"] == 0
+
+    # No heroes on the next full pass (e.g. the match ended) clears the roster.
+    with patch.object(stream_processor, "DOTA_DETECTION_AVAILABLE", True), \
+         patch.object(stream_processor, "verify_known_roster", return_value=None), \
+         patch.object(stream_processor, "process_frame_for_heroes", return_value=[]):
+        assert asyncio.run(manager._process_frame("alice", "/t/f.jpg")) is False
+    assert manager.streams["alice"]["roster"] is None
+
+
 # --------------------------------------------------------------------------- #
 # _initialize / _scheduler
 # --------------------------------------------------------------------------- #
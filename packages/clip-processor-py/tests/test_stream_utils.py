@@ -6,6 +6,7 @@ cv2/streamlink are stubbed offline (see conftest); we patch the few seams the
 function actually drives.
 """
 
+import threading
 from unittest.mock import MagicMock, patch
 
 import numpy as np
@@ -169,3 +170,238 @@ def test_capture_multiple_collects_valid_frames():
         out = stream_utils.capture_multiple_frames("alice", num_frames=1, frames_to_skip=0)
     assert len(out) == 1
     cap.release.assert_called_once()
+
+
+def test_capture_multiple_return_frames_skips_the_disk():
+    cap = MagicMock()
+    cap.isOpened.return_value = True
+    frame = np.zeros((4, 4, 3), np.uint8)
+    cap.read.return_value = (True, frame)
+    with patch.object(stream_utils, "get_stream_url", return_value="http://s"), \
+         patch.object(stream_utils.cv2, "VideoCapture", return_value=cap), \
+         patch.object(stream_utils.cv2, "imwrite") as imwrite, \
+         patch.object(stream_utils, "is_preparing_screen", return_value=False):
+        out = stream_utils.capture_multiple_frames("alice", num_frames=1, frames_to_skip=0, return_frames=True)
+    assert len(out) == 1 and out[0] is frame
+    imwrite.assert_not_called()
+
+
+# --------------------------------------------------------------------------- #
+# StreamDecoderSession / session registry
+# --------------------------------------------------------------------------- #
+def _grabbing_capture(session, grabs, frames):
+    """A capture that grabs `grabs` times, then closes the session and stops."""
+    cap = MagicMock()
+    results = iter([True] * grabs)
+
+    def grab():
+        result = next(results, None)
+        if result is None:
+            session.close()
+            return False
+        return result
+
+    cap.grab.side_effect = grab
+    cap.retrieve.side_effect = [(True, frame) for frame in frames]
+    return cap
+
+
+def test_decoder_session_keeps_latest_frame():
+    session = stream_utils.StreamDecoderSession("alice")
+    frames = [np.full((4, 4, 3), i, np.uint8) for i in range(3)]
+    cap = _grabbing_capture(session, 3, frames)
+    with patch.object(stream_utils, "STREAM_SESSION_FRAME_INTERVAL", 0):
+        session._read_frames(cap)
+    frame, _captured_at = session.latest_frame()
+    assert frame is frames[2]
+    assert session.latest_frame(max_age=-1) is None  # stale frames are not served
+
+
+def test_decoder_session_converts_at_most_one_frame_per_interval():
+    session = stream_utils.StreamDecoderSession("alice")
+    cap = _grabbing_capture(session, 5, [np.zeros((4, 4, 3), np.uint8)])
+    with patch.object(stream_utils, "STREAM_SESSION_FRAME_INTERVAL", 60):
+        session._read_frames(cap)
+    assert cap.grab.call_count == 6
+    cap.retrieve.assert_called_once()
+
+
+def test_decoder_session_reconnects_after_read_failures():
+    session = stream_utils.StreamDecoderSession("alice")
+    caps = [MagicMock(), MagicMock()]
+    for cap in caps:
+        cap.isOpened.return_value = True
+        cap.grab.return_value = False
+    urls = iter(["http://s", "http://s"])
+
+    def get_url(username, quality):
+        url = next(urls, None)
+        if url is None:
+            session.close()
+        return url
+
+    with patch.object(stream_utils, "get_stream_url", side_effect=get_url), \
+         patch.object(stream_utils.cv2, "VideoCapture", side_effect=caps) as vc, \
+         patch.object(stream_utils, "STREAM_SESSION_MAX_READ_FAILURES", 1), \
+         patch.object(stream_utils, "STREAM_SESSION_RECONNECT_DELAY", 0):
+        session._run()
+    assert vc.call_count == 2
+    for cap in caps:
+        cap.release.assert_called_once()
+
+
+def test_decoder_session_disconnects_when_nobody_reads():
+    session = stream_utils.StreamDecoderSession("alice")
+    session._last_read = stream_utils.time.time() - 120
+    cap = MagicMock()
+    with patch.object(stream_utils, "STREAM_SESSION_IDLE_TIMEOUT", 60):
+        session._read_frames(cap)
+    cap.grab.assert_not_called()
+
+
+def test_idle_decoder_session_waits_for_a_read_before_connecting():
+    session = stream_utils.StreamDecoderSession("alice")
+    session._last_read = 0.0
+    connected = threading.Event()
+
+    def get_url(username, quality):
+        connected.set()
+        session._stop.set()
+        return None
+
+    with patch.object(stream_utils, "get_stream_url", side_effect=get_url), \
+         patch.object(stream_utils, "STREAM_SESSION_RECONNECT_DELAY", 0):
+        reader = threading.Thread(target=session._run, daemon=True)
+        reader.start()
+        assert not connected.wait(0.3)  # idle: no connection, no decoding
+        assert session.latest_frame() is None  # the read itself wakes the reader
+        assert connected.wait(5)
+        reader.join(5)
+    assert not reader.is_alive()
+
+
+def test_close_joins_the_reader_thread():
+    cap = MagicMock()
+    cap.isOpened.return_value = True
+    cap.grab.side_effect = lambda: stream_utils.time.sleep(0.01) or True
+    cap.retrieve.return_value = (True, np.zeros((4, 4, 3), np.uint8))
+    with patch.object(stream_utils, "get_stream_url", return_value="http://s"), \
+         patch.object(stream_utils.cv2, "VideoCapture", return_value=cap):
+        session = stream_utils.StreamDecoderSession("alice").start()
+        while cap.grab.call_count == 0:
+            stream_utils.time.sleep(0.01)
+        assert session.close(timeout=5) is True
+    assert not session.is_running
+    cap.release.assert_called_once()
+
+
+def test_capture_frame_from_stream_serves_open_session():
+    with patch.object(stream_utils.StreamDecoderSession, "start", lambda self: self):
+        session = stream_utils.open_stream_session("alice", quality="720p")
+    try:
+        session._frame, session._frame_time = np.zeros((4, 4, 3), np.uint8), stream_utils.time.time()
+        with patch.object(stream_utils, "get_stream_url") as get_url, \
+             patch.object(stream_utils.cv2, "imwrite", return_value=True), \
+             patch.object(stream_utils, "is_preparing_screen", return_value=False):
+            result = stream_utils.capture_frame_from_stream("alice", max_retries=1, frames_to_skip=0)
+        assert result.endswith(".jpg")
+        get_url.assert_not_called()  # no connection setup at all
+    finally:
+        stream_utils.close_stream_session("alice")
+    assert stream_utils.get_stream_session("alice") is None
+
+
+def test_capture_frame_from_stream_returns_session_frame_in_memory():
+    with patch.object(stream_utils.StreamDecoderSession, "start", lambda self: self):
+        session = stream_utils.open_stream_session("alice", quality="720p")
+    try:
+        frame = np.zeros((4, 4, 3), np.uint8)
+        session._frame, session._frame_time = frame, stream_utils.time.time()
+        with patch.object(stream_utils.cv2, "imwrite") as imwrite, \
+             patch.object(stream_utils, "is_preparing_screen", return_value=False):
+            result = stream_utils.capture_frame_from_stream("alice", max_retries=1, return_frame=True)
+        assert result is frame
+        imwrite.assert_not_called()
+    finally:
+        stream_utils.close_stream_session("alice")
+
+
+def test_session_capture_frame_rejects_preparing_screen(tmp_path):
+    session = stream_utils.StreamDecoderSession("alice")
+    assert session.capture_frame(tmp_path / "f.jpg") is None  # nothing decoded yet
+    session._frame, session._frame_time = np.zeros((4, 4, 3), np.uint8), stream_utils.time.time()
+    with patch.object(stream_utils, "is_preparing_screen", return_value=True):
+        assert session.capture_frame(tmp_path / "f.jpg") is None
+
+
+# --------------------------------------------------------------------------- #
+# Keyframe-only HLS grabber (against a local HTTP server)
+# --------------------------------------------------------------------------- #
+def _write_segment(path, value):
+    import cv2
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 10, (64, 48))
+    for _ in range(5):
+        writer.write(np.full((48, 64, 3), value, np.uint8))
+    writer.release()
+
+
+@pytest.fixture
+def hls_server(tmp_path):
+    import functools
+    import http.server
+    import threading
+
+    root = tmp_path / "hls"
+    (root / "720p").mkdir(parents=True)
+    _write_segment(root / "720p" / "seg0.ts", 40)
+    _write_segment(root / "720p" / "seg1.ts", 200)
+    _write_segment(root / "720p" / "ad.ts", 120)
+    (root / "master.m3u8").write_text(
+        "#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=3000000,RESOLUTION=1280x720\n720p/index.m3u8\n")
+    (root / "720p" / "index.m3u8").write_text(
+        "#EXTM3U\n#EXT-X-TARGETDURATION:2\n#EXT-X-MEDIA-SEQUENCE:10\n"
+        "#EXTINF:2.000,live\nseg0.ts\n#EXTINF:2.000,live\nseg1.ts\n#EXTINF:2.000,Amazon\nad.ts\n")
+
+    class QuietHandler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_hls_playlist_resolves_variants_and_segments():
+    variants, segments = stream_utils._parse_hls_playlist(
+        "#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=1\nlow/index.m3u8\n", "http://h/live/master.m3u8")
+    assert variants == ["http://h/live/low/index.m3u8"] and segments == []
+    variants, segments = stream_utils._parse_hls_playlist(
+        "#EXTM3U\n#EXTINF:2.0,live\na.ts\n#EXTINF:2.0,\nhttp://cdn/b.ts\n", "http://h/live/index.m3u8")
+    assert variants == []
+    assert segments == [("http://h/live/a.ts", "live"), ("http://cdn/b.ts", "")]
+
+
+def test_grab_keyframe_decodes_newest_live_segment(hls_server):
+    # Follows the master playlist, skips the trailing ad segment, decodes seg1.
+    frame = stream_utils.grab_keyframe(f"{hls_server}/master.m3u8")
+    assert frame is not None and frame.shape == (48, 64, 3)
+    assert abs(float(frame.mean()) - 200) < 10
+
+
+def test_grab_keyframe_returns_none_on_http_error(hls_server):
+    assert stream_utils.grab_keyframe(f"{hls_server}/missing.m3u8") is None
+
+
+def test_capture_keyframe_from_stream_is_drop_in(hls_server):
+    with patch.object(stream_utils, "get_stream_url", return_value=f"{hls_server}/720p/index.m3u8"), \
+         patch.object(stream_utils, "is_preparing_screen", return_value=False), \
+         patch.object(stream_utils.cv2, "VideoCapture", wraps=stream_utils.cv2.VideoCapture) as vc:
+        result = stream_utils.capture_keyframe_from_stream("streamer", max_retries=1, frames_to_skip=5)
+    assert result is not None and result.endswith(".jpg")
+    assert stream_utils.Path(result).exists()
+    # Only the downloaded segment is decoded, never the stream URL itself.
+    assert all(not str(c.args[0]).startswith("http") for c in vc.call_args_list)
@@ -107,7 +107,8 @@ map_and_install() {
     --src "${EXPORT_DIR}/panorama/images/heroes/icons" \
     --dest "${ASSETS_DIR}"
   # Invalidate precomputed template cache so the detector recomputes templates.
-  rm -f "${ASSETS_DIR}/templates_cache.npz"
+  rm -f "${ASSETS_DIR}/templates_cache.npy" "${ASSETS_DIR}/templates_cache.json" \
+        "${ASSETS_DIR}/templates_cache.npz"
 }
 
 main() {